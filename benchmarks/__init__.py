@@ -0,0 +1,3 @@
+"""
+قياسات أداء محلية للبوت (تشغيل: python -m benchmarks.<name>)
+"""
@@ -0,0 +1,106 @@
+"""
+زمن انتظار معالجات المستخدمين الآخرين أثناء تنفيذ مهمة كبيرة
+(تحديثات Telegram مزيفة تصل من خيط منفصل كما تصل من الشبكة)
+"""
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bot
+from job_runner import JobRunner
+from job_scheduler import JobScheduler
+from benchmarks.local_server import LocalImageServer, chapter_html, make_page
+
+PAGES = 60
+UPDATE_INTERVAL = 0.1
+
+class FakeMessage:
+    """رسالة Telegram مزيفة تسجل وقت أول رد"""
+
+    def __init__(self, text='', on_reply=None):
+        self.text = text
+        self.on_reply = on_reply
+
+    async def reply_text(self, text):
+        if self.on_reply:
+            self.on_reply()
+        return FakeMessage(text)
+
+    async def edit_text(self, text):
+        pass
+
+    async def delete(self):
+        pass
+
+    async def reply_document(self, document, filename, caption):
+        document.read()
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeUpdate:
+    def __init__(self, message, user_id=1):
+        self.message = message
+        self.effective_user = FakeUser(user_id)
+
+class InlineRunner(JobRunner):
+    """تنفيذ الأعمال داخل حلقة الأحداث مباشرة (السلوك القديم الذي يوقف البوت)"""
+
+    async def run(self, func, *args, on_tick=None, **kwargs):
+        return func(*args, **kwargs)
+
+    async def track(self, awaitable, on_tick=None):
+        # خط المعالجة غير المتزامن يُنفذ كاملاً في حلقة منفصلة بينما تبقى حلقة البوت محجوبة
+        # (كما كانت تحجبها الدوال المتزامنة قبل نقل العمل خارجها)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, awaitable).result()
+
+async def measure(runner, chapter_url, download_pool):
+    bot.JOB_RUNNER = runner
+    bot.download_pool = download_pool
+    bot.JOB_SCHEDULER = JobScheduler(max_running=runner.max_jobs)
+    bot.DOWNLOAD_POOL = None
+    loop = asyncio.get_running_loop()
+    latencies = []
+    stop = threading.Event()
+
+    def dispatch(sent_at):
+        update = FakeUpdate(FakeMessage('/start', lambda: latencies.append(time.perf_counter() - sent_at)))
+        loop.create_task(bot.start(update, None))
+
+    def update_stream():
+        while not stop.is_set():
+            loop.call_soon_threadsafe(dispatch, time.perf_counter())
+            time.sleep(UPDATE_INTERVAL)
+
+    producer = threading.Thread(target=update_stream, daemon=True)
+    started = time.perf_counter()
+    producer.start()
+    await bot.handle_message(FakeUpdate(FakeMessage(chapter_url)), None)
+    job_seconds = time.perf_counter() - started
+    stop.set()
+    producer.join()
+    await asyncio.sleep(0.2)
+    await bot.close_pools(None)
+    return job_seconds, latencies
+
+def run():
+    bot.PAGE_CACHE = None
+    names = [f"{i:03d}.jpg" for i in range(1, PAGES + 1)]
+    # صفحات مختلفة (صفحة واحدة مكررة تُدمج عند تصفية النسخ المكررة)
+    files = {f"/chapter/{name}": (make_page(1600, 2300, seed=i), 'image/jpeg') for i, name in enumerate(names)}
+    files['/chapter/'] = (chapter_html(names), 'text/html')
+    with LocalImageServer(files, latency=0.02) as server:
+        # في الحلقة المنفصلة ينشئ خط المعالجة مجمع اتصالاته ويغلقه بنفسه (المجمع المشترك مرتبط بحلقة البوت)
+        cases = (('blocking', InlineRunner, lambda: None), ('executor', JobRunner, bot.download_pool))
+        for name, runner_class, download_pool in cases:
+            job_seconds, latencies = asyncio.run(measure(runner_class(), server.base_url + 'chapter/', download_pool))
+            print(f"{name:8s} job={job_seconds:6.2f}s  other users: n={len(latencies)}  "
+                  f"p50={statistics.median(latencies) * 1000:8.1f} ms  max={max(latencies) * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
@@ -0,0 +1,37 @@
+"""
+فصل مكرر مع الذاكرة المؤقتة: التشغيل الثاني لا يرسل طلبات ولا يرمّز أي صفحة
+"""
+import logging
+import os
+import tempfile
+import pdf_creator
+from image_downloader import download_images
+from page_cache import PageCache
+from benchmarks.local_server import LocalImageServer, chapter_html, make_page
+
+PAGES = 20
+
+def run_chapter(server, cache):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        requests_before = server.total_requests()
+        pdf_creator.PAGE_IO_TOTALS.clear()
+        paths = download_images(server.base_url + 'chapter/', temp_dir, cache=cache)
+        pdf_creator.create_compressed_pdf(paths, os.path.join(temp_dir, 'out.pdf'), workers=1, cache=cache)
+        return len(paths), server.total_requests() - requests_before, pdf_creator.PAGE_IO_TOTALS['encode']
+
+def run():
+    names = [f"{i:03d}.jpg" for i in range(1, PAGES + 1)]
+    # صفحات مختلفة (صفحة واحدة مكررة تُدمج عند تصفية النسخ المكررة)
+    files = {f"/chapter/{name}": (make_page(1600, 2300, seed=i), 'image/jpeg') for i, name in enumerate(names)}
+    files['/chapter/'] = (chapter_html(names), 'text/html')
+    with LocalImageServer(files) as server, tempfile.TemporaryDirectory() as cache_dir:
+        cache = PageCache(cache_dir, max_bytes=200 * 1024 * 1024)
+        for attempt in ('first', 'repeat'):
+            pages, requests_made, encodes = run_chapter(server, cache)
+            print(f"{attempt:6s} pages={pages}  requests={requests_made}  encodes={encodes}")
+        print(f"cache stats: {cache.stats()}")
+    assert (requests_made, encodes) == (0, 0), (requests_made, encodes)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
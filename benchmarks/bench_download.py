@@ -0,0 +1,33 @@
+"""
+قياس سرعة تحميل الصور (صفحة/ثانية) حسب عدد التحميلات المتزامنة
+"""
+import logging
+import tempfile
+import time
+from image_downloader import FoundImage, create_session, download_found_images
+from benchmarks.local_server import LocalImageServer, make_page
+
+PAGES = 150
+LATENCY = 0.05
+CONCURRENCY_LEVELS = (1, 4, 16, 64)
+
+def run():
+    page = make_page(800, 1200)
+    files = {f"/chapter/{i:03d}.jpg": (page, 'image/jpeg') for i in range(1, PAGES + 1)}
+    with LocalImageServer(files, latency=LATENCY) as server:
+        urls = [FoundImage(server.base_url + path.lstrip('/'), index) for index, path in enumerate(files)]
+        for concurrency in CONCURRENCY_LEVELS:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                session = create_session(per_host=concurrency)
+                start = time.perf_counter()
+                paths = download_found_images(urls, temp_dir, session,
+                                              max_workers=concurrency, per_host=concurrency)
+                elapsed = time.perf_counter() - start
+                session.close()
+            in_order = [p.path.rsplit('_', 1)[-1] for p in paths] == [u.url.rsplit('/', 1)[-1] for u in urls]
+            print(f"concurrency={concurrency:3d}  pages={len(paths)}  "
+                  f"{len(paths) / elapsed:8.1f} pages/s  ordered={in_order}")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
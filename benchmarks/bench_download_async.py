@@ -0,0 +1,80 @@
+"""
+مقارنة التحميل بالخيوط (requests) مع التحميل غير المتزامن (httpx) وقياس سرعة الإلغاء
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from image_downloader import FoundImage, create_session, download_found_images
+from image_downloader_async import AsyncDownloadPool, download_found_images_async
+from benchmarks.local_server import LocalImageServer, make_page
+
+PAGES = 150
+LATENCY = 0.05
+CONCURRENCY_LEVELS = (4, 16, 64)
+CONCURRENT_JOBS = 4
+CANCEL_AFTER = 0.3
+
+def sync_download(urls, concurrency):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session = create_session(per_host=concurrency)
+        start = time.perf_counter()
+        pages = download_found_images(urls, temp_dir, session, max_workers=concurrency, per_host=concurrency)
+        elapsed = time.perf_counter() - start
+        session.close()
+    return len(pages), elapsed
+
+async def async_download(urls, concurrency, jobs=1):
+    pool = AsyncDownloadPool(max_connections=concurrency, per_host=concurrency)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directories = [os.path.join(temp_dir, str(job)) for job in range(jobs)]
+        for directory in directories:
+            os.makedirs(directory)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(download_found_images_async(urls, directory, pool)
+                                         for directory in directories))
+        elapsed = time.perf_counter() - start
+    await pool.aclose()
+    return sum(len(pages) for pages in results), elapsed
+
+async def cancel_download(server, urls, page_size):
+    pool = AsyncDownloadPool(per_host=8)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        task = asyncio.create_task(download_found_images_async(urls, temp_dir, pool))
+        await asyncio.sleep(CANCEL_AFTER)
+        requests_at_cancel = server.total_requests()
+        cancelled_at = time.perf_counter()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        stop_ms = (time.perf_counter() - cancelled_at) * 1000
+        await asyncio.sleep(0.5)
+        names = os.listdir(temp_dir)
+        partial = sum(os.path.getsize(os.path.join(temp_dir, name)) != page_size for name in names)
+    await pool.aclose()
+    return stop_ms, server.total_requests() - requests_at_cancel, len(names), partial
+
+def run():
+    page = make_page(800, 1200)
+    files = {f"/chapter/{i:03d}.jpg": (page, 'image/jpeg') for i in range(1, PAGES + 1)}
+    with LocalImageServer(files, latency=LATENCY) as server:
+        urls = [FoundImage(server.base_url + path.lstrip('/'), index) for index, path in enumerate(files)]
+        for concurrency in CONCURRENCY_LEVELS:
+            count, elapsed = sync_download(urls, concurrency)
+            print(f"threads concurrency={concurrency:3d}  pages={count}  {count / elapsed:8.1f} pages/s")
+            count, elapsed = asyncio.run(async_download(urls, concurrency))
+            print(f"asyncio concurrency={concurrency:3d}  pages={count}  {count / elapsed:8.1f} pages/s")
+
+        count, elapsed = asyncio.run(async_download(urls, 16, jobs=CONCURRENT_JOBS))
+        print(f"asyncio {CONCURRENT_JOBS} jobs on one pool (16 connections)  pages={count}  {count / elapsed:8.1f} pages/s")
+
+        stop_ms, late_requests, complete, partial = asyncio.run(cancel_download(server, urls, len(page)))
+        print(f"cancel: stopped in {stop_ms:.1f} ms, {late_requests} requests after cancel, "
+              f"{complete} finished files kept, {partial} partial files")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
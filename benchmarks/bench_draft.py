@@ -0,0 +1,45 @@
+"""
+زمن فك الترميز والتحجيم وأقصى ذاكرة لصورة JPEG عريضة (4000px)
+مقارنة بين فك الترميز الكامل والمسار السريع (draft)
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from PIL import Image
+from pdf_creator import apply_draft, draft_psnr, DRAFT_MIN_PSNR
+from benchmarks.local_server import make_manga_image
+from benchmarks.memory import peak_rss_mb
+
+SOURCE_SIZE = (4000, 6000)
+MAX_WIDTH = 1200
+REPEATS = 3
+
+def child(mode, image_path):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        with Image.open(image_path) as img:
+            target = (MAX_WIDTH, int(img.height * MAX_WIDTH / img.width))
+            if mode == 'draft':
+                apply_draft(img, *target)
+            img.convert('RGB').resize(target, Image.Resampling.LANCZOS)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    print(f"{mode:5s} decode+resize={elapsed * 1000:7.1f} ms  peak RSS={peak_rss_mb():.1f} MB")
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_path = os.path.join(temp_dir, 'wide.jpg')
+        make_manga_image(*SOURCE_SIZE).save(image_path, 'JPEG', quality=90)
+        for mode in ('full', 'draft'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_draft', mode, image_path], check=True)
+        quality_db = draft_psnr(image_path, MAX_WIDTH)
+        print(f"PSNR draft vs full: {quality_db:.1f} dB (threshold {DRAFT_MIN_PSNR} dB)")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+    else:
+        run()
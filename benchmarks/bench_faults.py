@@ -0,0 +1,120 @@
+"""
+تحميل فصل من خادم يحقن أعطالاً (قطع الاتصال في منتصف الجسم، 503/429 مع Retry-After، 500 دائم، توقف)
+مقارنة بدون إعادة محاولة (السلوك القديم: الصفحة تسقط) مع إعادة المحاولة والاستئناف بـ Range،
+ثم إعادة التحقق من التحميلات السابقة بطلبات شرطية (304) عبر الذاكرة المؤقتة
+"""
+import asyncio
+import functools
+import logging
+import os
+import tempfile
+import time
+import image_downloader
+import image_downloader_async
+from image_downloader import FoundImage, create_session, download_found_images, save_image
+from image_downloader_async import AsyncDownloadPool, download_found_images_async
+from page_cache import PageCache
+from benchmarks.chapters import encode, make_strip
+from benchmarks.local_server import LocalImageServer, make_manga_image
+
+PAGES = 12
+STRIP_SIZE = (1200, 24000)
+# (رقم الصفحة، الأعطال بالترتيب)؛ الصفحة 10 تفشل دائماً فتسقط في الحالتين
+FAULTS = (
+    (2, [('reset', 0.5)]),
+    (4, [('status', 503, 1)]),
+    (6, [('reset', 0.3), ('reset', 0.8)]),
+    (8, [('status', 429, None)]),
+    (10, [('status', 500, None)] * 8),
+    ('strip', [('reset', 0.6)]),
+)
+STALL_TIMEOUT = 1
+
+original_save_image_async = image_downloader_async.save_image_async
+
+def chapter_files():
+    files = {f"/chapter/{i:03d}.jpg": (encode(make_manga_image(1600, 2300, seed=i), 'JPEG', quality=90), 'image/jpeg')
+             for i in range(1, PAGES + 1)}
+    files['/chapter/strip.jpg'] = (encode(make_strip(*STRIP_SIZE, seed=1), 'JPEG', quality=88), 'image/jpeg')
+    return files
+
+def fault_path(page):
+    return '/chapter/strip.jpg' if page == 'strip' else f"/chapter/{page:03d}.jpg"
+
+def inject_faults(server):
+    for page, faults in FAULTS:
+        server.inject(fault_path(page), *faults)
+
+def sync_download(urls, cache=None):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session = create_session()
+        pages = download_found_images(urls, temp_dir, session, cache=cache)
+        session.close()
+    return len(pages)
+
+async def async_download(urls, cache=None):
+    pool = AsyncDownloadPool()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pages = await download_found_images_async(urls, temp_dir, pool, cache=cache)
+    await pool.aclose()
+    return len(pages)
+
+DOWNLOADERS = {
+    'sync': sync_download,
+    'async': lambda urls, cache=None: asyncio.run(async_download(urls, cache)),
+}
+
+def run_case(server, label, download, urls, payload, cache=None):
+    sent_before = server.bytes_sent
+    started = time.perf_counter()
+    pages = download(urls, cache)
+    elapsed = time.perf_counter() - started
+    sent = server.bytes_sent - sent_before
+    print(f"{label:26s} pages={pages:2d}/{len(urls)}  time={elapsed:5.2f}s  "
+          f"sent={sent / 1e6:6.2f} MB ({sent / payload:4.2f}x of chapter)")
+    return pages
+
+def run_with_retries(retries):
+    """السلوك القديم يعادل محاولة واحدة: أي خطأ مؤقت يسقط الصفحة"""
+    attempts = image_downloader.IMAGE_RETRY_ATTEMPTS if retries else 1
+    image_downloader.save_image = functools.partial(save_image, attempts=attempts)
+    image_downloader_async.save_image_async = functools.partial(
+        original_save_image_async, attempts=attempts)
+
+def stall_case(server):
+    """توقف الخادم أطول من المهلة: المحاولة التالية تنجح"""
+    path = fault_path(1)
+    server.inject(path, ('stall', STALL_TIMEOUT * 2))
+    session = create_session()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        started = time.perf_counter()
+        page = save_image(server.base_url.rstrip('/') + path, os.path.join(temp_dir, 'stall.jpg'),
+                          session, timeout=STALL_TIMEOUT)
+        print(f"stall {STALL_TIMEOUT * 2}s > timeout {STALL_TIMEOUT}s      "
+              f"recovered={page is not None}  time={time.perf_counter() - started:4.2f}s")
+    session.close()
+
+def run():
+    files = chapter_files()
+    payload = sum(len(data) for data, _ in files.values())
+    print(f"chapter: {len(files)} images, {payload / 1e6:.2f} MB, strip {STRIP_SIZE[0]}x{STRIP_SIZE[1]}")
+    with LocalImageServer(files) as server:
+        urls = [FoundImage(server.base_url.rstrip('/') + path, index) for index, path in enumerate(files)]
+        for name, download in DOWNLOADERS.items():
+            for retries in (False, True):
+                run_with_retries(retries)
+                inject_faults(server)
+                run_case(server, f"{name} {'retry+resume' if retries else 'no retries'}", download, urls, payload)
+                server.faults.clear()
+        stall_case(server)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # fresh_seconds=0: كل إصابة تحتاج إعادة تحقق بطلب شرطي
+            cache = PageCache(cache_dir, max_bytes=200 * 1024 * 1024, fresh_seconds=0)
+            run_case(server, 'sync fill cache', sync_download, urls, payload, cache)
+            run_case(server, 'sync revalidate (304)', sync_download, urls, payload, cache)
+            print(f"cache stats: {cache.stats()}")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
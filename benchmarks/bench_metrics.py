@@ -0,0 +1,61 @@
+"""
+كلفة القياسات على المسار الساخن: span فارغ ومفعل، ثم إنشاء PDF كامل بالقياسات معطلة ومفعلة
+(METRICS_ENABLED يُقرأ عند كل استدعاء فيمكن تبديله هنا؛ العمليات الفرعية ترثه عند الإنشاء)
+"""
+import logging
+import os
+import tempfile
+import time
+import metrics
+from pdf_creator import create_pdf
+from benchmarks.local_server import make_manga_image
+
+SPAN_CALLS = 200000
+PAGES = 20
+REPEATS = 5
+
+def span_cost(enabled):
+    metrics.METRICS_ENABLED = enabled
+    started = time.perf_counter()
+    for _ in range(SPAN_CALLS):
+        with metrics.span('bench'):
+            pass
+    return (time.perf_counter() - started) / SPAN_CALLS * 1e9
+
+def pdf_times(paths, temp_dir):
+    """أفضل زمن لكل حالة مع التبديل بينهما في كل تكرار حتى لا يظلم ترتيب التشغيل إحداهما"""
+    output_path = os.path.join(temp_dir, 'out.pdf')
+    timings = {False: [], True: []}
+    for _ in range(REPEATS):
+        for enabled in (False, True):
+            metrics.METRICS_ENABLED = enabled
+            started = time.perf_counter()
+            create_pdf(paths, output_path, 'balanced', workers=1, passthrough=False)
+            timings[enabled].append(time.perf_counter() - started)
+            os.remove(output_path)
+    return min(timings[False]), min(timings[True])
+
+def run():
+    baseline = span_cost(False)
+    print(f"span disabled: {baseline:6.0f} ns/call   enabled: {span_cost(True):6.0f} ns/call")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i in range(PAGES):
+            path = os.path.join(temp_dir, f"{i:03d}.jpg")
+            make_manga_image(1800, 2600, seed=i).save(path, 'JPEG', quality=92)
+            paths.append(path)
+
+        disabled, enabled = pdf_times(paths, temp_dir)
+        print(f"create_pdf {PAGES} pages: disabled={disabled:6.2f}s  enabled={enabled:6.2f}s  "
+              f"overhead={enabled / disabled - 1:+.2%}")
+
+    with metrics.JobMetrics('bench'):
+        make_manga_image(3000, 4000).convert('L')
+    for line in metrics.render_metrics().splitlines():
+        if line.endswith('}') or '_count' in line or '_total' in line:
+            print('  ' + line)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
@@ -0,0 +1,46 @@
+"""
+تمرير الصفحات المرمّزة من الذاكرة إلى كاتب PDF مقارنة بالملفات المؤقتة
+(PAGE_SPILL_BYTES = 0 يجبر كل صفحة على المرور بملف مؤقت كما في السابق)
+"""
+import logging
+import os
+import tempfile
+import time
+import pdf_creator
+from benchmarks.local_server import make_manga_image
+
+PAGES = 40
+REPEATS = 3
+
+def run_once(paths, temp_dir, spill_bytes):
+    pdf_creator.PAGE_SPILL_BYTES = spill_bytes
+    pdf_creator.PAGE_IO_TOTALS.clear()
+    output_path = os.path.join(temp_dir, 'out.pdf')
+    started = time.perf_counter()
+    pdf_creator.create_pdf(paths, output_path, 'small', workers=1, passthrough=False)
+    elapsed = time.perf_counter() - started
+    os.remove(output_path)
+    return elapsed, pdf_creator.PAGE_IO_TOTALS['spill']
+
+def run():
+    default_spill = pdf_creator.PAGE_SPILL_BYTES
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i in range(PAGES):
+            path = os.path.join(temp_dir, f"{i:03d}.jpg")
+            make_manga_image(1000, 1500, seed=i).save(path, 'JPEG', quality=90)
+            paths.append(path)
+
+        for label, spill_bytes in (('temp files', 0), ('in memory', default_spill)):
+            timings = []
+            for _ in range(REPEATS):
+                elapsed, spilled = run_once(paths, temp_dir, spill_bytes)
+                timings.append(elapsed)
+            best = min(timings)
+            print(f"{label:10s} best={best:6.2f}s  {best / PAGES * 1000:6.1f} ms/page  "
+                  f"pages written to temp files={spilled}/{PAGES}")
+    pdf_creator.PAGE_SPILL_BYTES = default_spill
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
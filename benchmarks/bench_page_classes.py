@@ -0,0 +1,101 @@
+"""
+البايتات وزمن المعالجة لكل صفحة حسب نوعها (ملونة، رمادية، أبيض وأسود فقط)
+مقارنة بين الترميز السابق (RGB دائماً) والترميز حسب التصنيف (L أو CCITT G4)
+"""
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from PIL import Image, ImageDraw, ImageOps
+from pdf_creator import (optimize_image_pages, classify_page, is_page_file,
+                         COMPRESSED_MAX_WIDTH, COMPRESSED_QUALITY)
+from pdf_writer import page_source_size
+from benchmarks.local_server import make_manga_image
+
+PAGES_PER_CLASS = 6
+PAGE_SIZE = (1600, 2400)
+
+def make_line_art(width, height, seed=0):
+    """صفحة نص وخطوط سوداء على خلفية بيضاء دون تدرجات"""
+    rnd = random.Random(seed)
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(60):
+        draw.line([rnd.randint(0, width), rnd.randint(0, height), rnd.randint(0, width), rnd.randint(0, height)],
+                  fill=0, width=rnd.randint(2, 5))
+    for _ in range(30):
+        x, y = rnd.randint(0, width - 200), rnd.randint(0, height - 200)
+        draw.rectangle([x, y, x + 200, y + 120], outline=0, width=3)
+    return img.convert('RGB')
+
+def make_color_page(width, height, seed=0):
+    return ImageOps.colorize(make_manga_image(width, height, seed).convert('L'), (40, 0, 90), (255, 220, 120))
+
+PAGE_MAKERS = {
+    'color': make_color_page,
+    'gray': make_manga_image,
+    'bilevel': make_line_art,
+}
+
+def encode_rgb(image_path):
+    """المسار السابق: تحويل إلى RGB وترميز JPEG بثلاث قنوات"""
+    output_path = os.path.splitext(image_path)[0] + '_rgb.jpg'
+    with Image.open(image_path) as img:
+        img = img.convert('RGB')
+        img.thumbnail((COMPRESSED_MAX_WIDTH, 3000), Image.Resampling.LANCZOS)
+        img.save(output_path, 'JPEG', quality=COMPRESSED_QUALITY, optimize=True)
+    return [output_path]
+
+def encode_classified(image_path, io_counts=None):
+    return optimize_image_pages(image_path, 'small', io_counts=io_counts)
+
+def remove_outputs(outputs):
+    for output in outputs:
+        if is_page_file(output):
+            os.remove(output)
+
+def measure(paths, encoder):
+    total_bytes = 0
+    started = time.perf_counter()
+    for path in paths:
+        outputs = encoder(path)
+        total_bytes += sum(page_source_size(output) for output in outputs)
+        remove_outputs(outputs)
+    elapsed = time.perf_counter() - started
+    return total_bytes / len(paths), elapsed / len(paths) * 1000
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, maker in PAGE_MAKERS.items():
+            paths = []
+            for seed in range(PAGES_PER_CLASS):
+                path = os.path.join(temp_dir, f"{name}_{seed}.jpg")
+                maker(*PAGE_SIZE, seed=seed).save(path, 'JPEG', quality=90)
+                paths.append(path)
+
+            started = time.perf_counter()
+            detected = []
+            for path in paths:
+                with Image.open(path) as img:
+                    detected.append(classify_page(img))
+            classify_ms = (time.perf_counter() - started) / len(paths) * 1000
+
+            bilevel = 0
+            for path in paths:
+                io_counts = Counter()
+                remove_outputs(encode_classified(path, io_counts))
+                bilevel += io_counts['bilevel']
+
+            rgb_bytes, rgb_ms = measure(paths, encode_rgb)
+            new_bytes, new_ms = measure(paths, encode_classified)
+            print(f"{name:8s} detected gray={detected.count('gray')}/{len(paths)} bilevel={bilevel}/{len(paths)} "
+                  f"classify={classify_ms:5.1f}ms  "
+                  f"rgb: {rgb_bytes / 1024:6.1f} KB/page {rgb_ms:6.1f} ms/page  "
+                  f"classified: {new_bytes / 1024:6.1f} KB/page {new_ms:6.1f} ms/page "
+                  f"({new_bytes / rgb_bytes:.0%} size)")
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
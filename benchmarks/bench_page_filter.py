@@ -0,0 +1,90 @@
+"""
+تصفية الصور غير المفيدة أثناء الاكتشاف: فصل به شعار وصور مستخدمين وشريط إعلاني
+وصور مصغرة جانبية، وكل صفحة موجودة مرتين (src مصغر + data-src كامل، ورابط للنسخة الكبيرة)
+مقارنة بالاكتشاف السابق (كل الروابط عبر set) من حيث عدد الصفحات والبايتات والزمن
+"""
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from PIL import Image
+from image_downloader import FoundImage, create_session, download_found_images, download_pages, is_image_url
+from pdf_creator import create_pdf
+from benchmarks.local_server import LocalImageServer, make_manga_image
+
+PAGES = 20
+
+def jpeg(img, quality=85):
+    buffer = io.BytesIO()
+    img.convert('RGB').save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+def build_chapter():
+    files = {}
+    body = ['<img class="site-logo" src="/static/brand.png">',
+            '<div class="user"><img src="/static/u1.jpg"></div>',
+            '<img src="/static/promo.jpg">']
+    for i in range(1, PAGES + 1):
+        page = make_manga_image(1000, 1500, seed=i)
+        files[f"/chapter/{i:03d}.jpg"] = (jpeg(page), 'image/jpeg')
+        files[f"/chapter/{i:03d}_small.jpg"] = (jpeg(page.resize((500, 750))), 'image/jpeg')
+        files[f"/chapter/{i:03d}_hd.jpg"] = (jpeg(page.resize((1600, 2400)), 90), 'image/jpeg')
+        body.append(f'<a href="{i:03d}_hd.jpg"><img src="{i:03d}_small.jpg" data-src="{i:03d}.jpg"></a>')
+    for i in range(1, 7):
+        files[f"/chapter/related_{i}.jpg"] = (jpeg(make_manga_image(150, 220, seed=100 + i)), 'image/jpeg')
+        body.append(f'<img src="related_{i}.jpg">')
+    files['/static/brand.png'] = (jpeg(Image.new('RGB', (180, 60), (200, 30, 30))), 'image/jpeg')
+    files['/static/u1.jpg'] = (jpeg(Image.effect_noise((64, 64), 50)), 'image/jpeg')
+    files['/static/promo.jpg'] = (jpeg(Image.effect_noise((728, 90), 50)), 'image/jpeg')
+    files['/chapter/'] = (f"<html><body>{''.join(body)}</body></html>".encode(), 'text/html')
+    return files
+
+def legacy_find_image_urls(soup, base_url):
+    """الاكتشاف السابق: كل img/a/style بكل السمات، دون ترتيب"""
+    image_urls = []
+    for img in soup.find_all('img'):
+        for attr in ['src', 'data-src', 'data-original', 'data-source']:
+            src = img.get(attr)
+            if src and is_image_url(urljoin(base_url, src)):
+                image_urls.append(urljoin(base_url, src))
+    for link in soup.find_all('a', href=True):
+        if is_image_url(link['href']):
+            image_urls.append(urljoin(base_url, link['href']))
+    for tag in soup.find_all(style=True):
+        for url in re.findall(r'url\([\'"]?(.*?)[\'"]?\)', tag['style']):
+            if is_image_url(urljoin(base_url, url)):
+                image_urls.append(urljoin(base_url, url))
+    return list(set(image_urls))
+
+def legacy_download(chapter_url, download_dir):
+    session = create_session()
+    soup = BeautifulSoup(session.get(chapter_url).content, 'html.parser')
+    found = [FoundImage(url, index) for index, url in enumerate(legacy_find_image_urls(soup, chapter_url))]
+    return download_found_images(found, download_dir, session)
+
+def run_case(label, downloader, chapter_url):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        started = time.perf_counter()
+        pages = downloader(chapter_url, temp_dir)
+        downloaded = time.perf_counter() - started
+        kept_bytes = sum(os.path.getsize(page.path) for page in pages)
+        output_path = os.path.join(temp_dir, 'out.pdf')
+        create_pdf([page.path for page in pages], output_path, 'small', workers=1)
+        total = time.perf_counter() - started
+        print(f"{label:8s} pages={len(pages):3d}  kept={kept_bytes / 1024:7.0f} KB  "
+              f"pdf={os.path.getsize(output_path) / 1024:7.0f} KB  download={downloaded:5.2f}s  total={total:5.2f}s")
+
+def run():
+    with LocalImageServer(build_chapter(), latency=0.01) as server:
+        chapter_url = server.base_url + 'chapter/'
+        run_case('legacy', legacy_download, chapter_url)
+        run_case('filtered', download_pages, chapter_url)
+        print(f"expected pages={PAGES}")
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
@@ -0,0 +1,26 @@
+"""
+التحقق من أن كل صفحة تُفتح وتُفك وتُرمّز مرة واحدة فقط
+"""
+import logging
+import os
+import tempfile
+import pdf_creator
+from benchmarks.bench_pdf_workers import write_chapter
+
+PAGES = 10
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_chapter(temp_dir, pages=PAGES)
+        pdf_creator.PAGE_IO_TOTALS.clear()
+        pdf_creator.create_compressed_pdf(paths, os.path.join(temp_dir, 'out.pdf'), workers=1)
+    totals = dict(pdf_creator.PAGE_IO_TOTALS)
+    per_page = {name: count / PAGES for name, count in totals.items()}
+    print(f"pages={PAGES}  per page: {per_page}")
+    # باقي العدادات (gray، bilevel، spill...) تصنيفات وليست عمليات فتح أو فك أو ترميز إضافية
+    io_per_page = {name: per_page.get(name, 0) for name in ('open', 'decode', 'encode')}
+    assert io_per_page == {'open': 1, 'decode': 1, 'encode': 1}, per_page
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
@@ -0,0 +1,56 @@
+"""
+أقصى ذاكرة عند كتابة PDF حسب عدد الصفحات:
+img2pdf.convert (المستند كاملاً في الذاكرة) مقابل الكتابة المتدفقة صفحة بصفحة
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.bench_pdf_workers import write_chapter
+from benchmarks.memory import peak_rss_mb
+
+PAGE_COUNTS = (50, 100, 200)
+WIDTH, HEIGHT = 1000, 1500
+
+def child(method, directory, pages):
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))[:int(pages)]
+    output_path = os.path.join(directory, f'out_{method}.pdf')
+    started = time.perf_counter()
+    if method == 'img2pdf':
+        import img2pdf
+        with open(output_path, 'wb') as f:
+            f.write(img2pdf.convert(paths))
+    elif method == 'streaming':
+        from pdf_writer import StreamingPdfWriter
+        with StreamingPdfWriter(output_path) as writer:
+            for path in paths:
+                writer.add_image(path)
+    else:
+        from pdf_creator import create_compressed_pdf
+        create_compressed_pdf(paths, output_path, workers=1)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(output_path) / (1024 * 1024)
+    os.remove(output_path)
+    print(f"  {method:18s} pages={pages:>4}  pdf={size:6.1f} MB  {elapsed:6.2f}s  peak RSS={peak_rss_mb():6.1f} MB")
+
+def run():
+    try:
+        import img2pdf  # noqa: F401 (للمقارنة فقط، لم يعد مطلوباً)
+        methods = ('img2pdf', 'streaming', 'create_compressed')
+    except ImportError:
+        methods = ('streaming', 'create_compressed')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        write_chapter(temp_dir, max(PAGE_COUNTS), WIDTH, HEIGHT)
+        for pages in PAGE_COUNTS:
+            for method in methods:
+                subprocess.run([sys.executable, '-m', 'benchmarks.bench_pdf_memory', method, temp_dir,
+                                str(pages)], check=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    if len(sys.argv) == 4:
+        child(*sys.argv[1:])
+    else:
+        run()
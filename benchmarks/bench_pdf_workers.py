@@ -0,0 +1,38 @@
+"""
+زمن إنشاء PDF مضغوط لفصل اصطناعي من 100 صفحة حسب عدد العمليات
+"""
+import logging
+import os
+import tempfile
+import time
+from pdf_creator import create_compressed_pdf
+from benchmarks.local_server import make_page
+
+PAGES = 100
+WORKER_COUNTS = (1, 2, 4, 8)
+
+def write_chapter(directory, pages=PAGES, width=1600, height=2300):
+    """كتابة فصل اصطناعي في المجلد وإرجاع مسارات الصفحات"""
+    data = make_page(width, height)
+    paths = []
+    for i in range(1, pages + 1):
+        path = os.path.join(directory, f"image_{i:04d}.jpg")
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+def run():
+    print(f"cpu cores: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_chapter(temp_dir)
+        for workers in WORKER_COUNTS:
+            output_path = os.path.join(temp_dir, f"out_{workers}.pdf")
+            start = time.perf_counter()
+            create_compressed_pdf(paths, output_path, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"workers={workers}  wall={elapsed:6.2f}s  {elapsed / PAGES:.3f} s/page")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
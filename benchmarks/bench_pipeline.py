@@ -0,0 +1,66 @@
+"""
+خط المعالجة المتدفق (تحميل → معالجة → كتابة بطوابير محدودة) مقارنة بالمراحل المتتالية
+(تحميل الفصل كاملاً ثم إنشاء PDF) لفصل من 100 صفحة على خادم محلي بتأخير لكل طلب
+"""
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+from pdf_creator import create_pdf
+from image_downloader_async import AsyncDownloadPool, download_pages_async
+from pdf_pipeline import stream_pdf_async
+from benchmarks.local_server import LocalImageServer, chapter_html, make_manga_image
+
+PAGES = 100
+LATENCIES = (0.05, 0.2)
+PROFILE = 'balanced'
+
+def jpeg_page(seed):
+    buffer = io.BytesIO()
+    make_manga_image(1800, 2600, seed=seed).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+async def phased(chapter_url, temp_dir, output_path):
+    pool = AsyncDownloadPool()
+    try:
+        pages = await download_pages_async(chapter_url, temp_dir, pool)
+    finally:
+        await pool.aclose()
+    downloaded = time.perf_counter()
+    await asyncio.to_thread(create_pdf, [page.path for page in pages], output_path, PROFILE)
+    return len(pages), downloaded
+
+async def pipelined(chapter_url, temp_dir, output_path):
+    await stream_pdf_async(chapter_url, temp_dir, output_path, PROFILE)
+    return None, None
+
+def run_case(label, runner, chapter_url):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'out.pdf')
+        started = time.perf_counter()
+        pages, downloaded = asyncio.run(runner(chapter_url, temp_dir, output_path))
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(output_path)
+        line = f"{label:10s} total={elapsed:6.2f}s  pdf={size / (1024 * 1024):6.2f} MB"
+        if downloaded:
+            line += f"  (download phase {downloaded - started:5.2f}s, pages={pages})"
+        print(line)
+        return elapsed
+
+def run():
+    names = [f"{i:03d}.jpg" for i in range(1, PAGES + 1)]
+    files = {f"/chapter/{name}": (jpeg_page(i), 'image/jpeg') for i, name in enumerate(names)}
+    files['/chapter/'] = (chapter_html(names), 'text/html')
+    for latency in LATENCIES:
+        print(f"pages={PAGES} latency={latency * 1000:.0f}ms")
+        with LocalImageServer(files, latency=latency) as server:
+            chapter_url = server.base_url + 'chapter/'
+            before = run_case('phased', phased, chapter_url)
+            after = run_case('pipelined', pipelined, chapter_url)
+        print(f"pipelined/phased={after / before:.0%}")
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
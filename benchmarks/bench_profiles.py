@@ -0,0 +1,82 @@
+"""
+مصفوفة أوضاع الجودة: حجم PDF وزمن الإنشاء وجودة الصفحات (SSIM مقارنة بالمصدر)
+لكل وضع في PROFILES على أنواع مختلفة من الصفحات
+"""
+import io
+import logging
+import os
+from array import array
+import tempfile
+import time
+from PIL import Image, ImageMath
+from pdf_creator import PROFILES, create_pdf, is_page_file, optimize_image_pages
+from benchmarks.local_server import make_manga_image
+from benchmarks.bench_page_classes import make_color_page, make_line_art
+
+PAGES_PER_KIND = 4
+# (دالة الإنشاء، الأبعاد، صيغة المصدر)
+PAGE_KINDS = {
+    'color': (make_color_page, (1600, 2400), 'JPEG'),
+    'gray': (make_manga_image, (1600, 2400), 'JPEG'),
+    'lineart': (make_line_art, (1600, 2400), 'JPEG'),
+    'strip': (make_manga_image, (800, 12000), 'PNG'),
+}
+SSIM_BLOCK = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+def block_stats(first, second, block=SSIM_BLOCK):
+    """متوسطات الكتل والتباينات والتغاير بعمليات صور F (reduce = متوسط كل كتلة)"""
+    a, b = first.convert('F'), second.convert('F')
+    product = lambda x, y: ImageMath.lambda_eval(lambda v: v['x'] * v['y'], x=x, y=y)
+    return [array('f', image.reduce(block).tobytes())
+            for image in (a, b, product(a, a), product(b, b), product(a, b))]
+
+def ssim(first, second):
+    """SSIM المتوسط على كتل 8x8 بعد إعادة الصفحة الناتجة إلى حجم المصدر (التصغير جزء من الفقد)"""
+    if second.size != first.size:
+        second = second.convert('L').resize(first.size, Image.Resampling.BICUBIC)
+    total = 0.0
+    stats = block_stats(first.convert('L'), second.convert('L'))
+    for mu_a, mu_b, e_aa, e_bb, e_ab in zip(*stats):
+        var_a, var_b = e_aa - mu_a * mu_a, e_bb - mu_b * mu_b
+        covariance = e_ab - mu_a * mu_b
+        total += ((2 * mu_a * mu_b + SSIM_C1) * (2 * covariance + SSIM_C2)
+                  / ((mu_a * mu_a + mu_b * mu_b + SSIM_C1) * (var_a + var_b + SSIM_C2)))
+    return total / len(stats[0])
+
+def run():
+    profiles = [name for name in PROFILES if name != 'simple']
+    print(f"{'kind':8s} {'profile':9s} {'pdf KB':>9s} {'KB/page':>8s} {'ms/page':>8s} {'SSIM':>6s}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for kind, (maker, size, fmt) in PAGE_KINDS.items():
+            paths = []
+            for seed in range(PAGES_PER_KIND):
+                path = os.path.join(temp_dir, f"{kind}_{seed}.{fmt.lower()}")
+                maker(*size, seed=seed).save(path, fmt, quality=92)
+                paths.append(path)
+
+            for name in profiles:
+                output_path = os.path.join(temp_dir, f"{kind}_{name}.pdf")
+                started = time.perf_counter()
+                create_pdf(paths, output_path, name, workers=1)
+                elapsed = time.perf_counter() - started
+                pdf_size = os.path.getsize(output_path)
+                os.remove(output_path)
+
+                scores = []
+                for path in paths:
+                    outputs = optimize_image_pages(path, name, passthrough=True)
+                    first = outputs[0] if is_page_file(outputs[0]) else io.BytesIO(outputs[0])
+                    with Image.open(path) as source, Image.open(first) as result:
+                        scores.append(ssim(source, result))
+                    for output in outputs:
+                        if is_page_file(output) and output != path:
+                            os.remove(output)
+
+                print(f"{kind:8s} {name:9s} {pdf_size / 1024:9.1f} {pdf_size / 1024 / len(paths):8.1f} "
+                      f"{elapsed / len(paths) * 1000:8.1f} {sum(scores) / len(scores):6.3f}")
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
@@ -0,0 +1,91 @@
+"""
+محاكاة دفعة طلبات على الطابور: زمن الاستجابة p50/p95 وعدد الطلبات المرفوضة
+مستخدم كثيف يرسل فصولاً متتالية بينما يرسل مستخدمون آخرون طلباً واحداً لكل منهم
+(مقارنة مع طابور بسيط بترتيب الوصول بلا حد للانتظار)
+"""
+import asyncio
+import logging
+import random
+import statistics
+import time
+from job_scheduler import JobScheduler, JobRejected
+
+SLOTS = 2
+HEAVY_JOBS = 12
+LIGHT_USERS = 10
+JOB_SECONDS = (0.05, 0.15)
+MAX_WAIT = 0.8
+QUEUED_PER_USER = 4
+BURST_SECONDS = 0.2
+
+def percentiles(values):
+    if not values:
+        return float('nan'), float('nan')
+    ordered = sorted(values)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+def burst(seed=0):
+    """(وقت الوصول، المستخدم، مدة المهمة) - المستخدم الكثيف يرسل كل طلباته أولاً"""
+    rng = random.Random(seed)
+    arrivals = [(i * 0.001, 'heavy', rng.uniform(*JOB_SECONDS)) for i in range(HEAVY_JOBS)]
+    arrivals += [(rng.uniform(0.01, BURST_SECONDS), f"light{i}", rng.uniform(*JOB_SECONDS))
+                 for i in range(LIGHT_USERS)]
+    return sorted(arrivals)
+
+async def run_fifo(arrivals):
+    slots = asyncio.Semaphore(SLOTS)
+    latencies = {}
+
+    async def job(delay, user, duration):
+        await asyncio.sleep(delay)
+        submitted = time.monotonic()
+        async with slots:
+            await asyncio.sleep(duration)
+        latencies.setdefault(user, []).append(time.monotonic() - submitted)
+
+    await asyncio.gather(*(job(*arrival) for arrival in arrivals))
+    return latencies, 0
+
+async def run_fair(arrivals):
+    scheduler = JobScheduler(max_running=SLOTS, max_queued=50, per_user=1,
+                             queued_per_user=QUEUED_PER_USER, max_wait=MAX_WAIT)
+    scheduler.average_job_seconds = statistics.mean(duration for _, _, duration in arrivals)
+    latencies = {}
+    rejected = 0
+
+    async def job(delay, user, duration):
+        nonlocal rejected
+        await asyncio.sleep(delay)
+        submitted = time.monotonic()
+        try:
+            ticket = scheduler.admit(user)
+        except JobRejected:
+            rejected += 1
+            return
+        async with ticket:
+            await asyncio.sleep(duration)
+        latencies.setdefault(user, []).append(time.monotonic() - submitted)
+
+    await asyncio.gather(*(job(*arrival) for arrival in arrivals))
+    p50, p95 = scheduler.latency_percentiles()
+    logging.info(f"scheduler p50={p50:.3f}s p95={p95:.3f}s")
+    return latencies, rejected
+
+def report(name, latencies, rejected):
+    everyone = [value for values in latencies.values() for value in values]
+    light = [value for user, values in latencies.items() if user != 'heavy' for value in values]
+    heavy = latencies.get('heavy', [])
+    rows = [('all', everyone), ('light', light), ('heavy', heavy)]
+    print(f"{name:5s} rejected={rejected:2d}  " + "  ".join(
+        f"{label}: n={len(values):2d} p50={percentiles(values)[0] * 1000:5.0f}ms p95={percentiles(values)[1] * 1000:5.0f}ms"
+        for label, values in rows
+    ))
+
+def run():
+    arrivals = burst()
+    report('fifo', *asyncio.run(run_fifo(arrivals)))
+    report('fair', *asyncio.run(run_fair(arrivals)))
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
@@ -0,0 +1,39 @@
+"""
+عدد الطلبات لكل فصل في التحميل الرقمي (اكتشاف النمط والتوقف المبكر)،
+مع فصل لا يبدأ من 001 وفصل يخلط امتدادين (فحص باقي الأنماط عند فشل النمط المعتمد)
+"""
+import logging
+import tempfile
+import time
+from image_downloader import create_session, download_sequential_images
+from benchmarks.local_server import LocalImageServer, make_page
+
+def count_requests(files, expected_pages):
+    with LocalImageServer(files, latency=0.01) as server, tempfile.TemporaryDirectory() as temp_dir:
+        session = create_session()
+        start = time.perf_counter()
+        paths = download_sequential_images(server.base_url + 'chapter/', temp_dir, session)
+        elapsed = time.perf_counter() - start
+        session.close()
+        requests_made = server.total_requests()
+    assert len(paths) == expected_pages, (len(paths), expected_pages)
+    return requests_made, elapsed
+
+def run():
+    page = make_page(400, 600)
+    scenarios = {
+        'numbered (page_001.jpg x40)': (
+            {f"/chapter/page_{i:03d}.jpg": (page, 'image/jpeg') for i in range(1, 41)}, 40),
+        'starts at 002 (002.jpg x20)': (
+            {f"/chapter/{i:03d}.jpg": (page, 'image/jpeg') for i in range(2, 22)}, 20),
+        'mixed (odd .jpg, even .png)': (
+            {f"/chapter/{i:03d}.{'jpg' if i % 2 else 'png'}": (page, 'image/jpeg') for i in range(1, 21)}, 20),
+        'no numbered files': ({}, 0),
+    }
+    for name, (files, expected) in scenarios.items():
+        requests_made, elapsed = count_requests(files, expected)
+        print(f"{name:30s} pages={expected:3d}  requests={requests_made:4d}  {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
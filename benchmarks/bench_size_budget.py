@@ -0,0 +1,71 @@
+"""
+وضع الحجم المستهدف: التحقق من أن ملف PDF لا يتجاوز الميزانية على فصول اصطناعية
+(صفحات مانجا، صفحات ضوضاء صعبة الضغط، شرائح ويبتون طويلة) مع نسبة استخدام الميزانية
+"""
+import logging
+import os
+import tempfile
+import time
+from PIL import Image
+from benchmarks.local_server import make_manga_image, make_page
+from pdf_creator import PAGE_IO_TOTALS
+from pdf_creator_sized import create_sized_pdf
+
+MB = 1024 * 1024
+BUDGET_FRACTIONS = (1.0, 0.5, 0.25)
+
+def manga_chapter(directory, pages=30):
+    paths = []
+    for i in range(pages):
+        path = os.path.join(directory, f"image_{i + 1:04d}.jpg")
+        make_manga_image(1600, 2300, seed=i).save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+def noise_chapter(directory, pages=20):
+    paths = []
+    for i in range(pages):
+        path = os.path.join(directory, f"image_{i + 1:04d}.jpg")
+        with open(path, 'wb') as f:
+            f.write(make_page(1400, 2000, seed=i, quality=90))
+        paths.append(path)
+    return paths
+
+def strip_chapter(directory, strips=4):
+    paths = []
+    for i in range(strips):
+        path = os.path.join(directory, f"image_{i + 1:04d}.jpg")
+        page = make_manga_image(900, 3000, seed=i)
+        strip = Image.new('RGB', (900, 15000), 'white')
+        for top in range(0, 15000, 3000):
+            strip.paste(page, (0, top))
+        strip.save(path, 'JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+def run():
+    failures = 0
+    for name, builder in (('manga', manga_chapter), ('noise', noise_chapter), ('strips', strip_chapter)):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = builder(temp_dir)
+            source_bytes = sum(os.path.getsize(path) for path in paths)
+            output_path = os.path.join(temp_dir, 'out.pdf')
+            # المرجع: حجم الملف بأعلى مستوى تقريباً (ميزانية غير محدودة)
+            reference = create_sized_pdf(paths, output_path, 10 * source_bytes, workers=1)
+            for fraction in BUDGET_FRACTIONS:
+                budget = int(reference * fraction)
+                encodes = PAGE_IO_TOTALS['encode']
+                started = time.perf_counter()
+                size = create_sized_pdf(paths, output_path, budget, workers=1)
+                elapsed = time.perf_counter() - started
+                ok = size <= budget
+                failures += not ok
+                print(f"{name:6s} pages={len(paths):3d}  budget={budget / MB:6.2f} MB  "
+                      f"pdf={size / MB:6.2f} MB  used={size / budget:5.1%}  {elapsed:6.2f}s  "
+                      f"encodes/page={(PAGE_IO_TOTALS['encode'] - encodes) / len(paths):4.2f}  "
+                      f"{'OK' if ok else 'OVER BUDGET'}")
+    assert failures == 0, f"{failures} runs exceeded the budget"
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
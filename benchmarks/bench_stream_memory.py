@@ -0,0 +1,59 @@
+"""
+قياس أقصى استهلاك للذاكرة (RSS) عند تحميل صفحة طويلة بحجم ~40MB
+مقارنة بين القراءة الكاملة في الذاكرة (الطريقة القديمة) والكتابة المباشرة على القرص
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from PIL import Image
+from benchmarks.local_server import LocalImageServer
+from benchmarks.memory import peak_rss_mb
+
+STRIP_WIDTH = 720
+STRIP_HEIGHT = 18500  # ~40MB كملف PNG غير مضغوط
+
+def make_strip():
+    img = Image.frombytes('RGB', (STRIP_WIDTH, STRIP_HEIGHT), os.urandom(STRIP_WIDTH * STRIP_HEIGHT * 3))
+    path = tempfile.mktemp(suffix='.png')
+    img.save(path, 'PNG', compress_level=0)
+    with open(path, 'rb') as f:
+        data = f.read()
+    os.remove(path)
+    return data
+
+def child(mode, url):
+    from image_downloader import create_session, save_image
+    session = create_session()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'strip.png')
+        if mode == 'buffered':
+            # الطريقة القديمة: قراءة الجسم كاملاً ثم إعادة فتح الملف للتحقق والأبعاد
+            response = session.get(url, timeout=60)
+            with open(path, 'wb') as f:
+                f.write(response.content)
+            with Image.open(path) as img:
+                img.verify()
+            with Image.open(path) as img:
+                size = img.size
+        else:
+            page = save_image(url, path, session, timeout=60)
+            size = (page.width, page.height)
+    peak_mb = peak_rss_mb()
+    print(f"{mode:9s} size={size}  peak RSS={peak_mb:.1f} MB")
+
+def run():
+    data = make_strip()
+    with LocalImageServer({'/strip.png': (data, 'image/png')}) as server:
+        print(f"page bytes: {len(data) / (1024 * 1024):.1f} MB")
+        for mode in ('buffered', 'streamed'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_stream_memory', mode,
+                            server.base_url + 'strip.png'], check=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+    else:
+        run()
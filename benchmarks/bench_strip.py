@@ -0,0 +1,48 @@
+"""
+أقصى ذاكرة عند معالجة شريط ويبتون طويل كصفحة واحدة مقارنة بتقسيمه إلى شرائح
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from PIL import Image
+from benchmarks.local_server import make_manga_image
+from benchmarks.memory import peak_rss_mb
+
+STRIP_WIDTH = 720
+STRIP_HEIGHTS = (15000, 30000, 60000)
+BAND_HEIGHTS = (None, 2000, 4000)
+
+def child(image_path, band_height):
+    import pdf_creator
+    band_height = int(band_height) or None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # بدون تمرير مباشر: الشريط الكامل يُفك ويُرمّز فعلاً، فالمقارنة تقيس التقسيم وحده
+        pdf_creator.create_compressed_pdf([image_path], os.path.join(temp_dir, 'out.pdf'),
+                                          workers=1, max_page_height=band_height, passthrough=False)
+    print(f"  band={band_height or 'whole':>5}  encodes={pdf_creator.PAGE_IO_TOTALS['encode']:3d}  "
+          f"peak RSS={peak_rss_mb():.1f} MB")
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for height in STRIP_HEIGHTS:
+            image_path = os.path.join(temp_dir, f'strip_{height}.jpg')
+            # شريط من صفحات مكررة (توليد 60000px دفعة واحدة مكلف)
+            page = make_manga_image(STRIP_WIDTH, 3000)
+            strip = Image.new('RGB', (STRIP_WIDTH, height), 'white')
+            for top in range(0, height, 3000):
+                strip.paste(page, (0, top))
+            strip.save(image_path, 'JPEG', quality=85)
+            del strip
+            print(f"strip {STRIP_WIDTH}x{height}")
+            for band_height in BAND_HEIGHTS:
+                subprocess.run([sys.executable, '-m', 'benchmarks.bench_strip', image_path,
+                                str(band_height or 0)], check=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+    else:
+        run()
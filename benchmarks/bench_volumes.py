@@ -0,0 +1,57 @@
+"""
+تقسيم الفصول الكبيرة إلى عدة ملفات PDF: زمن وصول الجزء الأول مقارنة بآخر جزء
+وحجم كل جزء مقارنة بالحد (عبر bot.handle_message مع رسائل Telegram مزيفة)
+"""
+import asyncio
+import logging
+import time
+import bot
+from job_runner import JobRunner
+from job_scheduler import JobScheduler
+from benchmarks.bench_bot_load import FakeMessage, FakeUpdate
+from benchmarks.local_server import LocalImageServer, chapter_html, make_page
+
+PAGES = 60
+LIMIT_MB = 4
+
+class RecordingMessage(FakeMessage):
+    """رسالة مزيفة تسجل وقت وصول كل ملف وحجمه"""
+
+    def __init__(self, text, documents):
+        super().__init__(text)
+        self.documents = documents
+
+    async def reply_document(self, document, filename, caption):
+        self.documents.append((time.perf_counter(), filename, len(document.read())))
+
+async def measure(chapter_url):
+    bot.PAGE_CACHE = None
+    bot.JOB_RUNNER = JobRunner()
+    bot.JOB_SCHEDULER = JobScheduler(max_running=bot.JOB_RUNNER.max_jobs)
+    bot.DOWNLOAD_POOL = None
+    bot.TELEGRAM_UPLOAD_LIMIT_MB = LIMIT_MB
+    documents = []
+    started = time.perf_counter()
+    await bot.handle_message(FakeUpdate(RecordingMessage('⚡ ' + chapter_url, documents)), None)
+    finished = time.perf_counter()
+    await bot.close_pools(None)
+    bot.JOB_RUNNER.shutdown()
+    return started, finished, documents
+
+def run():
+    names = [f"{i:03d}.jpg" for i in range(1, PAGES + 1)]
+    files = {f"/chapter/{name}": (make_page(1000, 1400, seed=i), 'image/jpeg') for i, name in enumerate(names)}
+    files['/chapter/'] = (chapter_html(names), 'text/html')
+    with LocalImageServer(files) as server:
+        started, finished, documents = asyncio.run(measure(server.base_url + 'chapter/'))
+    limit = LIMIT_MB * 1024 * 1024
+    for arrived, filename, size in documents:
+        print(f"  {filename:40s} {size / (1024 * 1024):5.2f} MB  at {arrived - started:6.2f}s  "
+              f"{'OK' if size <= limit else 'OVER LIMIT'}")
+    print(f"volumes={len(documents)}  first part after {documents[0][0] - started:.2f}s, "
+          f"job finished after {finished - started:.2f}s")
+    assert all(size <= limit for _, _, size in documents)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    run()
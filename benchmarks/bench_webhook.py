@@ -0,0 +1,203 @@
+"""
+زمن وصول التحديث إلى المعالج في وضعي polling و webhook مع خادم محلي يحاكي Bot API:
+تحديثات متتابعة، دفعة متزامنة مع معالج بطيء (المعالجة بالتوازي)، وعدد الطلبات أثناء الخمول
+"""
+import asyncio
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+import requests
+from telegram.ext import Application, MessageHandler, filters
+from webhook_server import WebhookServer, register_webhook, webhook_secret
+from benchmarks.local_server import QuietHTTPServer
+
+TOKEN = '123456:bench'
+SEQUENTIAL_UPDATES = 100
+SEQUENTIAL_GAP = 0.02
+BURST_UPDATES = 100
+HANDLER_SECONDS = 0.5
+IDLE_SECONDS = 12
+# نفس إعدادات application.run_polling الافتراضية
+POLL_TIMEOUT = 10
+WEBHOOK_CONNECTIONS = 40
+
+class FakeTelegram:
+    """
+    Bot API محلي: getMe، getUpdates (long polling)، setWebhook/deleteWebhook
+    push() ينشئ تحديثاً ويسجل وقته، ثم يسلمه لطلب getUpdates المنتظر أو يرسله إلى رابط webhook
+    (على WEBHOOK_CONNECTIONS اتصالاً متوازياً مثل تيليجرام)
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.sent_at = {}
+        self.requests = Counter()
+        self.webhook = None
+        self._next_id = 1
+        self._condition = threading.Condition()
+        self._delivery = ThreadPoolExecutor(WEBHOOK_CONNECTIONS)
+        self._sessions = threading.local()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def push(self, text='ping'):
+        with self._condition:
+            update_id = self._next_id
+            self._next_id += 1
+            update = {'update_id': update_id, 'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': text,
+                'chat': {'id': 1, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': False, 'first_name': 'bench'},
+            }}
+            self.sent_at[update_id] = time.perf_counter()
+            if self.webhook:
+                self._delivery.submit(self._deliver, update, *self.webhook)
+            else:
+                self.pending.append(update)
+                self._condition.notify_all()
+
+    def _deliver(self, update, url, secret):
+        session = getattr(self._sessions, 'session', None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        session.post(url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': secret}, timeout=10)
+
+    def get_updates(self, offset, timeout):
+        """long polling: الانتظار حتى وصول تحديث جديد أو انتهاء المهلة"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self.pending = [update for update in self.pending if update['update_id'] >= offset]
+            while not self.pending and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            return list(self.pending)
+
+    def call(self, method, params):
+        self.requests[method] += 1
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if method == 'getUpdates':
+            return self.get_updates(int(params.get('offset', 0)), float(params.get('timeout', 0)))
+        if method == 'setWebhook':
+            self.webhook = (params['url'], params.get('secret_token', ''))
+            return True
+        if method == 'deleteWebhook':
+            self.webhook = None
+            return True
+        return True
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+                params = json.loads(body) if 'json' in self.headers.get('Content-Type', '') else dict(parse_qsl(body))
+                payload = json.dumps({'ok': True, 'result': fake.call(self.path.rsplit('/', 1)[1], params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def __enter__(self):
+        self._server = QuietHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._delivery.shutdown(wait=False, cancel_futures=True)
+        self._server.shutdown()
+        self._server.server_close()
+
+def build_application(fake, latencies, handler_seconds):
+    async def record(update, context):
+        latencies.append(time.perf_counter() - fake.sent_at[update.update_id])
+        if handler_seconds[0]:
+            await asyncio.sleep(handler_seconds[0])
+
+    # نفس إعدادات bot.main: معالجة التحديثات بالتوازي
+    application = Application.builder().token(TOKEN).base_url(fake.base_url).concurrent_updates(True).build()
+    application.add_handler(MessageHandler(filters.TEXT, record))
+    return application
+
+async def wait_for(latencies, count, timeout=30):
+    deadline = time.monotonic() + timeout
+    while len(latencies) < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+def summary(label, latencies):
+    values = sorted(value * 1000 for value in latencies)
+    p95 = values[int(len(values) * 0.95) - 1]
+    print(f"  {label:28s} n={len(values):3d}  p50={statistics.median(values):6.1f} ms  "
+          f"p95={p95:6.1f} ms  max={values[-1]:7.1f} ms")
+
+async def measure(fake, mode):
+    latencies = []
+    handler_seconds = [0]
+    application = build_application(fake, latencies, handler_seconds)
+    async with application:
+        await application.start()
+        server = None
+        if mode == 'polling':
+            await application.updater.start_polling(poll_interval=0, timeout=POLL_TIMEOUT)
+        else:
+            secret = webhook_secret(TOKEN)
+            server = WebhookServer(application, secret, port=0, host='127.0.0.1')
+            await server.start()
+            await register_webhook(application, f"http://127.0.0.1:{server.port}", secret)
+        await asyncio.sleep(0.5)
+
+        print(f"{mode}:")
+        for _ in range(SEQUENTIAL_UPDATES):
+            fake.push()
+            await asyncio.sleep(SEQUENTIAL_GAP)
+        await wait_for(latencies, SEQUENTIAL_UPDATES)
+        summary(f"sequential (gap {SEQUENTIAL_GAP * 1000:.0f} ms)", latencies)
+
+        # دفعة واحدة مع معالج يستغرق HANDLER_SECONDS: بدون توازٍ يتأخر آخر تحديث 50 ثانية
+        latencies.clear()
+        handler_seconds[0] = HANDLER_SECONDS
+        started = time.perf_counter()
+        for _ in range(BURST_UPDATES):
+            fake.push()
+        await wait_for(latencies, BURST_UPDATES)
+        summary(f"burst, handler {HANDLER_SECONDS}s", latencies)
+        print(f"  {'burst handlers all started':28s} {time.perf_counter() - started:6.2f} s")
+        await asyncio.sleep(HANDLER_SECONDS * 2)
+
+        before = sum(fake.requests.values())
+        await asyncio.sleep(IDLE_SECONDS)
+        print(f"  {'idle Bot API requests':28s} {sum(fake.requests.values()) - before} in {IDLE_SECONDS}s")
+
+        if server:
+            await server.stop()
+        else:
+            await application.updater.stop()
+        await application.stop()
+
+def run():
+    for mode in ('polling', 'webhook'):
+        with FakeTelegram() as fake:
+            asyncio.run(measure(fake, mode))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
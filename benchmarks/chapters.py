@@ -0,0 +1,97 @@
+"""
+فصول مانجا اصطناعية ثابتة (نفس البذرة = نفس البايتات) لمجموعة القياسات:
+صفحات عادية، شريط ويبتون بطول 60000 بكسل، صفحات رمادية، PNG بقناة شفافية، وملفات تالفة
+"""
+import io
+import json
+import os
+import random
+from PIL import Image
+from benchmarks.local_server import chapter_html, make_manga_image
+from benchmarks.bench_page_classes import make_color_page
+
+# (النوع، العدد، الأبعاد): الصفحات أعرض من حد الأوضاع المضغوطة حتى تمر فعلاً بالترميز
+# والشريط بعرض قريب من الصفحات حتى لا تستبعده تصفية العرض عند التحميل
+DEFAULT_CHAPTER = (
+    ('normal', 12, (1800, 2600)),
+    ('gray', 4, (1800, 2600)),
+    ('png_rgba', 2, (1600, 2400)),
+    ('strip', 1, (1200, 60000)),
+    ('truncated', 1, (1800, 2600)),
+    ('garbage', 1, (1800, 2600)),
+)
+# ارتفاع الصفحة التي يُبنى منها الشريط الطويل (توليد 60000 بكسل دفعة واحدة بطيء)
+STRIP_TILE_HEIGHT = 3000
+MANIFEST_NAME = 'chapter.json'
+
+def encode(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+def make_strip(width, height, seed):
+    """شريط ويبتون من لوحات متتالية مختلفة البذور"""
+    strip = Image.new('RGB', (width, height), 'white')
+    for index, top in enumerate(range(0, height, STRIP_TILE_HEIGHT)):
+        strip.paste(make_color_page(width, STRIP_TILE_HEIGHT, seed=seed * 100 + index), (0, top))
+    return strip
+
+def make_file(kind, size, seed):
+    """بيانات ملف واحد من النوع المطلوب: (الامتداد، البايتات)"""
+    if kind == 'normal':
+        return '.jpg', encode(make_color_page(*size, seed=seed), 'JPEG', quality=90)
+    if kind == 'gray':
+        return '.jpg', encode(make_manga_image(*size, seed=seed).convert('L'), 'JPEG', quality=90)
+    if kind == 'png_rgba':
+        img = make_color_page(*size, seed=seed).convert('RGBA')
+        img.putalpha(make_manga_image(*size, seed=seed + 1).convert('L').point(lambda v: 255 - v // 4))
+        return '.png', encode(img, 'PNG')
+    if kind == 'strip':
+        return '.jpg', encode(make_strip(*size, seed=seed), 'JPEG', quality=88)
+    if kind == 'truncated':
+        data = encode(make_color_page(*size, seed=seed), 'JPEG', quality=90)
+        return '.jpg', data[:len(data) // 2]
+    if kind == 'garbage':
+        return '.jpg', random.Random(seed).randbytes(64 * 1024)
+    raise Exception(f"نوع صفحة غير معروف: {kind}")
+
+def write_chapter(directory, spec=DEFAULT_CHAPTER, seed=0):
+    """
+    كتابة صفحات الفصل في directory بترتيب قراءة مختلط الأنواع وإرجاع قائمة الأسماء
+    الترتيب والمحتوى ثابتان لنفس spec و seed
+    """
+    entries = []
+    for kind, count, size in spec:
+        for index in range(count):
+            entries.append((kind, size, seed * 1000 + len(entries)))
+    random.Random(seed).shuffle(entries)
+
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for number, (kind, size, page_seed) in enumerate(entries, 1):
+        extension, data = make_file(kind, size, page_seed)
+        name = f"{number:03d}_{kind}{extension}"
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+        names.append(name)
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump({'seed': seed, 'spec': spec, 'pages': names}, f)
+    return names
+
+def chapter_pages(directory):
+    """مسارات صفحات فصل مكتوب بالترتيب"""
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        return [os.path.join(directory, name) for name in json.load(f)['pages']]
+
+def chapter_files(directory, prefix='/chapter/'):
+    """ملفات الفصل بصيغة LocalImageServer مع صفحة HTML تحتوي الصور بالترتيب"""
+    files = {}
+    names = []
+    for path in chapter_pages(directory):
+        name = os.path.basename(path)
+        content_type = 'image/png' if name.endswith('.png') else 'image/jpeg'
+        with open(path, 'rb') as f:
+            files[prefix + name] = (f.read(), content_type)
+        names.append(name)
+    files[prefix] = (chapter_html(names), 'text/html')
+    return files
@@ -0,0 +1,59 @@
+"""
+صفحات متفرقة (بيضاء غالباً مع بضع فقاعات كلام) مختلفة كلها: filter_pages و StreamingPageFilter
+يجب أن يحتفظا بالصفحات جميعها، بينما النسخة المكبرة من نفس وسم img تبقى تُدمج
+"""
+import logging
+import os
+import random
+import tempfile
+from PIL import Image, ImageDraw
+from image_downloader import PageInfo
+from page_filter import StreamingPageFilter, filter_pages
+
+PAGES = 40
+
+def make_sparse_page(seed, width=800, height=1200):
+    """صفحة بيضاء مع 2-4 فقاعات كلام وأسطر نص قصيرة داخلها"""
+    rnd = random.Random(seed)
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(rnd.randint(2, 4)):
+        w, h = rnd.randint(120, 260), rnd.randint(80, 160)
+        x, y = rnd.randint(20, width - w - 20), rnd.randint(20, height - h - 20)
+        draw.ellipse([x, y, x + w, y + h], outline=0, width=3)
+        for line in range(rnd.randint(1, 3)):
+            top = y + h // 3 + line * 14
+            draw.line([x + w // 4, top, x + w * 3 // 4 - rnd.randint(0, w // 4), top], fill=0, width=4)
+    return img
+
+def save_page(img, path, source=None):
+    img.convert('RGB').save(path, 'JPEG', quality=85)
+    return PageInfo(path, 'JPEG', img.width, img.height, os.path.getsize(path), source)
+
+def run():
+    # وسوم مختلفة (اكتشاف من الصفحة)، ثم دون وسم (التسلسل الرقمي: كل صفحتين متجاورتين تُقارنان)
+    for label, with_source in (('found', True), ('sequential', False)):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pages = [save_page(make_sparse_page(seed), os.path.join(temp_dir, f"{seed:03d}.jpg"),
+                               source=seed if with_source else None)
+                     for seed in range(PAGES)]
+            streaming = StreamingPageFilter()
+            accepted = sum(streaming.accept(page) for page in pages)
+            kept = filter_pages(pages)
+            print(f"sparse {label:10s} pages={PAGES}  filter_pages kept={len(kept)}  streaming accepted={accepted}")
+            assert len(kept) == PAGES, len(kept)
+            assert accepted == PAGES, accepted
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # نفس وسم img بمقاسين (data-src ورابط النسخة الكبيرة) بينهما صفحة أخرى
+        page = make_sparse_page(1)
+        pages = [save_page(page, os.path.join(temp_dir, 'a.jpg'), source=1),
+                 save_page(make_sparse_page(2), os.path.join(temp_dir, 'b.jpg'), source=2),
+                 save_page(page.resize((1200, 1800)), os.path.join(temp_dir, 'c.jpg'), source=1)]
+        kept = filter_pages(pages)
+        print(f"same <img> at two sizes: kept={len(kept)} (largest={kept[0].width}x{kept[0].height})")
+        assert len(kept) == 2 and kept[0].width == 1200, kept
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
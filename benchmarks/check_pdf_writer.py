@@ -0,0 +1,48 @@
+"""
+صفحة تالفة بين صفحتين سليمتين: add_image يرفع الخطأ، والمستند يُغلق بالصفحتين السليمتين
+(جدول xref لا يشير إلى كائنات ناقصة ولا تبقى بقايا الصفحة الفاشلة في الملف)
+"""
+import io
+import logging
+import os
+import tempfile
+from PIL import Image
+from pdf_writer import StreamingPdfWriter
+from benchmarks.local_server import make_manga_image
+
+def png_bytes(seed):
+    buffer = io.BytesIO()
+    make_manga_image(600, 900, seed=seed).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def run():
+    good = png_bytes(1)
+    truncated = png_bytes(2)[:20000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'out.pdf')
+        writer = StreamingPdfWriter(output_path)
+        writer.add_image(good)
+        size_before = writer.bytes_written
+        try:
+            writer.add_image(truncated)
+            raise AssertionError("الصفحة التالفة لم ترفع خطأ")
+        except OSError as e:
+            print(f"bad page rejected: {e}")
+        assert writer.bytes_written == size_before, (writer.bytes_written, size_before)
+        writer.add_image(good)
+        writer.close()
+        print(f"pages={writer.page_count}  pdf={os.path.getsize(output_path)} bytes")
+        assert writer.page_count == 2
+        try:
+            import pikepdf
+        except ImportError:
+            return
+        with pikepdf.open(output_path) as pdf:
+            assert len(pdf.pages) == 2
+            problems = pdf.check_pdf_syntax()
+            assert not problems, problems
+        print("pikepdf: document valid")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    run()
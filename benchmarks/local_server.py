@@ -0,0 +1,215 @@
+"""
+خادم HTTP محلي يحاكي موقع المانجا لاستخدامه في القياسات
+"""
+import hashlib
+import io
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image, ImageDraw, ImageFilter
+
+# الفترة بين أجزاء الإرسال عند تحديد bandwidth
+THROTTLE_TICK = 0.02
+# تاريخ تعديل ثابت لكل الملفات (Last-Modified)
+FILES_MODIFIED = formatdate(1700000000, usegmt=True)
+
+def make_page(width=800, height=1200, seed=0, fmt='JPEG', quality=85):
+    """إنشاء صفحة اصطناعية تشبه صفحة مانجا (خطوط ونصوص رمادية)"""
+    img = Image.effect_noise((width, height), 40 + seed % 20).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, quality=quality)
+    return buffer.getvalue()
+
+def make_manga_image(width=800, height=1200, seed=0):
+    """صفحة أبيض وأسود اصطناعية بإطارات وخطوط ودوائر (أقرب لصفحة حقيقية من الضوضاء)"""
+    rnd = random.Random(seed)
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    margin = max(4, width // 200)
+    y = margin * 4
+    while y < height - margin * 8:
+        panel_height = rnd.randint(height // 6, height // 3)
+        bottom = min(y + panel_height, height - margin * 4)
+        draw.rectangle([margin * 4, y, width - margin * 4, bottom], outline=0, width=margin)
+        for _ in range(12):
+            cx, cy = rnd.randint(0, width), rnd.randint(y, bottom)
+            r = rnd.randint(width // 40, width // 8)
+            draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=0, width=max(1, margin // 2),
+                         fill=rnd.choice([255, 200, 120]))
+        for _ in range(20):
+            draw.line([rnd.randint(0, width), rnd.randint(y, bottom),
+                       rnd.randint(0, width), rnd.randint(y, bottom)], fill=0, width=max(1, margin // 3))
+        y = bottom + margin * 6
+    return img.filter(ImageFilter.GaussianBlur(0.6)).convert('RGB')
+
+def chapter_html(filenames):
+    """صفحة HTML بسيطة تحتوي على وسوم img بالترتيب"""
+    tags = ''.join(f'<img src="{name}">' for name in filenames)
+    return f'<html><body>{tags}</body></html>'.encode()
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """تجاهل انقطاع الاتصال من العميل (مثل إلغاء التحميل) دون طباعة الخطأ"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class LocalImageServer:
+    """
+    خادم محلي في خيط منفصل:
+    files: قاموس {المسار: (البيانات, نوع المحتوى)}
+    latency: تأخير مصطنع لكل طلب بالثواني
+    bandwidth: حد سرعة الإرسال لكل اتصال بالبايت/ثانية (None بلا حد)
+    الملفات تُرسل مع ETag و Last-Modified، وتدعم If-None-Match (304) و Range/If-Range (206)
+
+    inject(path, *faults) يضيف أعطالاً تُستهلك بالترتيب مع طلبات GET التالية للمسار:
+      ('reset', fraction): إرسال جزء من الجسم ثم قطع الاتصال
+      ('status', code, retry_after): استجابة خطأ (مع Retry-After إن لم تكن None)
+      ('stall', seconds): التوقف قبل إرسال الجسم (لاختبار المهلة)
+    """
+
+    def __init__(self, files, latency=0.0, bandwidth=None):
+        self.files = dict(files)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.faults = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def inject(self, path, *faults):
+        with self._lock:
+            self.faults[path].extend(faults)
+
+    def _next_fault(self, path):
+        with self._lock:
+            queue = self.faults.get(path)
+            return queue.popleft() if queue else None
+
+    def _count_sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def _send_body(self, wfile, body):
+        """إرسال الجسم دفعة واحدة، أو على أجزاء بحد bandwidth (جزء كل THROTTLE_TICK ثانية)"""
+        self._count_sent(len(body))
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        chunk_size = max(1, int(self.bandwidth * THROTTLE_TICK))
+        started = time.monotonic()
+        for offset in range(0, len(body), chunk_size):
+            wfile.write(body[offset:offset + chunk_size])
+            # الانتظار حتى موعد الجزء التالي حسب ما أُرسل حتى الآن
+            delay = started + (offset + chunk_size) / self.bandwidth - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_empty(self, status, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def _requested_range(self, body, etag):
+                """بداية النطاق المطلوب (Range: bytes=N-) إن كان صالحاً ولم تتغير النسخة، وإلا None"""
+                requested = self.headers.get('Range', '')
+                if not requested.startswith('bytes=') or not requested.endswith('-'):
+                    return None
+                if_range = self.headers.get('If-Range')
+                if if_range and if_range not in (etag, FILES_MODIFIED):
+                    return None
+                try:
+                    return int(requested[len('bytes='):-1])
+                except ValueError:
+                    return None
+
+            def _respond(self, send_body):
+                path = self.path.split('?')[0]
+                with server._lock:
+                    server.requests[(self.command, path)] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                entry = server.files.get(path)
+                if entry is None:
+                    self._send_empty(404)
+                    return
+                body, content_type = entry
+                fault = server._next_fault(path) if send_body else None
+                if fault and fault[0] == 'status':
+                    _, status, retry_after = fault
+                    self._send_empty(status, [('Retry-After', str(retry_after))] if retry_after is not None else [])
+                    return
+
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if etag in self.headers.get('If-None-Match', ''):
+                    self._send_empty(304, [('ETag', etag)])
+                    return
+                start = self._requested_range(body, etag)
+                if start is not None and start >= len(body):
+                    self._send_empty(416, [('Content-Range', f'bytes */{len(body)}')])
+                    return
+                self.send_response(200 if start is None else 206)
+                self.send_header('Content-Type', content_type)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', FILES_MODIFIED)
+                self.send_header('Accept-Ranges', 'bytes')
+                if start is not None:
+                    self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+                    body = body[start:]
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not send_body:
+                    return
+                if fault and fault[0] == 'stall':
+                    time.sleep(fault[1])
+                if fault and fault[0] == 'reset':
+                    # إرسال جزء ثم إغلاق الاتصال: العميل يرى جسماً أقصر من Content-Length
+                    server._send_body(self.wfile, body[:int(len(body) * fault[1])])
+                    self.close_connection = True
+                    return
+                server._send_body(self.wfile, body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+        return Handler
+
+    def __enter__(self):
+        self._server = QuietHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
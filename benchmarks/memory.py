@@ -0,0 +1,11 @@
+"""
+قياس الذاكرة في القياسات
+"""
+
+def peak_rss_mb():
+    """أقصى RSS للعملية الحالية (VmHWM لا يرث قيمة العملية الأم بعكس ru_maxrss)"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
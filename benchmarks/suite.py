@@ -0,0 +1,250 @@
+"""
+مجموعة قياسات ثابتة قابلة للتكرار لكل مسارات التحميل وإنشاء PDF:
+- فصل اصطناعي ثابت (benchmarks/chapters.py) على خادم محلي بتأخير وحد سرعة
+- كل سيناريو يعمل في عملية جديدة (ذاكرة نظيفة) ويُكرر --repeat مرات ونأخذ الوسيط
+- النتائج: زمن فعلي، زمن معالج (العملية + عمليات المعالجة)، أقصى RSS، بايتات الناتج
+- المقارنة مع baseline.json ووسم التراجع الذي يتجاوز --threshold (رمز خروج 1)
+
+    python -m benchmarks.suite --save              # تسجيل خط الأساس على هذا الجهاز
+    python -m benchmarks.suite                     # القياس والمقارنة
+    python -m benchmarks.suite --scenarios create_pdf create_sized_pdf --threshold 0.2
+
+خط الأساس خاص بالجهاز الذي سُجل عليه (عدد المعالجات وسرعتها)، فيُسجل ويُقارن على نفس الجهاز
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.chapters import DEFAULT_CHAPTER, MANIFEST_NAME, chapter_files, chapter_pages, write_chapter
+from benchmarks.local_server import LocalImageServer
+from benchmarks.memory import peak_rss_mb
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# نسبة التراجع المسموحة قبل الوسم (0.10 = أبطأ أو أكبر بـ 10%)
+DEFAULT_THRESHOLD = float(os.environ.get('BENCH_THRESHOLD', 0.10))
+DEFAULT_LATENCY = 0.02
+# حد سرعة كل اتصال بالبايت/ثانية
+DEFAULT_BANDWIDTH = 8 * 1024 * 1024
+DEFAULT_REPEAT = 3
+# ميزانية وضع fit في السيناريو (أصغر من الفصل حتى يعمل اختيار المستويات فعلاً)
+SIZED_TARGET_BYTES = 6 * 1024 * 1024
+METRICS = ('wall_s', 'cpu_s', 'peak_rss_mb', 'workers_peak_rss_mb', 'output_bytes')
+# فروق أصغر من هذه لا تعتبر تراجعاً مهما كانت النسبة (ضجيج القياس في القيم الصغيرة)
+MIN_ABSOLUTE_CHANGE = {'wall_s': 0.05, 'cpu_s': 0.05, 'peak_rss_mb': 8, 'workers_peak_rss_mb': 8,
+                       'output_bytes': 4096}
+
+def output_size(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def download_dir_size(directory):
+    return output_size([os.path.join(directory, name) for name in os.listdir(directory)])
+
+def run_download_images(pages, work_dir, chapter_url):
+    from image_downloader import download_images
+    download_dir = os.path.join(work_dir, 'download')
+    os.makedirs(download_dir)
+    download_images(chapter_url, download_dir)
+    return download_dir_size(download_dir)
+
+def run_download_images_async(pages, work_dir, chapter_url):
+    from image_downloader_async import download_images_async
+    download_dir = os.path.join(work_dir, 'download')
+    os.makedirs(download_dir)
+    asyncio.run(download_images_async(chapter_url, download_dir))
+    return download_dir_size(download_dir)
+
+def run_create_pdf(pages, work_dir, chapter_url):
+    from pdf_creator import create_pdf
+    return output_size(create_pdf(pages, os.path.join(work_dir, 'out.pdf'), 'balanced'))
+
+def run_create_compressed_pdf(pages, work_dir, chapter_url):
+    from pdf_creator import create_compressed_pdf
+    return output_size(create_compressed_pdf(pages, os.path.join(work_dir, 'out.pdf')))
+
+def run_create_high_quality_pdf(pages, work_dir, chapter_url):
+    from pdf_creator_high_quality import create_high_quality_pdf
+    return output_size(create_high_quality_pdf(pages, os.path.join(work_dir, 'out.pdf')))
+
+def run_create_simple_pdf(pages, work_dir, chapter_url):
+    from pdf_creator_simple import create_simple_pdf
+    return output_size(create_simple_pdf(pages, os.path.join(work_dir, 'out.pdf')))
+
+def run_create_sized_pdf(pages, work_dir, chapter_url):
+    from pdf_creator_sized import create_sized_pdf
+    return create_sized_pdf(pages, os.path.join(work_dir, 'out.pdf'), SIZED_TARGET_BYTES)
+
+def run_stream_pdf(pages, work_dir, chapter_url):
+    from pdf_pipeline import stream_pdf_async
+    download_dir = os.path.join(work_dir, 'download')
+    os.makedirs(download_dir)
+    return output_size(asyncio.run(stream_pdf_async(chapter_url, download_dir,
+                                                    os.path.join(work_dir, 'out.pdf'))))
+
+SCENARIOS = {
+    'download_images': run_download_images,
+    'download_images_async': run_download_images_async,
+    'create_pdf': run_create_pdf,
+    'create_compressed_pdf': run_create_compressed_pdf,
+    'create_high_quality_pdf': run_create_high_quality_pdf,
+    'create_simple_pdf': run_create_simple_pdf,
+    'create_sized_pdf': run_create_sized_pdf,
+    'stream_pdf': run_stream_pdf,
+}
+
+def cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+def measure_scenario(name, chapter_dir, chapter_url):
+    """تشغيل سيناريو واحد في العملية الحالية (عملية جديدة لكل تشغيل) وإرجاع القياسات"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        # الصفحات تُنسخ حتى لا تختلط ملفات الإنشاء المؤقتة بنسخة الفصل المشتركة
+        input_dir = os.path.join(work_dir, 'input')
+        os.makedirs(input_dir)
+        pages = [shutil.copy(path, input_dir) for path in chapter_pages(chapter_dir)]
+
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.perf_counter()
+        output_bytes = SCENARIOS[name](pages, work_dir, chapter_url)
+        wall = time.perf_counter() - started
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu_seconds(self_after) - cpu_seconds(self_before)
+                       + cpu_seconds(children_after) - cpu_seconds(children_before), 4),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'workers_peak_rss_mb': round(children_after.ru_maxrss / 1024, 1),
+        'output_bytes': output_bytes,
+    }
+
+def run_in_child(name, chapter_dir, chapter_url):
+    """تشغيل السيناريو في عملية Python جديدة؛ القياسات في آخر سطر من مخرجاتها"""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.suite', '--child', name, chapter_dir, chapter_url],
+        cwd=repo_root, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise Exception(f"فشل السيناريو {name}:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def median_result(runs):
+    return {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+
+def find_regressions(results, baseline, threshold):
+    """(السيناريو، المقياس، القيمة الحالية، قيمة خط الأساس) لكل تراجع يتجاوز threshold"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if not reference:
+            continue
+        for metric in METRICS:
+            current, previous = result[metric], reference.get(metric)
+            if not previous:
+                continue
+            if current > previous * (1 + threshold) and current - previous > MIN_ABSOLUTE_CHANGE[metric]:
+                regressions.append((name, metric, current, previous))
+    return regressions
+
+def describe_conditions(args):
+    return {
+        'chapter': {'spec': DEFAULT_CHAPTER, 'seed': args.seed},
+        'latency': args.latency,
+        'bandwidth': args.bandwidth,
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+
+def format_change(current, previous):
+    if not previous:
+        return '    new'
+    return f"{current / previous - 1:+7.1%}"
+
+def prepare_chapter(chapter_dir, seed):
+    """توليد الفصل مرة واحدة؛ مجلد محدد بـ --chapter-dir يُعاد استخدامه إذا كان بنفس البذرة والمواصفات"""
+    manifest = os.path.join(chapter_dir, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            existing = json.load(f)
+        if existing['seed'] == seed and existing['spec'] == json.loads(json.dumps(DEFAULT_CHAPTER)):
+            return
+    started = time.perf_counter()
+    names = write_chapter(chapter_dir, seed=seed)
+    print(f"generated {len(names)} pages in {time.perf_counter() - started:.1f}s → {chapter_dir}")
+
+def run_suite(args, chapter_dir):
+    prepare_chapter(chapter_dir, args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('conditions') != json.loads(json.dumps(describe_conditions(args))):
+            print("⚠️ conditions differ from the baseline; comparisons may not be meaningful")
+
+    results = {}
+    with LocalImageServer(chapter_files(chapter_dir), latency=args.latency, bandwidth=args.bandwidth) as server:
+        chapter_url = server.base_url + 'chapter/'
+        print(f"{'scenario':24s} {'wall s':>8s} {'cpu s':>8s} {'rss MB':>8s} {'workers MB':>10s} "
+              f"{'output KB':>10s} {'wall Δ':>8s} {'cpu Δ':>8s}")
+        for name in args.scenarios:
+            runs = [run_in_child(name, chapter_dir, chapter_url) for _ in range(args.repeat)]
+            result = results[name] = median_result(runs)
+            reference = baseline.get('scenarios', {}).get(name, {})
+            print(f"{name:24s} {result['wall_s']:8.2f} {result['cpu_s']:8.2f} {result['peak_rss_mb']:8.1f} "
+                  f"{result['workers_peak_rss_mb']:10.1f} {result['output_bytes'] / 1024:10.0f} "
+                  f"{format_change(result['wall_s'], reference.get('wall_s'))} "
+                  f"{format_change(result['cpu_s'], reference.get('cpu_s'))}")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'conditions': describe_conditions(args), 'scenarios': results}, f, indent=2)
+        print(f"baseline saved → {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, metric, current, previous in regressions:
+        print(f"REGRESSION {name}.{metric}: {previous} → {current} ({current / previous - 1:+.1%})")
+    if baseline and not regressions:
+        print(f"no regressions beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="benchmark suite with a JSON baseline")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY)
+    parser.add_argument('--bandwidth', type=int, default=DEFAULT_BANDWIDTH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--chapter-dir', help="reuse a generated chapter between runs")
+    parser.add_argument('--save', action='store_true', help="record the results as the new baseline")
+    return parser.parse_args(argv)
+
+def main(argv):
+    if argv[:1] == ['--child']:
+        name, chapter_dir, chapter_url = argv[1:4]
+        logging.getLogger().setLevel(logging.ERROR)
+        print(json.dumps(measure_scenario(name, chapter_dir, chapter_url)))
+        return 0
+
+    args = parse_args(argv)
+    if args.chapter_dir:
+        return run_suite(args, args.chapter_dir)
+    with tempfile.TemporaryDirectory() as chapter_dir:
+        return run_suite(args, chapter_dir)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    sys.exit(main(sys.argv[1:]))
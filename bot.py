@@ -1,12 +1,22 @@
 import os
+import asyncio
 import logging
 import tempfile
 import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from image_downloader import download_images
-from pdf_creator import create_compressed_pdf
-from pdf_creator_high_quality import create_high_quality_pdf
+from image_downloader_async import AsyncDownloadPool, download_pages_async
+from pdf_pipeline import stream_pdf_async, NoPagesFound
+from pdf_creator import PDF_WORKERS
+from pdf_creator_sized import create_sized_pdf, TELEGRAM_UPLOAD_LIMIT_MB
+from page_cache import create_default_cache
+from job_runner import JobRunner
+from job_scheduler import JobScheduler, JobRejected
+from metrics import JobMetrics, add, span, start_metrics_server
+from webhook_server import WEBHOOK_URL, WEBHOOK_PORT, run_webhook
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -16,6 +26,95 @@ logging.basicConfig(
 
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
 
+# ذاكرة مؤقتة مشتركة بين الطلبات للتحميلات والصفحات المعالجة
+PAGE_CACHE = create_default_cache()
+
+# تنفيذ التحميل وإنشاء PDF في خيوط منفصلة مع حد للمهام المتزامنة
+JOB_RUNNER = JobRunner()
+
+# طابور الطلبات: دور عادل بين المستخدمين ورفض الطلبات عند طول الانتظار
+JOB_SCHEDULER = JobScheduler(max_running=JOB_RUNNER.max_jobs)
+
+# مجمع اتصالات HTTP مشترك بين جميع الطلبات (يُنشأ داخل حلقة الأحداث عند أول استخدام)
+DOWNLOAD_POOL = None
+
+# عمليات معالجة الصفحات مشتركة بين جميع الطلبات (PDF_WORKERS عملية مهما كان عدد المهام)
+PROCESS_POOL = None
+
+# المهام الجارية لكل مستخدم حتى يمكن إلغاؤها بالأمر /cancel
+ACTIVE_JOBS = {}
+
+def download_pool():
+    global DOWNLOAD_POOL
+    if DOWNLOAD_POOL is None:
+        DOWNLOAD_POOL = AsyncDownloadPool()
+    return DOWNLOAD_POOL
+
+def process_pool():
+    """
+    مجموعة العمليات المشتركة (None مع عملية واحدة: كل مهمة تعالج في خيط منفصل)
+    العمليات تُنشأ فوراً عند أول استدعاء (من main قبل بدء الخيوط) لا عند أول مهمة
+    """
+    global PROCESS_POOL
+    if PROCESS_POOL is not None:
+        # موت عملية فرعية (نفاد الذاكرة مثلاً) يعطل المجموعة كلها فيرفض submit كل مهمة
+        # بـ BrokenProcessPool: نتحقق بمهمة فارغة وننشئ مجموعة جديدة عند الحاجة
+        try:
+            PROCESS_POOL.submit(os.getpid).result()
+        except BrokenProcessPool:
+            logging.warning("⚠️ مجموعة العمليات معطلة، إنشاء مجموعة جديدة")
+            PROCESS_POOL.shutdown(wait=False, cancel_futures=True)
+            PROCESS_POOL = None
+    if PROCESS_POOL is None and PDF_WORKERS > 1:
+        PROCESS_POOL = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        PROCESS_POOL.submit(os.getpid).result()
+    return PROCESS_POOL
+
+def status_ticker(status_message, text):
+    """تحديث رسالة الحالة بالزمن المنقضي أثناء تنفيذ المهمة"""
+    async def on_tick(elapsed):
+        await status_message.edit_text(f"{text}\n⏱️ {elapsed:.0f} ثانية")
+    return on_tick
+
+def progress_ticker(status_message, progress):
+    """تحديث رسالة الحالة بعدد الصور المحملة والصفحات المكتوبة أثناء خط المعالجة"""
+    async def on_tick(elapsed):
+        await status_message.edit_text(
+            f"⏳ جاري التحميل وإنشاء PDF...\n"
+            f"📥 تم تحميل {progress['downloaded']} صورة\n"
+            f"📄 تمت كتابة {progress['written']} صفحة\n"
+            f"⏱️ {elapsed:.0f} ثانية"
+        )
+    return on_tick
+
+async def send_pdf(update, pdf_path, quality_mode, page_count, part=None):
+    """إرسال ملف PDF (أو جزء منه) للمستخدم، ويرجع True عند النجاح"""
+    file_size = os.path.getsize(pdf_path) / (1024 * 1024)
+    quality_emoji = {"high": "🎨", "balanced": "⚡", "fit": "🎯"}.get(quality_mode, "📄")
+    filename = f"images_{quality_mode}_quality.pdf"
+    caption = (f"{quality_emoji} تم الإنشاء بنجاح!\n"
+               f"حجم الملف: {file_size:.2f} MB\n"
+               f"عدد الصور: {page_count}\n"
+               f"وضع الجودة: {quality_mode}")
+    if part:
+        filename = f"images_{quality_mode}_quality_part{part:02d}.pdf"
+        caption = f"📚 الجزء {part}\n" + caption
+    try:
+        with open(pdf_path, 'rb') as pdf_file:
+            async with span('upload'):
+                await update.message.reply_document(document=pdf_file, filename=filename, caption=caption)
+        add('bytes_out_total', 'upload', os.path.getsize(pdf_path))
+        return True
+    except Exception as send_error:
+        logging.error(f"❌ فشل إرسال {os.path.basename(pdf_path)} ({file_size:.2f} MB): {send_error}")
+        return False
+
+def queue_notifier(status_message):
+    """إبلاغ المستخدم بترتيبه في الطابور عند كل تغير"""
+    async def on_position(position):
+        await status_message.edit_text(f"📋 أنت رقم {position} في الطابور، سيبدأ طلبك تلقائياً...")
+    return on_position
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة أمر /start"""
     welcome_text = """
@@ -31,9 +130,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     ⚡ للإعدادات السريعة: أرسل الرابط مباشرة
     🎛 للإعدادات المتقدمة: أرسل /quality ثم الرابط
+    🛑 لإلغاء طلب جارٍ: أرسل /cancel
     """
     await update.message.reply_text(welcome_text)
 
+async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """إلغاء طلبات المستخدم الجارية (التحميلات الجارية تتوقف فوراً)"""
+    tasks = ACTIVE_JOBS.get(update.effective_user.id)
+    if not tasks:
+        await update.message.reply_text("ℹ️ لا يوجد طلب جارٍ لإلغائه")
+        return
+    for task in list(tasks):
+        task.cancel()
+    await update.message.reply_text(f"🛑 جاري إلغاء {len(tasks)} طلب...")
+
 async def handle_quality(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """خيارات الجودة"""
     quality_text = """
@@ -42,6 +152,7 @@ async def handle_quality(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ⚡ سريع (افتراضي) - ضغط جيد مع حجم معقول
     🎨 عالي - جودة أفضل مع حجم أكبر
     📄 أصغر - أقصى ضغط مع جودة أقل
+    🎯 مناسب للإرسال - أفضل جودة ممكنة ضمن حد حجم ملفات Telegram
 
     أرسل الرابط بعد اختيارك:
     مثال: ⚡ https://example.com/images/
@@ -65,6 +176,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif user_input.startswith('📄 '):
         quality_mode = "small"
         url = user_input[2:].strip()
+    elif user_input.startswith('🎯 '):
+        quality_mode = "fit"
+        url = user_input[2:].strip()
     
     # التحقق من أن الرسالة تحتوي على رابط
     if not url.startswith(('http://', 'https://')):
@@ -73,103 +187,155 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     status_message = await update.message.reply_text("🔄 جاري معالجة طلبك...")
     
+    user_id = update.effective_user.id
+    task = asyncio.current_task()
+    ACTIVE_JOBS.setdefault(user_id, set()).add(task)
     try:
         await update.message.reply_text(f"⏳ جاري تحميل الصور... (وضع الجودة: {quality_mode})")
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # تحميل الصور
-            image_paths = download_images(url, temp_dir)
-            
-            if not image_paths:
-                await status_message.edit_text("❌ لم أتمكن من العثور على أي صور في هذا الرابط")
-                return
-            
-            # تحليل أبعاد الصور
-            from PIL import Image
-            total_height = 0
-            for img_path in image_paths:
+        # حجز دور في الطابور: المهمة الثقيلة تعمل خارج حلقة الأحداث عند وصول دورها
+        try:
+            ticket = JOB_SCHEDULER.admit(user_id)
+        except JobRejected as rejected:
+            await status_message.edit_text(f"🚫 {rejected}")
+            return
+        
+        await ticket.wait(on_position=queue_notifier(status_message))
+        async with ticket:
+            with JobMetrics(quality_mode), tempfile.TemporaryDirectory() as temp_dir:
+                pdf_path = os.path.join(temp_dir, "images.pdf")
+                
+                # كل ملف يُرفع فور اكتماله بينما تستمر معالجة الملف التالي
+                loop = asyncio.get_running_loop()
+                uploads = []
+                
+                def on_volume(path, number, pages, is_last):
+                    part = None if number == 1 and is_last else number
+                    uploads.append(asyncio.run_coroutine_threadsafe(
+                        send_pdf(update, path, quality_mode, pages, part), loop
+                    ))
+                
+                volume_options = dict(volume_bytes=TELEGRAM_UPLOAD_LIMIT_MB * 1024 * 1024, on_volume=on_volume)
+                progress = Counter()
+                pdf_error = None
                 try:
-                    with Image.open(img_path) as img:
-                        width, height = img.size
-                        total_height += height
-                        logging.info(f"📐 صورة {os.path.basename(img_path)}: {width}x{height}")
-                except:
-                    pass
-            
-            avg_height = total_height / len(image_paths) if image_paths else 0
-            await status_message.edit_text(
-                f"✅ تم تحميل {len(image_paths)} صورة\n"
-                f"📏 متوسط الارتفاع: {avg_height:.0f} بكسل\n"
-                f"⏳ جاري إنشاء PDF..."
-            )
-            
-            pdf_path = os.path.join(temp_dir, "images.pdf")
-            
-            try:
-                if quality_mode == "high":
-                    # استخدام الجودة العالية
-                    create_high_quality_pdf(image_paths, pdf_path)
-                elif quality_mode == "small":
-                    # استخدام الضغط القوي (الطريقة الأصلية)
-                    create_compressed_pdf(image_paths, pdf_path)
+                    if quality_mode == "fit":
+                        # اختيار الجودة يحتاج الفصل كاملاً: تحميل كل الصور أولاً ثم إنشاء PDF
+                        pages = await JOB_RUNNER.track(
+                            download_pages_async(url, temp_dir, download_pool(), cache=PAGE_CACHE),
+                            on_tick=status_ticker(status_message, "⏳ جاري تحميل الصور...")
+                        )
+                        image_paths = [page.path for page in pages]
+                        progress['downloaded'] = len(image_paths)
+                        
+                        if not image_paths:
+                            await status_message.edit_text("❌ لم أتمكن من العثور على أي صور في هذا الرابط")
+                            return
+                        
+                        # تحليل أبعاد الصور (من بيانات التحميل دون إعادة فتح الملفات)
+                        total_height = 0
+                        for page in pages:
+                            total_height += page.height
+                            logging.info(f"📐 صورة {os.path.basename(page.path)}: {page.width}x{page.height}")
+                        
+                        avg_height = total_height / len(image_paths) if image_paths else 0
+                        pdf_status = (
+                            f"✅ تم تحميل {len(image_paths)} صورة\n"
+                            f"📏 متوسط الارتفاع: {avg_height:.0f} بكسل\n"
+                            f"⏳ جاري إنشاء PDF..."
+                        )
+                        await status_message.edit_text(pdf_status)
+                        
+                        # اختيار الجودة والعرض لكل صفحة حتى لا يتجاوز الملف حد الرفع
+                        await JOB_RUNNER.run(create_sized_pdf, image_paths, pdf_path,
+                                             TELEGRAM_UPLOAD_LIMIT_MB * 1024 * 1024, executor=process_pool(),
+                                             on_tick=status_ticker(status_message, pdf_status))
+                        on_volume(pdf_path, 1, len(image_paths), True)
+                    else:
+                        # high / balanced / small: خط معالجة متدفق، كل صفحة تُكتب فور تحميلها ومعالجتها
+                        await JOB_RUNNER.track(
+                            stream_pdf_async(url, temp_dir, pdf_path, quality_mode, download_pool(),
+                                             cache=PAGE_CACHE, progress=progress, executor=process_pool(),
+                                             **volume_options),
+                            on_tick=progress_ticker(status_message, progress)
+                        )
+                        
+                except NoPagesFound:
+                    await status_message.edit_text("❌ لم أتمكن من العثور على أي صور في هذا الرابط")
+                    return
+                except Exception as e:
+                    pdf_error = e
+                    logging.error(f"❌ خطأ في إنشاء PDF: {pdf_error}")
+                
+                # انتظار انتهاء رفع جميع الملفات قبل حذف المجلد المؤقت
+                sent = [await asyncio.wrap_future(upload) for upload in uploads]
+                
+                if PAGE_CACHE:
+                    logging.info(f"💾 إحصائيات الذاكرة المؤقتة: {PAGE_CACHE.stats()}")
+                
+                if pdf_error:
+                    await status_message.edit_text(
+                        f"❌ حدث خطأ أثناء إنشاء PDF\n"
+                        f"✅ تم تحميل {progress['downloaded']} صورة\n"
+                        + (f"📚 تم إرسال {sum(sent)} جزء قبل الخطأ\n" if any(sent) else "")
+                        + f"💡 جرب وضع جودة مختلف"
+                    )
+                elif not sent:
+                    await status_message.edit_text("❌ فشل إنشاء ملف PDF")
+                elif all(sent):
+                    await status_message.delete()
                 else:
-                    # استخدام الطريقة المتوازنة
-                    create_compressed_pdf(image_paths, pdf_path)
-                    
-            except Exception as pdf_error:
-                logging.error(f"❌ خطأ في إنشاء PDF: {pdf_error}")
-                await status_message.edit_text(
-                    f"❌ حدث خطأ أثناء إنشاء PDF\n"
-                    f"✅ تم تحميل {len(image_paths)} صورة\n"
-                    f"💡 جرب وضع جودة مختلف"
-                )
-                return
-            
-            # التحقق من أن PDF تم إنشاؤه بنجاح
-            if not os.path.exists(pdf_path):
-                await status_message.edit_text("❌ فشل إنشاء ملف PDF")
-                return
-            
-            # إرسال ملف PDF
-            file_size = os.path.getsize(pdf_path) / (1024 * 1024)
-            
-            try:
-                with open(pdf_path, 'rb') as pdf_file:
-                    quality_emoji = "🎨" if quality_mode == "high" else "⚡" if quality_mode == "balanced" else "📄"
-                    await update.message.reply_document(
-                        document=pdf_file,
-                        filename=f"images_{quality_mode}_quality.pdf",
-                        caption=f"{quality_emoji} تم الإنشاء بنجاح!\n"
-                               f"حجم الملف: {file_size:.2f} MB\n"
-                               f"عدد الصور: {len(image_paths)}\n"
-                               f"وضع الجودة: {quality_mode}"
+                    await status_message.edit_text(
+                        f"✅ تم إنشاء PDF بنجاح لكن حدث خطأ في إرسال {sent.count(False)} من {len(sent)} ملف\n"
+                        f"💡 قد يكون الملف كبير جداً للبوت"
                     )
                 
-                await status_message.delete()
-                
-            except Exception as send_error:
-                await status_message.edit_text(
-                    f"✅ تم إنشاء PDF بنجاح لكن حدث خطأ في الإرسال\n"
-                    f"حجم الملف: {file_size:.2f} MB\n"
-                    f"💡 قد يكون الملف كبير جداً للبوت"
-                )
-            
+    except asyncio.CancelledError:
+        # إلغاء من المستخدم: المهمة تنتهي هنا ولا داعي لنشر الإلغاء أكثر
+        logging.info(f"🛑 تم إلغاء طلب المستخدم {user_id}")
+        await status_message.edit_text("🛑 تم إلغاء الطلب")
     except Exception as e:
         logging.error(f"❌ خطأ عام: {e}")
         logging.error(traceback.format_exc())
         await status_message.edit_text("❌ حدث خطأ غير متوقع. يرجى المحاولة مرة أخرى.")
+    finally:
+        ACTIVE_JOBS[user_id].discard(task)
+        if not ACTIVE_JOBS[user_id]:
+            del ACTIVE_JOBS[user_id]
+
+async def close_pools(application):
+    global PROCESS_POOL
+    if DOWNLOAD_POOL is not None:
+        await DOWNLOAD_POOL.aclose()
+    if PROCESS_POOL is not None:
+        PROCESS_POOL.shutdown(wait=False, cancel_futures=True)
+        PROCESS_POOL = None
 
 def main():
     if not BOT_TOKEN:
         logging.error("لم يتم تعيين BOT_TOKEN في متغيرات البيئة")
         return
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    # معالجة تحديثات المستخدمين بالتوازي حتى لا ينتظر أحد مهمة غيره
+    application = (
+        Application.builder().token(BOT_TOKEN).concurrent_updates(True)
+        .post_shutdown(close_pools).build()
+    )
+    # إنشاء عمليات المعالجة الآن والعملية الرئيسية بلا خيوط بعد (fork آمن)
+    process_pool()
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("cancel", handle_cancel))
     application.add_handler(CommandHandler("quality", handle_quality))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
-    logging.info("🤖 البوت يعمل الآن...")
+    # على المنصة (PORT ورابط عام): webhook مع القياسات على نفس المنفذ؛ محلياً: polling
+    if WEBHOOK_URL and WEBHOOK_PORT:
+        logging.info("🤖 البوت يعمل الآن (webhook)...")
+        run_webhook(application)
+        return
+    
+    start_metrics_server()
+    logging.info("🤖 البوت يعمل الآن (polling)...")
     application.run_polling()
 
 if __name__ == '__main__':
@@ -1,44 +1,214 @@
 import requests
+import io
 import os
 import logging
 import time
+import random
+import threading
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
+from email.utils import parsedate_to_datetime
 from PIL import Image
 import re
 import natsort  # إضافة مكتبة لترتيب طبيعي للأسماء
+from page_filter import has_junk_hint, is_too_small, filter_pages
+from metrics import add, span
 
-def wait_for_page_load(url, session, delay=5):
-    """انتظار تحميل الصفحة بشكل كامل"""
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# عدد التحميلات المتزامنة والحد الأقصى للاتصالات المفتوحة مع كل خادم
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', 8))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('MAX_CONNECTIONS_PER_HOST', 4))
+
+# إعادة تحميل الصفحة فقط عندما لا تحتوي على صور (انتظار متزايد ومحدود)
+PAGE_RETRY_ATTEMPTS = 3
+PAGE_RETRY_BASE_DELAY = 1.0
+PAGE_RETRY_MAX_DELAY = 4.0
+
+# أنماط أسماء الصور المرقمة حسب الأولوية
+SEQUENTIAL_PATTERNS = [
+    "{i:03d}.jpg",
+    "{i:03d}.jpeg",
+    "{i:03d}.png",
+    "{i}.jpg",
+    "{i}.jpeg",
+    "image_{i:03d}.jpg",
+    "img_{i:03d}.jpg",
+    "page_{i:03d}.jpg"
+]
+# عدد الصور المفقودة المتتالية قبل التوقف عن التحميل الرقمي
+SEQUENTIAL_MAX_MISSES = 3
+
+# إعادة محاولة تحميل الصورة عند الأخطاء المؤقتة (انقطاع، مهلة، 429، 5xx، جسم ناقص)
+IMAGE_RETRY_ATTEMPTS = int(os.environ.get('IMAGE_RETRY_ATTEMPTS', 4))
+IMAGE_RETRY_BASE_DELAY = 0.5
+IMAGE_RETRY_MAX_DELAY = 8.0
+# Retry-After أطول من هذا يعني التخلي عن الصورة بدل تعطيل الفصل كله
+RETRY_AFTER_MAX = 30.0
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# حجم الأجزاء عند الكتابة المباشرة على القرص، وأقصى حجم نقرأه للتعرف على رأس الصورة
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HEADER_SNIFF_LIMIT = 1024 * 1024
+
+# بيانات الصفحة بعد التحميل حتى لا تعيد المراحل التالية فتح الملف لقراءة الأبعاد
+# source: الوسم الذي جاءت منه الصورة في صفحة الفصل (روابط نفس الوسم نسخ من نفس الصفحة)، أو None
+PageInfo = namedtuple('PageInfo', ['path', 'format', 'width', 'height', 'size', 'source'], defaults=(None,))
+# رابط صورة مكتشف في الصفحة ورقم الوسم الذي جاء منه (img والرابط a الذي يحيط به لهما نفس الرقم)
+FoundImage = namedtuple('FoundImage', ['url', 'source'])
+
+class ImageHeaderSniffer:
+    """التعرف على صيغة الصورة وأبعادها من أول البايتات أثناء وصولها"""
+
+    def __init__(self, limit=HEADER_SNIFF_LIMIT):
+        self.limit = limit
+        self.format = None
+        self.size = None
+        self.done = False
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        self._buffer.extend(chunk[:self.limit - len(self._buffer)])
+        try:
+            # Image.open يقرأ الرأس فقط دون فك ترميز البكسلات
+            with Image.open(io.BytesIO(self._buffer)) as img:
+                self.format = img.format
+                self.size = img.size
+            self.done = True
+        except Exception:
+            # الرأس لم يكتمل بعد
+            if len(self._buffer) >= self.limit:
+                self.done = True
+        if self.done:
+            self._buffer = None
+
+class HostLimiter:
+    """تحديد عدد الطلبات المتزامنة لكل خادم"""
+
+    def __init__(self, per_host=MAX_CONNECTIONS_PER_HOST):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+def create_session(per_host=MAX_CONNECTIONS_PER_HOST):
+    """إنشاء جلسة مع مجمع اتصالات دائمة (keep-alive) لكل خادم"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    # pool_block يمنع فتح اتصالات أكثر من الحد عند ازدحام المجمع
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(1, per_host), pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class FirstImageTimer:
+    """قياس الزمن من بدء الطلب حتى حفظ أول صورة (يُسجل مرة واحدة)"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.elapsed = None
+        self._lock = threading.Lock()
+
+    def mark(self):
+        with self._lock:
+            if self.elapsed is not None:
+                return
+            self.elapsed = time.monotonic() - self.started_at
+        logging.info(f"⏱️ الزمن حتى أول صورة: {self.elapsed:.2f} ثانية")
+
+def fetch_page(url, session, cache=None):
+    """تحميل محتوى الصفحة دون أي انتظار إضافي (مع الذاكرة المؤقتة إن وجدت)"""
     try:
-        response = session.get(url)
+        entry = cache.lookup_raw(url) if cache else None
+        if entry and entry['fresh']:
+            return cache.raw_bytes(url, entry)
+        
+        headers = cache.validation_headers(entry) if entry else {}
+        response = session.get(url, timeout=20, headers=headers)
+        if entry and response.status_code == 304:
+            return cache.raw_bytes(url, entry, revalidated=True)
         response.raise_for_status()
-        logging.info(f"تم تحميل الصفحة بنجاح، الانتظار {delay} ثواني لتحميل الصور...")
-        time.sleep(delay)  # انتظار لتحميل الصور
+        add('bytes_in_total', 'html', len(response.content))
+        if cache:
+            cache.store_raw_bytes(url, response.content, response.headers.get('ETag'),
+                                  response.headers.get('Last-Modified'))
         return response.content
     except Exception as e:
         logging.error(f"خطأ في تحميل الصفحة: {e}")
         return None
 
+def acquire_page_image_urls(url, session, attempts=PAGE_RETRY_ATTEMPTS,
+                            base_delay=PAGE_RETRY_BASE_DELAY, max_delay=PAGE_RETRY_MAX_DELAY, cache=None):
+    """
+    تحميل الصفحة وتحليلها مباشرة
+    لا ننتظر ونعيد المحاولة إلا إذا لم تحتوِ الصفحة على أي روابط صور،
+    مع انتظار متزايد ومحدود بين المحاولات
+    يرجع None إذا فشل تحميل الصفحة نفسها
+    """
+    found_urls = None
+    for attempt in range(max(1, attempts)):
+        if attempt:
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            logging.info(f"🔄 لا توجد صور في الصفحة، إعادة المحاولة بعد {delay:.1f} ثانية ({attempt + 1}/{attempts})")
+            time.sleep(delay)
+        
+        # إعادة المحاولة تتجاوز الذاكرة المؤقتة حتى نحصل على نسخة جديدة من الصفحة
+        page_content = fetch_page(url, session, cache if attempt == 0 else None)
+        if not page_content:
+            return found_urls
+        
+        soup = BeautifulSoup(page_content, 'html.parser')
+        found_urls = find_image_urls(soup, url)
+        if found_urls:
+            break
+    
+    return found_urls
+
 def find_image_urls(soup, base_url):
-    """البحث عن جميع روابط الصور في الصفحة"""
+    """
+    البحث عن روابط الصور في الصفحة بترتيب ظهورها (ترتيب القراءة)
+    رابط واحد لكل وسم img: روابط التحميل الكسول (data-src...) أولاً لأن src غالباً صورة مؤقتة
+    الوسوم التي تدل على شعار أو إعلان أو أيقونة تُتجاهل
+    يرجع قائمة FoundImage؛ رابط a يحيط بوسم img يأخذ رقم ذلك الوسم (نسخة أكبر من نفس الصفحة)
+    """
     image_urls = []
+    sources = {}
     
     # البحث في وسوم img
     for img in soup.find_all('img'):
-        for attr in ['src', 'data-src', 'data-original', 'data-source']:
+        sources[id(img)] = len(sources)
+        for attr in ['data-src', 'data-original', 'data-source', 'src']:
             src = img.get(attr)
             if src:
-                full_url = urljoin(base_url, src)
+                full_url = urljoin(base_url, src.strip())
                 if is_image_url(full_url):
-                    image_urls.append(full_url)
+                    if not has_junk_hint(img, full_url):
+                        image_urls.append(FoundImage(full_url, sources[id(img)]))
+                    break
     
     # البحث في وسوم a (لروابط مباشرة للصور)
     for link in soup.find_all('a', href=True):
         href = link['href']
         if is_image_url(href):
             full_url = urljoin(base_url, href)
-            image_urls.append(full_url)
+            if not has_junk_hint(link, full_url):
+                inner = link.find('img')
+                source = sources[id(inner)] if inner is not None else f"a{len(image_urls)}"
+                image_urls.append(FoundImage(full_url, source))
     
     # البحث في CSS background images
     for tag in soup.find_all(style=True):
@@ -46,142 +216,441 @@ def find_image_urls(soup, base_url):
         urls = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', style)
         for url in urls:
             full_url = urljoin(base_url, url)
-            if is_image_url(full_url):
-                image_urls.append(full_url)
+            if is_image_url(full_url) and not has_junk_hint(tag, full_url):
+                image_urls.append(FoundImage(full_url, f"s{len(image_urls)}"))
     
-    return list(set(image_urls))  # إزالة التكرارات
+    # إزالة التكرارات مع الحفاظ على الترتيب (أول ظهور للرابط يحدد وسمه)
+    unique = {}
+    for found in image_urls:
+        unique.setdefault(found.url, found)
+    return list(unique.values())
 
 def is_image_url(url):
     """التحقق مما إذا كان الرابط يشير إلى صورة"""
     image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
     return any(url.lower().endswith(ext) for ext in image_extensions)
 
-def download_sequential_images(base_url, download_dir, session, max_images=100):
-    """تحميل الصور بالتسلسل الرقمي (001.jpg, 002.jpg, إلخ)"""
+class TransientDownloadError(Exception):
+    """خطأ مؤقت يستحق إعادة المحاولة (استجابة 429/5xx، جسم ناقص)؛ retry_after من ترويسة الخادم"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    """ترويسة Retry-After بالثواني أو كتاريخ HTTP، وإرجاع الثواني أو None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_delay(attempt, retry_after=None, base_delay=IMAGE_RETRY_BASE_DELAY, max_delay=IMAGE_RETRY_MAX_DELAY):
+    """
+    الانتظار قبل المحاولة رقم attempt: Retry-After إن أرسله الخادم،
+    وإلا انتظار أسي بتوزيع عشوائي كامل (full jitter) حتى لا تعود كل التحميلات معاً
+    """
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+class PartialDownload:
+    """
+    حالة تحميل صورة واحدة عبر عدة محاولات: الملف المكتوب، رأس الصورة، ومعرف النسخة
+    المحاولة التالية تطلب الباقي فقط (Range من آخر بايت مكتوب) مع If-Range:
+    إذا تغيرت الصورة على الخادم يرسلها كاملة (200) فنبدأ من الصفر
+    """
+
+    def __init__(self, image_path):
+        self.image_path = image_path
+        self.written = 0
+        self.transferred = 0
+        self.expected = None
+        self.etag = None
+        self.last_modified = None
+        self.sniffer = ImageHeaderSniffer()
+        self._file = None
+
+    def request_headers(self, headers):
+        """ترويسات المحاولة: الترويسات الأساسية مع Range لاستئناف جسم ناقص"""
+        validator = self.etag or self.last_modified
+        if not self.written or not validator:
+            return headers
+        return dict(headers, Range=f'bytes={self.written}-', **{'If-Range': validator})
+
+    def begin(self, status, headers):
+        """
+        بداية استجابة محاولة: يرجع True لمتابعة القراءة، أو False إذا لم يكن الرابط صورة
+        الاستجابات المؤقتة ترفع TransientDownloadError
+        """
+        if status in RETRYABLE_STATUS:
+            raise TransientDownloadError(f"HTTP {status}", parse_retry_after(headers.get('retry-after')))
+        if status == 416:
+            # نطاق غير صالح (تغير حجم الصورة): البدء من الصفر
+            self._restart()
+            raise TransientDownloadError("HTTP 416", 0.0)
+        if status == 206 and self.written and content_range_start(headers) == self.written:
+            logging.info(f"⏯️ استئناف {os.path.basename(self.image_path)} من البايت {self.written}")
+            self._file = open(self.image_path, 'ab')
+            return True
+        if status not in (200, 206) or 'image' not in headers.get('content-type', ''):
+            return False
+        # استجابة كاملة (أو نطاق لا يبدأ حيث توقفنا): إعادة الكتابة من البداية
+        self._restart()
+        self.etag = headers.get('etag')
+        self.last_modified = headers.get('last-modified')
+        length = headers.get('content-length')
+        self.expected = int(length) if length and status == 200 and not headers.get('content-encoding') else None
+        self._file = open(self.image_path, 'wb')
+        return True
+
+    def _restart(self):
+        self.written = 0
+        self.expected = None
+        self.sniffer = ImageHeaderSniffer()
+
+    def feed(self, chunk):
+        """كتابة جزء؛ يرجع True إذا اتضح من الرأس أن الصورة أصغر من صفحة (لا داعي لإكمالها)"""
+        self._file.write(chunk)
+        self.written += len(chunk)
+        self.transferred += len(chunk)
+        self.sniffer.feed(chunk)
+        return is_too_small(self.sniffer.size)
+
+    def end(self):
+        """نهاية المحاولة: الجسم الناقص خطأ مؤقت يُستأنف في المحاولة التالية"""
+        self.close()
+        if self.expected is not None and self.written < self.expected and not is_too_small(self.sniffer.size):
+            raise TransientDownloadError(f"جسم ناقص ({self.written}/{self.expected})")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """حذف الملف الناقص بعد الفشل النهائي أو الإلغاء"""
+        self.close()
+        add('bytes_in_total', 'image', self.transferred)
+        if os.path.exists(self.image_path):
+            os.remove(self.image_path)
+
+    def finish(self):
+        """
+        التحقق من الملف المكتمل وإرجاع PageInfo، أو حذفه وإرجاع None
+        الصور الأصغر من صفحة (MIN_PAGE_SIDE) يتوقف تحميلها فور قراءة الرأس وتُحذف
+        """
+        sniffer = self.sniffer
+        if is_too_small(sniffer.size):
+            logging.info(f"🗑️ تجاهل صورة صغيرة {sniffer.size[0]}x{sniffer.size[1]}: "
+                         f"{os.path.basename(self.image_path)}")
+            self.discard()
+            return None
+        if not sniffer.size:
+            self.discard()  # حذف الملف غير الصالح
+            return None
+        add('bytes_in_total', 'image', self.transferred)
+        width, height = sniffer.size
+        return PageInfo(self.image_path, sniffer.format, width, height, self.written)
+
+def content_range_start(headers):
+    """أول بايت في ترويسة Content-Range (bytes START-END/TOTAL) أو None"""
+    match = re.match(r'bytes (\d+)-', headers.get('content-range', ''))
+    return int(match.group(1)) if match else None
+
+def next_retry_delay(image_url, error, attempt, attempts):
+    """
+    الانتظار قبل إعادة المحاولة بعد فشل المحاولة رقم attempt، أو None للتخلي عن الصورة
+    (نفدت المحاولات، أو طلب الخادم الانتظار أكثر من RETRY_AFTER_MAX)
+    """
+    name = os.path.basename(urlparse(image_url).path)
+    delay = retry_delay(attempt, getattr(error, 'retry_after', None))
+    if attempt >= attempts or delay > RETRY_AFTER_MAX:
+        add('download_failures_total', 'image', 1)
+        logging.error(f"❌ فشل تحميل {name} بعد {attempt} محاولة: {error or type(error).__name__}")
+        return None
+    add('download_retries_total', 'image', 1)
+    logging.warning(f"🔁 {name}: {error or type(error).__name__}، "
+                    f"إعادة المحاولة {attempt + 1}/{attempts} بعد {delay:.1f} ثانية")
+    return delay
+
+def cached_page_info(cache, image_url, entry, image_path, revalidated=False):
+    """نسخ صورة من الذاكرة المؤقتة وإرجاع بياناتها المخزنة دون فتح الملف"""
+    cache.use_raw(image_url, entry, image_path, revalidated)
+    return PageInfo(image_path, entry['format'], entry['width'], entry['height'], entry['size'])
+
+def save_image(image_url, image_path, session, limiter=None, timeout=15, cache=None,
+               attempts=IMAGE_RETRY_ATTEMPTS):
+    """
+    تحميل صورة إلى المسار المحدد والتحقق منها أثناء التحميل، وإرجاع PageInfo أو None
+    مع الذاكرة المؤقتة: النسخة الحديثة تُستخدم دون شبكة، والقديمة يُعاد التحقق منها بطلب شرطي
+    الأخطاء المؤقتة (انقطاع، مهلة، 429/5xx، جسم ناقص) يُعاد تحميلها حتى attempts مرة
+    مع استئناف الجسم الناقص من حيث توقف؛ بعد آخر محاولة يُرفع الخطأ
+    """
+    entry = cache.lookup_raw(image_url) if cache else None
+    if entry and entry['fresh']:
+        return cached_page_info(cache, image_url, entry, image_path)
+    
+    headers = cache.validation_headers(entry) if entry else {}
+    semaphore = limiter.for_url(image_url) if limiter else nullcontext()
+    download = PartialDownload(image_path)
+    attempts = max(1, attempts)
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                with semaphore, span('fetch'):
+                    with session.get(image_url, timeout=timeout, stream=True,
+                                     headers=download.request_headers(headers)) as response:
+                        if entry and response.status_code == 304:
+                            return cached_page_info(cache, image_url, entry, image_path, revalidated=True)
+                        if not download.begin(response.status_code, response.headers):
+                            return None
+                        try:
+                            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                                if download.feed(chunk):
+                                    break
+                        finally:
+                            download.close()
+                download.end()
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    TransientDownloadError) as error:
+                delay = next_retry_delay(image_url, error, attempt, attempts)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+        page = download.finish()
+    except BaseException:
+        download.discard()
+        raise
+    
+    if page and cache:
+        cache.store_raw(image_url, image_path, download.etag, download.last_modified, format=page.format,
+                        width=page.width, height=page.height, size=page.size)
+    return page
+
+def probe_image_url(image_url, session, limiter=None):
+    """
+    التحقق من وجود صورة دون تحميلها (طلب HEAD)
+    إذا لم يدعم الخادم HEAD نستخدم طلب GET لأول بايت فقط
+    """
+    semaphore = limiter.for_url(image_url) if limiter else nullcontext()
+    try:
+        with semaphore:
+            response = session.head(image_url, timeout=10, allow_redirects=True)
+            if response.status_code in (405, 501):
+                response = session.get(image_url, timeout=10, headers={'Range': 'bytes=0-0'}, stream=True)
+                response.close()
+        return response.status_code in (200, 206) and 'image' in response.headers.get('content-type', '')
+    except Exception:
+        return False
+
+def detect_sequential_pattern(base_url, session, limiter=None, index=1, skip=None):
+    """
+    تحديد نمط التسمية الذي يستخدمه الخادم بفحص جميع الأنماط بالتوازي
+    يرجع أول نمط مطابق حسب ترتيب الأولوية أو None
+    skip: نمط فُحص مسبقاً لنفس الرقم فلا يُعاد طلبه
+    """
+    patterns = [pattern for pattern in SEQUENTIAL_PATTERNS if pattern != skip]
+    urls = [urljoin(base_url, pattern.format(i=index)) for pattern in patterns]
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        found = list(executor.map(lambda url: probe_image_url(url, session, limiter), urls))
+    
+    for pattern, exists in zip(patterns, found):
+        if exists:
+            logging.info(f"🔎 نمط التسمية المكتشف للصورة {index}: {pattern}")
+            return pattern
+    return None
+
+def download_sequential_image(i, image_url, download_dir, session, limiter=None, cache=None):
+    """تحميل صورة مرقمة واحدة، وإرجاع PageInfo أو None"""
+    # استخدام نفس تنسيق الاسم للجميع لضمان الترتيب
+    image_path = os.path.join(download_dir, f"{i:03d}.jpg")
+    try:
+        page = save_image(image_url, image_path, session, limiter, timeout=10, cache=cache)
+        if page:
+            logging.info(f"✅ تم تحميل: {image_url}")
+            return page
+    except Exception:
+        pass
+    return None
+
+def download_sequential_images(base_url, download_dir, session, max_images=100, timer=None,
+                               max_misses=SEQUENTIAL_MAX_MISSES, max_workers=MAX_CONCURRENT_DOWNLOADS,
+                               per_host=MAX_CONNECTIONS_PER_HOST, cache=None):
+    """
+    تحميل الصور بالتسلسل الرقمي (001.jpg, 002.jpg, إلخ)
+    نكتشف نمط التسمية أولاً ثم نحمل السلسلة بشكل متزامن على دفعات،
+    ونتوقف بعد عدد محدد من الصور المفقودة المتتالية
+    الصورة غير الموجودة بالنمط المعتمد تُفحص بباقي الأنماط قبل عدها مفقودة
+    (فصل يبدأ من 002 أو يخلط jpg و png)
+    """
     downloaded_images = []
+    limiter = HostLimiter(per_host)
+    
+    # الصور الأولى المفقودة تُعد ضمن الحد نفسه
+    pattern = None
+    for first_index in range(1, min(max_misses, max_images) + 1):
+        pattern = detect_sequential_pattern(base_url, session, limiter, index=first_index)
+        if pattern:
+            break
+    if not pattern:
+        logging.info("❌ لم يتم العثور على أي نمط تسمية رقمي")
+        return downloaded_images
+    
+    workers = max(1, max_workers)
+    misses = first_index - 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch_start in range(first_index, max_images + 1, workers):
+            indices = range(batch_start, min(batch_start + workers, max_images + 1))
+            batch_pattern = pattern
+            results = executor.map(
+                lambda i: download_sequential_image(
+                    i, urljoin(base_url, batch_pattern.format(i=i)), download_dir, session, limiter, cache
+                ),
+                indices
+            )
+            
+            for i, page in zip(indices, results):
+                if misses >= max_misses:
+                    # صور بعد نقطة التوقف لا تنتمي للسلسلة
+                    if page and os.path.exists(page.path):
+                        os.remove(page.path)
+                    continue
+                if not page:
+                    fallback = detect_sequential_pattern(base_url, session, limiter, index=i, skip=batch_pattern)
+                    if fallback:
+                        page = download_sequential_image(
+                            i, urljoin(base_url, fallback.format(i=i)), download_dir, session, limiter, cache
+                        )
+                        # الدفعة التالية تبدأ بآخر نمط نجح
+                        pattern = fallback
+                if page:
+                    misses = 0
+                    downloaded_images.append(page)
+                    if timer:
+                        timer.mark()
+                else:
+                    misses += 1
+            
+            if misses >= max_misses:
+                logging.info(f"⏹️ التوقف بعد {max_misses} صور مفقودة متتالية")
+                break
+    
+    return downloaded_images
+
+def download_found_image(index, found, download_dir, session, limiter=None, timer=None, cache=None):
+    """تحميل صورة واحدة من الصفحة (FoundImage)، وإرجاع PageInfo أو None عند الفشل"""
+    img_url = found.url
+    try:
+        # استخراج اسم الملف من الرابط
+        img_filename = os.path.basename(urlparse(img_url).path)
+        if not img_filename:
+            img_filename = f"found_{index+1:03d}.jpg"
+        
+        # إضافة بادئة لضمان الترتيب
+        image_path = os.path.join(download_dir, f"found_{index+1:04d}_{img_filename}")
+        
+        page = save_image(img_url, image_path, session, limiter, cache=cache)
+        if page:
+            if timer:
+                timer.mark()
+            logging.info(f"✅ تم تحميل صورة من الصفحة: {img_filename}")
+            return page._replace(source=found.source)
+                
+    except Exception as e:
+        logging.warning(f"⚠️ فشل تحميل صورة من الصفحة: {img_url}")
+    return None
+
+def download_found_images(found_urls, download_dir, session, max_workers=MAX_CONCURRENT_DOWNLOADS,
+                          per_host=MAX_CONNECTIONS_PER_HOST, timer=None, cache=None):
+    """
+    تحميل روابط الصور بشكل متزامن مع حد لكل خادم
+    النتائج تعود بنفس ترتيب الروابط كما في التحميل التسلسلي
+    """
+    limiter = HostLimiter(per_host)
+    workers = max(1, min(max_workers, len(found_urls)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda item: download_found_image(item[0], item[1], download_dir, session, limiter, timer, cache),
+            enumerate(found_urls)
+        )
+        return [page for page in results if page]
+
+def order_downloaded_pages(pages, download_dir):
+    """
+    ترتيب الصفحات المحملة طبيعياً حسب أسماء الملفات ثم إعادة تسميتها image_0001...
+    """
+    # ترتيب الصور حسب الأسماء بشكل طبيعي
+    pages = natsort.natsorted(pages, key=lambda page: page.path)
     
-    for i in range(1, max_images + 1):
-        # تنسيقات مختلفة للأسماء
-        filenames = [
-            f"{i:03d}.jpg",
-            f"{i:03d}.jpeg", 
-            f"{i:03d}.png",
-            f"{i}.jpg",
-            f"{i}.jpeg",
-            f"image_{i:03d}.jpg",
-            f"img_{i:03d}.jpg",
-            f"page_{i:03d}.jpg"
-        ]
+    # إعادة تسمية الملفات لضمان ترتيب واضح
+    for idx, page in enumerate(pages):
+        old_path = page.path
+        # استخراج الامتداد من الملف القديم
+        ext = os.path.splitext(old_path)[1]
+        if not ext:
+            ext = '.jpg'
+        
+        # إنشاء اسم جديد برقم تسلسلي
+        new_filename = f"image_{idx+1:04d}{ext}"
+        new_path = os.path.join(download_dir, new_filename)
         
-        for filename in filenames:
-            image_url = urljoin(base_url, filename)
+        # تجنب تعارض الأسماء
+        if old_path != new_path:
             try:
-                response = session.get(image_url, timeout=10)
-                if response.status_code == 200 and 'image' in response.headers.get('content-type', ''):
-                    # استخدام نفس تنسيق الاسم للجميع لضمان الترتيب
-                    image_path = os.path.join(download_dir, f"{i:03d}.jpg")
-                    
-                    with open(image_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    # التحقق من أن الملف صورة صالحة
-                    try:
-                        with Image.open(image_path) as img:
-                            img.verify()
-                        downloaded_images.append(image_path)
-                        logging.info(f"✅ تم تحميل: {image_url}")
-                        break  # الانتقال للصورة التالية
-                    except Exception:
-                        os.remove(image_path)  # حذف الملف غير الصالح
-                        continue
-                        
+                os.rename(old_path, new_path)
+                pages[idx] = page._replace(path=new_path)
             except Exception as e:
-                continue
+                logging.warning(f"⚠️ لم أستطع إعادة تسمية {old_path}: {e}")
     
-    return downloaded_images
+    # إعادة الترتيب بعد إعادة التسمية
+    pages = natsort.natsorted(pages, key=lambda page: page.path)
+    return pages
 
-def download_images(base_url, download_dir):
-    """الدالة الرئيسية لتحميل الصور"""
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    })
+def download_pages(base_url, download_dir, cache=None):
+    """
+    الدالة الرئيسية لتحميل الصور
+    ترجع قائمة PageInfo مرتبة (المسار، الصيغة، الأبعاد، الحجم)
+    cache: ذاكرة مؤقتة اختيارية (PageCache) للتحميلات الخام
+    """
+    session = create_session()
+    timer = FirstImageTimer()
     
     all_downloaded = []
     
     try:
-        # الانتظار لتحميل الصفحة
-        page_content = wait_for_page_load(base_url, session, delay=7)
-        if not page_content:
+        # تحميل الصفحة وتحليلها مباشرة دون انتظار ثابت
+        with span('discover'):
+            found_urls = acquire_page_image_urls(base_url, session, cache=cache)
+        if found_urls is None:
             return []
         
-        # البحث عن الصور في الصفحة
-        soup = BeautifulSoup(page_content, 'html.parser')
-        found_urls = find_image_urls(soup, base_url)
-        
         logging.info(f"🔍 تم العثور على {len(found_urls)} رابط صورة محتمل في الصفحة")
         
-        # تحميل الصور التي تم العثور عليها مع تسمية منظمة
-        for i, img_url in enumerate(found_urls):
-            try:
-                response = session.get(img_url, timeout=15)
-                if response.status_code == 200 and 'image' in response.headers.get('content-type', ''):
-                    # استخراج اسم الملف من الرابط
-                    img_filename = os.path.basename(urlparse(img_url).path)
-                    if not img_filename:
-                        img_filename = f"found_{i+1:03d}.jpg"
-                    
-                    # إضافة بادئة لضمان الترتيب
-                    image_path = os.path.join(download_dir, f"found_{i+1:04d}_{img_filename}")
-                    
-                    with open(image_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    # التحقق من الصورة
-                    try:
-                        with Image.open(image_path) as img:
-                            img.verify()
-                        all_downloaded.append(image_path)
-                        logging.info(f"✅ تم تحميل صورة من الصفحة: {img_filename}")
-                    except Exception:
-                        os.remove(image_path)
-                        
-            except Exception as e:
-                logging.warning(f"⚠️ فشل تحميل صورة من الصفحة: {img_url}")
+        # تحميل الصور التي تم العثور عليها بشكل متزامن مع الحفاظ على الترتيب
+        all_downloaded = download_found_images(found_urls, download_dir, session, timer=timer, cache=cache)
         
         # إذا لم نجد صوراً من خلال تحليل الصفحة، نجرب الطريقة الرقمية
         if not all_downloaded:
             logging.info("🔄 جرب البحث عن الصور بالتسلسل الرقمي...")
-            sequential_images = download_sequential_images(base_url, download_dir, session)
+            sequential_images = download_sequential_images(base_url, download_dir, session, timer=timer,
+                                                           cache=cache)
             all_downloaded.extend(sequential_images)
         
-        # ترتيب الصور حسب الأسماء بشكل طبيعي
-        all_downloaded = natsort.natsorted(all_downloaded)
-        
-        # إعادة تسمية الملفات لضمان ترتيب واضح
-        for idx, old_path in enumerate(all_downloaded):
-            # استخراج الامتداد من الملف القديم
-            ext = os.path.splitext(old_path)[1]
-            if not ext:
-                ext = '.jpg'
-            
-            # إنشاء اسم جديد برقم تسلسلي
-            new_filename = f"image_{idx+1:04d}{ext}"
-            new_path = os.path.join(download_dir, new_filename)
-            
-            # تجنب تعارض الأسماء
-            if old_path != new_path:
-                try:
-                    os.rename(old_path, new_path)
-                    all_downloaded[idx] = new_path
-                except Exception as e:
-                    logging.warning(f"⚠️ لم أستطع إعادة تسمية {old_path}: {e}")
-        
-        # إعادة الترتيب بعد إعادة التسمية
-        all_downloaded = natsort.natsorted(all_downloaded)
+        all_downloaded = order_downloaded_pages(filter_pages(all_downloaded), download_dir)
         
     except Exception as e:
         logging.error(f"❌ خطأ في عملية التحميل: {e}")
     
     logging.info(f"📊 إجمالي الصور التي تم تحميلها: {len(all_downloaded)}")
-    return all_downloaded
\ No newline at end of file
+    return all_downloaded
+
+def download_images(base_url, download_dir, cache=None):
+    """تحميل الصور وإرجاع مساراتها فقط بالترتيب"""
+    return [page.path for page in download_pages(base_url, download_dir, cache)]
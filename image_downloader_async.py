@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+from image_downloader import (
+    USER_AGENT, MAX_CONCURRENT_DOWNLOADS, MAX_CONNECTIONS_PER_HOST,
+    PAGE_RETRY_ATTEMPTS, PAGE_RETRY_BASE_DELAY, PAGE_RETRY_MAX_DELAY,
+    SEQUENTIAL_PATTERNS, SEQUENTIAL_MAX_MISSES, DOWNLOAD_CHUNK_SIZE, IMAGE_RETRY_ATTEMPTS,
+    FirstImageTimer, PageInfo, PartialDownload, TransientDownloadError,
+    find_image_urls, next_retry_delay, order_downloaded_pages,
+)
+from page_filter import filter_pages
+from metrics import add, span
+
+# الحد الأقصى للاتصالات المفتوحة في المجمع المشترك بين جميع المهام
+MAX_POOL_CONNECTIONS = int(os.environ.get('MAX_POOL_CONNECTIONS', 32))
+
+class AsyncDownloadPool:
+    """
+    مجمع اتصالات مشترك بين المهام المتزامنة (httpx.AsyncClient)
+    مع حد للطلبات المتزامنة لكل خادم يشمل جميع المهام معاً
+    """
+
+    def __init__(self, max_connections=MAX_POOL_CONNECTIONS, per_host=MAX_CONNECTIONS_PER_HOST):
+        self.per_host = max(1, per_host)
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max(1, max_connections),
+                                max_keepalive_connections=max(1, max_connections)),
+        )
+        self._semaphores = {}
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def aclose(self):
+        await self.client.aclose()
+
+async def fetch_page_async(url, pool, cache=None):
+    """تحميل محتوى الصفحة (مع الذاكرة المؤقتة إن وجدت)"""
+    try:
+        entry = cache.lookup_raw(url) if cache else None
+        if entry and entry['fresh']:
+            return cache.raw_bytes(url, entry)
+
+        headers = cache.validation_headers(entry) if entry else {}
+        response = await pool.client.get(url, timeout=20, headers=headers)
+        if entry and response.status_code == 304:
+            return cache.raw_bytes(url, entry, revalidated=True)
+        response.raise_for_status()
+        add('bytes_in_total', 'html', len(response.content))
+        if cache:
+            await asyncio.to_thread(cache.store_raw_bytes, url, response.content,
+                                    response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+    except Exception as e:
+        logging.error(f"خطأ في تحميل الصفحة: {e}")
+        return None
+
+async def acquire_page_image_urls_async(url, pool, attempts=PAGE_RETRY_ATTEMPTS,
+                                        base_delay=PAGE_RETRY_BASE_DELAY, max_delay=PAGE_RETRY_MAX_DELAY,
+                                        cache=None):
+    """نفس منطق acquire_page_image_urls مع انتظار غير حاجب بين المحاولات"""
+    found_urls = None
+    for attempt in range(max(1, attempts)):
+        if attempt:
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            logging.info(f"🔄 لا توجد صور في الصفحة، إعادة المحاولة بعد {delay:.1f} ثانية ({attempt + 1}/{attempts})")
+            await asyncio.sleep(delay)
+
+        page_content = await fetch_page_async(url, pool, cache if attempt == 0 else None)
+        if not page_content:
+            return found_urls
+
+        # تحليل HTML في خيط منفصل حتى لا يتوقف باقي المستخدمين
+        soup = await asyncio.to_thread(BeautifulSoup, page_content, 'html.parser')
+        found_urls = find_image_urls(soup, url)
+        if found_urls:
+            break
+
+    return found_urls
+
+async def save_image_async(image_url, image_path, pool, timeout=15, cache=None, attempts=IMAGE_RETRY_ATTEMPTS):
+    """
+    تحميل صورة إلى المسار المحدد والتحقق منها أثناء التحميل، وإرجاع PageInfo أو None
+    الأخطاء المؤقتة يُعاد تحميلها مع استئناف الجسم الناقص كما في save_image
+    عند إلغاء المهمة يُغلق الاتصال فوراً ويُحذف الملف الناقص
+    """
+    entry = cache.lookup_raw(image_url) if cache else None
+    if entry and entry['fresh']:
+        cache.use_raw(image_url, entry, image_path)
+        return PageInfo(image_path, entry['format'], entry['width'], entry['height'], entry['size'])
+
+    headers = cache.validation_headers(entry) if entry else {}
+    download = PartialDownload(image_path)
+    attempts = max(1, attempts)
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                async with pool.for_url(image_url), span('fetch'):
+                    async with pool.client.stream('GET', image_url, timeout=timeout,
+                                                  headers=download.request_headers(headers)) as response:
+                        if entry and response.status_code == 304:
+                            cache.use_raw(image_url, entry, image_path, revalidated=True)
+                            return PageInfo(image_path, entry['format'], entry['width'], entry['height'],
+                                            entry['size'])
+                        if not download.begin(response.status_code, response.headers):
+                            return None
+                        try:
+                            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                                if download.feed(chunk):
+                                    break
+                        finally:
+                            download.close()
+                download.end()
+                break
+            except (httpx.TransportError, TransientDownloadError) as error:
+                delay = next_retry_delay(image_url, error, attempt, attempts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+        page = download.finish()
+    except BaseException:
+        download.discard()
+        raise
+
+    if page and cache:
+        await asyncio.to_thread(
+            cache.store_raw, image_url, image_path, download.etag, download.last_modified,
+            format=page.format, width=page.width, height=page.height, size=page.size
+        )
+    return page
+
+async def probe_image_url_async(image_url, pool):
+    """التحقق من وجود صورة دون تحميلها (HEAD ثم GET لأول بايت إذا لم يدعم الخادم HEAD)"""
+    try:
+        async with pool.for_url(image_url):
+            response = await pool.client.head(image_url, timeout=10)
+            if response.status_code in (405, 501):
+                async with pool.client.stream('GET', image_url, timeout=10,
+                                              headers={'Range': 'bytes=0-0'}) as response:
+                    pass
+        return response.status_code in (200, 206) and 'image' in response.headers.get('content-type', '')
+    except Exception:
+        return False
+
+async def detect_sequential_pattern_async(base_url, pool, index=1, skip=None):
+    """
+    تحديد نمط التسمية بفحص جميع الأنماط معاً، وإرجاع أول نمط مطابق حسب الأولوية
+    skip: نمط فُحص مسبقاً لنفس الرقم فلا يُعاد طلبه
+    """
+    patterns = [pattern for pattern in SEQUENTIAL_PATTERNS if pattern != skip]
+    urls = [urljoin(base_url, pattern.format(i=index)) for pattern in patterns]
+    found = await asyncio.gather(*(probe_image_url_async(url, pool) for url in urls))
+    for pattern, exists in zip(patterns, found):
+        if exists:
+            logging.info(f"🔎 نمط التسمية المكتشف للصورة {index}: {pattern}")
+            return pattern
+    return None
+
+async def download_sequential_image_async(i, image_url, download_dir, pool, cache=None):
+    """تحميل صورة مرقمة واحدة، وإرجاع PageInfo أو None"""
+    image_path = os.path.join(download_dir, f"{i:03d}.jpg")
+    try:
+        page = await save_image_async(image_url, image_path, pool, timeout=10, cache=cache)
+        if page:
+            logging.info(f"✅ تم تحميل: {image_url}")
+            return page
+    except Exception:
+        pass
+    return None
+
+async def download_sequential_images_async(base_url, download_dir, pool, max_images=100, timer=None,
+                                           max_misses=SEQUENTIAL_MAX_MISSES,
+                                           batch_size=MAX_CONCURRENT_DOWNLOADS, cache=None):
+    """
+    تحميل الصور بالتسلسل الرقمي على دفعات متزامنة
+    مع التوقف بعد عدد محدد من الصور المفقودة المتتالية
+    الصورة غير الموجودة بالنمط المعتمد تُفحص بباقي الأنماط قبل عدها مفقودة
+    """
+    downloaded_images = []
+    # الصور الأولى المفقودة تُعد ضمن الحد نفسه
+    pattern = None
+    for first_index in range(1, min(max_misses, max_images) + 1):
+        pattern = await detect_sequential_pattern_async(base_url, pool, index=first_index)
+        if pattern:
+            break
+    if not pattern:
+        logging.info("❌ لم يتم العثور على أي نمط تسمية رقمي")
+        return downloaded_images
+
+    batch_size = max(1, batch_size)
+    misses = first_index - 1
+    for batch_start in range(first_index, max_images + 1, batch_size):
+        indices = range(batch_start, min(batch_start + batch_size, max_images + 1))
+        batch_pattern = pattern
+        results = await asyncio.gather(*(
+            download_sequential_image_async(i, urljoin(base_url, batch_pattern.format(i=i)), download_dir,
+                                            pool, cache)
+            for i in indices
+        ))
+
+        for i, page in zip(indices, results):
+            if misses >= max_misses:
+                # صور بعد نقطة التوقف لا تنتمي للسلسلة
+                if page and os.path.exists(page.path):
+                    os.remove(page.path)
+                continue
+            if not page:
+                fallback = await detect_sequential_pattern_async(base_url, pool, index=i, skip=batch_pattern)
+                if fallback:
+                    page = await download_sequential_image_async(
+                        i, urljoin(base_url, fallback.format(i=i)), download_dir, pool, cache
+                    )
+                    # الدفعة التالية تبدأ بآخر نمط نجح
+                    pattern = fallback
+            if page:
+                misses = 0
+                downloaded_images.append(page)
+                if timer:
+                    timer.mark()
+            else:
+                misses += 1
+
+        if misses >= max_misses:
+            logging.info(f"⏹️ التوقف بعد {max_misses} صور مفقودة متتالية")
+            break
+
+    return downloaded_images
+
+async def download_found_image_async(index, found, download_dir, pool, timer=None, cache=None):
+    """تحميل صورة واحدة من الصفحة (FoundImage)، وإرجاع PageInfo أو None عند الفشل"""
+    img_url = found.url
+    try:
+        img_filename = os.path.basename(urlparse(img_url).path)
+        if not img_filename:
+            img_filename = f"found_{index+1:03d}.jpg"
+
+        image_path = os.path.join(download_dir, f"found_{index+1:04d}_{img_filename}")
+        page = await save_image_async(img_url, image_path, pool, cache=cache)
+        if page:
+            if timer:
+                timer.mark()
+            logging.info(f"✅ تم تحميل صورة من الصفحة: {img_filename}")
+            return page._replace(source=found.source)
+    except Exception:
+        logging.warning(f"⚠️ فشل تحميل صورة من الصفحة: {img_url}")
+    return None
+
+async def download_found_images_async(found_urls, download_dir, pool, timer=None, cache=None):
+    """
+    تحميل روابط الصور معاً (الحد الفعلي هو حد كل خادم في المجمع)
+    النتائج تعود بنفس ترتيب الروابط
+    """
+    results = await asyncio.gather(*(
+        download_found_image_async(index, found, download_dir, pool, timer, cache)
+        for index, found in enumerate(found_urls)
+    ))
+    return [page for page in results if page]
+
+async def download_pages_async(base_url, download_dir, pool=None, cache=None):
+    """
+    نسخة asyncio من download_pages بنفس منطق الاكتشاف
+    pool: مجمع اتصالات مشترك (AsyncDownloadPool)؛ يُنشأ مجمع مؤقت إذا لم يُمرر
+    إلغاء المهمة يوقف جميع التحميلات الجارية فوراً
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = AsyncDownloadPool()
+    timer = FirstImageTimer()
+    all_downloaded = []
+
+    try:
+        async with span('discover'):
+            found_urls = await acquire_page_image_urls_async(base_url, pool, cache=cache)
+        if found_urls is None:
+            return []
+
+        logging.info(f"🔍 تم العثور على {len(found_urls)} رابط صورة محتمل في الصفحة")
+        all_downloaded = await download_found_images_async(found_urls, download_dir, pool, timer, cache)
+
+        if not all_downloaded:
+            logging.info("🔄 جرب البحث عن الصور بالتسلسل الرقمي...")
+            all_downloaded.extend(
+                await download_sequential_images_async(base_url, download_dir, pool, timer=timer, cache=cache)
+            )
+
+        all_downloaded = order_downloaded_pages(await asyncio.to_thread(filter_pages, all_downloaded), download_dir)
+
+    except Exception as e:
+        logging.error(f"❌ خطأ في عملية التحميل: {e}")
+    finally:
+        if own_pool:
+            await pool.aclose()
+
+    logging.info(f"📊 إجمالي الصور التي تم تحميلها: {len(all_downloaded)}")
+    return all_downloaded
+
+async def download_images_async(base_url, download_dir, pool=None, cache=None):
+    """تحميل الصور وإرجاع مساراتها فقط بالترتيب"""
+    return [page.path for page in await download_pages_async(base_url, download_dir, pool, cache)]
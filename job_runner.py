@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# الحد الأقصى للمهام الثقيلة (تحميل + PDF) التي تعمل في نفس الوقت
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+# الفترة بين تحديثات رسالة الحالة أثناء تنفيذ المهمة (بالثواني)
+STATUS_UPDATE_INTERVAL = float(os.environ.get('STATUS_UPDATE_INTERVAL', 5))
+
+class JobRunner:
+    """
+    تشغيل الأعمال الثقيلة خارج حلقة asyncio في خيوط منفصلة
+    حتى لا تتوقف معالجة رسائل باقي المستخدمين أثناء تنفيذ مهمة طويلة
+    """
+
+    def __init__(self, max_jobs=MAX_CONCURRENT_JOBS, update_interval=STATUS_UPDATE_INTERVAL):
+        self.max_jobs = max(1, max_jobs)
+        self.update_interval = update_interval
+        self.executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='job')
+
+    async def run(self, func, *args, on_tick=None, **kwargs):
+        """
+        تنفيذ دالة متزامنة في خيط منفصل وانتظار نتيجتها
+        on_tick: دالة async تُستدعى بالزمن المنقضي كل update_interval ثانية
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+        return await self.track(future, on_tick)
+
+    async def track(self, awaitable, on_tick=None):
+        """
+        انتظار عملية (coroutine أو future) مع تحديثات on_tick الدورية
+        إلغاء الانتظار يلغي العملية نفسها (مثل التحميلات غير المتزامنة الجارية)
+        """
+        future = asyncio.ensure_future(awaitable)
+        if on_tick is None:
+            return await future
+
+        started = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=self.update_interval)
+                if done:
+                    return future.result()
+                try:
+                    await on_tick(time.monotonic() - started)
+                except Exception as e:
+                    # فشل تحديث الحالة لا يجب أن يوقف المهمة
+                    logging.warning(f"⚠️ تعذر تحديث رسالة الحالة: {e}")
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
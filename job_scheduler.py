@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from job_runner import MAX_CONCURRENT_JOBS
+
+# الحد الأقصى للطلبات المنتظرة في الطابور العام
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 20))
+# الحد الأقصى للمهام التي تعمل في نفس الوقت لكل مستخدم
+MAX_JOBS_PER_USER = int(os.environ.get('MAX_JOBS_PER_USER', 1))
+# الحد الأقصى للطلبات المنتظرة لكل مستخدم (حتى لا يملأ مستخدم واحد الطابور)
+MAX_QUEUED_PER_USER = int(os.environ.get('MAX_QUEUED_PER_USER', 3))
+# رفض الطلب إذا تجاوز وقت الانتظار المتوقع هذا الحد (بالثواني)
+MAX_QUEUE_WAIT = float(os.environ.get('MAX_QUEUE_WAIT', 900))
+# تقدير مبدئي لمدة المهمة قبل قياس أي مهمة فعلية (بالثواني)
+DEFAULT_JOB_SECONDS = 60.0
+# عدد آخر المهام المحفوظة لحساب توزيع زمن الاستجابة
+LATENCY_HISTORY = 500
+
+class JobRejected(Exception):
+    """رفض الطلب عند القبول (الطابور ممتلئ أو الانتظار المتوقع طويل)"""
+
+class Ticket:
+    """تذكرة طلب في الطابور؛ تُستخدم مع async with لانتظار الدور ثم تحرير المكان"""
+
+    def __init__(self, scheduler, user_id):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._started = asyncio.get_running_loop().create_future()
+
+    def position(self):
+        """ترتيب الطلب في الطابور (0 = يعمل الآن)"""
+        return self.scheduler.position_of(self)
+
+    async def wait(self, on_position=None):
+        """
+        انتظار الدور، مع استدعاء on_position(position) عند كل تغير في الترتيب
+        """
+        last_position = None
+        try:
+            while not self._started.done():
+                position = self.position()
+                if on_position and position != last_position:
+                    last_position = position
+                    try:
+                        await on_position(position)
+                    except Exception as e:
+                        logging.warning(f"⚠️ تعذر إرسال ترتيب الطابور: {e}")
+                changed = asyncio.ensure_future(self.scheduler._changed.wait())
+                try:
+                    await asyncio.wait({self._started, changed}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+        except asyncio.CancelledError:
+            self.scheduler._release(self)
+            raise
+
+    async def __aenter__(self):
+        await self.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler._release(self)
+
+class JobScheduler:
+    """
+    جدولة الطلبات بعدل بين المستخدمين:
+    - طابور عام محدود الحجم
+    - حد للمهام العاملة لكل مستخدم
+    - دور بالتناوب (round-robin) بين المستخدمين
+    - رفض الطلب إذا كان وقت الانتظار المتوقع أطول من الحد
+    """
+
+    def __init__(self, max_running=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 per_user=MAX_JOBS_PER_USER, queued_per_user=MAX_QUEUED_PER_USER,
+                 max_wait=MAX_QUEUE_WAIT):
+        self.max_running = max(1, max_running)
+        self.max_queued = max_queued
+        self.per_user = max(1, per_user)
+        self.queued_per_user = queued_per_user
+        self.max_wait = max_wait
+        self.average_job_seconds = DEFAULT_JOB_SECONDS
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self._pending = OrderedDict()  # user_id -> deque(Ticket) بترتيب التناوب
+        self._running = {}  # user_id -> عدد المهام العاملة
+        self._changed = asyncio.Event()
+
+    # ---------- الحالة ----------
+
+    def queued_count(self):
+        return sum(len(tickets) for tickets in self._pending.values())
+
+    def running_count(self):
+        return sum(self._running.values())
+
+    def _turn_order(self):
+        """ترتيب بدء الطلبات المنتظرة لو استمر التناوب على حاله"""
+        queues = [list(tickets) for tickets in self._pending.values()]
+        order = []
+        depth = 0
+        while any(depth < len(queue) for queue in queues):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+            depth += 1
+        return order
+
+    def position_of(self, ticket):
+        if ticket._started.done():
+            return 0
+        try:
+            return self._turn_order().index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def estimated_wait(self, position):
+        """وقت الانتظار المتوقع لطلب في هذا الترتيب"""
+        free_slots = self.max_running - self.running_count()
+        if position <= free_slots:
+            return 0.0
+        return math.ceil((position - free_slots) / self.max_running) * self.average_job_seconds
+
+    def latency_percentiles(self):
+        """(p50, p95) لزمن الطلب من الإرسال حتى الانتهاء بالثواني"""
+        if not self.latencies:
+            return None, None
+        ordered = sorted(self.latencies)
+        def percentile(fraction):
+            return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+        return percentile(0.50), percentile(0.95)
+
+    # ---------- القبول والتوزيع ----------
+
+    def admit(self, user_id):
+        """
+        قبول طلب جديد وإرجاع تذكرته، أو رفع JobRejected
+        """
+        if self.queued_count() >= self.max_queued:
+            raise JobRejected("الطابور ممتلئ حالياً، يرجى المحاولة بعد قليل")
+        if len(self._pending.get(user_id, ())) >= self.queued_per_user:
+            raise JobRejected("لديك طلبات كثيرة في الطابور، انتظر انتهاء بعضها ثم أعد الإرسال")
+
+        ticket = Ticket(self, user_id)
+        self._pending.setdefault(user_id, deque()).append(ticket)
+        self._dispatch()
+
+        position = self.position_of(ticket)
+        wait_seconds = self.estimated_wait(position)
+        if wait_seconds > self.max_wait:
+            self._remove_pending(ticket)
+            raise JobRejected(
+                f"وقت الانتظار المتوقع طويل جداً (~{wait_seconds / 60:.0f} دقيقة)، يرجى المحاولة لاحقاً"
+            )
+        logging.info(f"📋 طلب جديد من {user_id}: الترتيب {position}، الانتظار المتوقع {wait_seconds:.0f} ثانية")
+        return ticket
+
+    def _dispatch(self):
+        """بدء الطلبات المنتظرة بالتناوب بين المستخدمين حتى امتلاء الأماكن"""
+        started_any = True
+        while started_any and self.running_count() < self.max_running:
+            started_any = False
+            for user_id in list(self._pending):
+                if self._running.get(user_id, 0) >= self.per_user:
+                    continue
+                ticket = self._pending[user_id].popleft()
+                if not self._pending[user_id]:
+                    del self._pending[user_id]
+                else:
+                    # المستخدم ينتقل إلى نهاية الدور
+                    self._pending.move_to_end(user_id)
+                self._running[user_id] = self._running.get(user_id, 0) + 1
+                ticket.started_at = time.monotonic()
+                ticket._started.set_result(True)
+                started_any = True
+                break
+        self._notify()
+
+    def _notify(self):
+        """إيقاظ المنتظرين لتحديث ترتيبهم"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _remove_pending(self, ticket):
+        tickets = self._pending.get(ticket.user_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._pending[ticket.user_id]
+            self._notify()
+
+    def _release(self, ticket):
+        """تحرير مكان التذكرة عند الانتهاء أو الإلغاء"""
+        if ticket.started_at is None:
+            self._remove_pending(ticket)
+            return
+        if ticket.user_id not in self._running:
+            return
+        self._running[ticket.user_id] -= 1
+        if self._running[ticket.user_id] <= 0:
+            del self._running[ticket.user_id]
+
+        finished = time.monotonic()
+        # متوسط متحرك لمدة المهمة لتقدير الانتظار
+        self.average_job_seconds = 0.8 * self.average_job_seconds + 0.2 * (finished - ticket.started_at)
+        self.latencies.append(finished - ticket.submitted_at)
+        ticket.started_at = None
+        self._dispatch()
@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# القياسات مفعلة افتراضياً؛ METRICS_ENABLED=0 يحول كل span وعداد إلى استدعاء فارغ
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# منفذ نقطة القياسات: نفس المنفذ الذي تخصصه Render لخدمة web
+METRICS_PORT = int(os.environ.get('PORT', 0))
+# حدود فئات مدرجات الزمن (بالثواني)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# حدود فئات مدرجات الذاكرة (بالميجابايت)
+MEGABYTES_BUCKETS = (32, 64, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048)
+# الفترة بين قراءات RSS أثناء تنفيذ المهام (بالثواني)
+RSS_SAMPLE_INTERVAL = 0.25
+PAGE_SIZE_BYTES = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+class Histogram:
+    """مدرج تكراري بفئات ثابتة (عدد القيم ≤ كل حد) مع المجموع والعدد"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+# القياسات داخل Capture() تُجمع في قائمة الخيط الحالي بدل السجل العام
+_local = threading.local()
+
+def _record(kind, name, label, value):
+    sink = getattr(_local, 'sink', None)
+    if sink is not None:
+        sink.append((kind, name, label, value))
+        return
+    with _lock:
+        if kind == 'counter':
+            _counters[(name, label)] = _counters.get((name, label), 0) + value
+        else:
+            histogram = _histograms.get((name, label))
+            if histogram is None:
+                histogram = _histograms[(name, label)] = Histogram(
+                    MEGABYTES_BUCKETS if name.endswith('_mb') else SECONDS_BUCKETS
+                )
+            histogram.observe(value)
+
+def observe(name, label, value):
+    """إضافة قيمة إلى مدرج name{label} (الزمن بالثواني، أو بالميجابايت إذا انتهى الاسم بـ _mb)"""
+    if METRICS_ENABLED:
+        _record('histogram', name, label, value)
+
+def add(name, label, amount):
+    """زيادة العداد name{label} (مثل البايتات الداخلة والخارجة)"""
+    if METRICS_ENABLED:
+        _record('counter', name, label, amount)
+
+class Span:
+    """قياس زمن مرحلة واحدة في المدرج stage_seconds{stage}"""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record('histogram', 'stage_seconds', self.stage, time.perf_counter() - self.started)
+
+    # نفس القياس داخل async with (مع قيود الاتصالات مثلاً)
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+NULL_SPAN = nullcontext()
+
+def span(stage):
+    """
+    with span('fetch'): ... (أو async with) يقيس زمن المرحلة
+    عند التعطيل يرجع سياقاً فارغاً مشتركاً: لا توقيت ولا قفل ولا إنشاء كائنات
+    """
+    if not METRICS_ENABLED:
+        return NULL_SPAN
+    return Span(stage)
+
+class Capture:
+    """
+    جمع القياسات في قائمة بدل السجل العام (داخل العمليات الفرعية حيث لا يصل السجل إلى البوت)
+    with Capture() as records: ... ثم تُعاد records مع النتيجة وتُدمج في العملية الرئيسية بـ merge
+    """
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'sink', None)
+        self.records = []
+        if METRICS_ENABLED:
+            _local.sink = self.records
+        return self.records
+
+    def __exit__(self, *exc):
+        _local.sink = self.previous
+
+def merge(records):
+    """دمج قياسات جمعتها Capture() في السجل العام"""
+    for kind, name, label, value in records or ():
+        _record(kind, name, label, value)
+
+def process_tree_rss_bytes():
+    """RSS الحالي للعملية مع عملياتها الفرعية المباشرة (عمليات معالجة الصور)"""
+    pids = ['self']
+    try:
+        for task in os.listdir('/proc/self/task'):
+            with open(f'/proc/self/task/{task}/children') as f:
+                pids.extend(f.read().split())
+    except OSError:
+        pass
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE_BYTES
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+class RssSampler:
+    """
+    خيط واحد يقرأ RSS دورياً ما دامت هناك مهام جارية، ويحدث أقصى قيمة لكل مهمة
+    المهام المتزامنة تتشارك العملية، فأقصى RSS لمهمة يشمل ما تستهلكه المهام الأخرى في نفس الوقت
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_job(self, job):
+        with self._lock:
+            self.jobs.add(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+
+    def stop_job(self, job):
+        with self._lock:
+            self.jobs.discard(job)
+
+    def _run(self):
+        while True:
+            rss = process_tree_rss_bytes()
+            with self._lock:
+                if not self.jobs:
+                    self._thread = None
+                    return
+                for job in self.jobs:
+                    job.peak_rss = max(job.peak_rss, rss)
+            time.sleep(self.interval)
+
+RSS_SAMPLER = RssSampler()
+
+class JobMetrics:
+    """
+    قياسات مهمة كاملة: الزمن الكلي (job_seconds) وأقصى RSS أثناءها (job_peak_rss_mb)
+    with JobMetrics('balanced'): ...
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.peak_rss = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        if METRICS_ENABLED:
+            self.peak_rss = process_tree_rss_bytes()
+            RSS_SAMPLER.start_job(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if not METRICS_ENABLED:
+            return
+        RSS_SAMPLER.stop_job(self)
+        self.peak_rss = max(self.peak_rss, process_tree_rss_bytes())
+        elapsed = time.perf_counter() - self.started
+        observe('job_seconds', self.kind, elapsed)
+        observe('job_peak_rss_mb', self.kind, self.peak_rss / (1024 * 1024))
+        add('jobs_total', 'failed' if exc_type else 'ok', 1)
+        logging.info(f"📈 مهمة {self.kind}: {elapsed:.2f} ثانية، أقصى RSS {self.peak_rss / (1024 * 1024):.0f} MB")
+
+def format_label(name, label):
+    key = 'stage' if name == 'stage_seconds' else 'kind'
+    return f'{key}="{label}"'
+
+def render_metrics():
+    """نص القياسات بصيغة Prometheus"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h.counts), h.total, h.count, h.buckets)) for key, h in _histograms.items())
+    lines = []
+    for (name, label), value in counters:
+        lines.append(f'bot_{name}{{{format_label(name, label)}}} {value}')
+    for (name, label), (counts, total, count, buckets) in histograms:
+        labels = format_label(name, label)
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f'bot_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'bot_{name}_sum{{{labels}}} {total:.6f}')
+        lines.append(f'bot_{name}_count{{{labels}}} {count}')
+    lines.append(f'bot_process_rss_mb {process_tree_rss_bytes() / (1024 * 1024):.1f}')
+    return '\n'.join(lines) + '\n'
+
+def metrics_response(path):
+    """
+    استجابة GET لمسار ما: (البيانات، نوع المحتوى)
+    /metrics: القياسات؛ وأي مسار آخر: استجابة بسيطة لفحص صحة الخدمة
+    (مشتركة بين خادم القياسات وخادم webhook الذي يحل محله على نفس المنفذ)
+    """
+    if path.split('?')[0] == '/metrics':
+        return render_metrics().encode(), 'text/plain; version=0.0.4'
+    return b'ok\n', 'text/plain'
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """خادم القياسات في وضع polling (انظر metrics_response)"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body, content_type = metrics_response(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(port=METRICS_PORT):
+    """تشغيل نقطة القياسات في خيط منفصل؛ يرجع الخادم أو None إذا لم يُحدد منفذ أو عُطلت القياسات"""
+    if not port or not METRICS_ENABLED:
+        return None
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"📈 نقطة القياسات: http://0.0.0.0:{port}/metrics")
+    return server
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# مجلد الذاكرة المؤقتة وحجمها الأقصى (0 = معطلة)
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'manga-cache'))
+CACHE_MAX_MB = int(os.environ.get('CACHE_MAX_MB', 500))
+# مدة اعتبار التحميلات حديثة دون إعادة التحقق من الخادم (بالثواني)
+CACHE_FRESH_SECONDS = int(os.environ.get('CACHE_FRESH_SECONDS', 3600))
+
+RAW = 'raw'
+PROCESSED = 'processed'
+
+def file_sha256(path):
+    """بصمة SHA-256 لمحتوى الملف"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def link_or_copy(source, destination):
+    """ربط الملف (hard link) إن أمكن وإلا نسخه"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def page_suffix(page):
+    """امتداد ملف الصفحة المعالجة: من المسار، أو من توقيع البيانات (TIFF لصفحات G4)"""
+    if isinstance(page, str):
+        return os.path.splitext(page)[1] or '.jpg'
+    return '.tif' if bytes(page[:4]) in (b'II*\x00', b'MM\x00*') else '.jpg'
+
+class PageCache:
+    """
+    ذاكرة مؤقتة على القرص بطبقتين:
+    - raw: التحميلات الخام، مفتاحها الرابط مع ETag/Last-Modified للتحقق
+    - processed: الصفحات المعالجة، مفتاحها بصمة المصدر مع إعدادات الجودة
+    المحتوى مخزن حسب بصمته (content-addressed) ويُحذف الأقدم استخداماً عند تجاوز الحجم
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024,
+                 fresh_seconds=CACHE_FRESH_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.counters = Counter()
+        self._lock = threading.RLock()
+        for directory in ('blobs', RAW, PROCESSED):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        self._size = self._blobs_size()
+
+    # ---------- المسارات ----------
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def _entry_path(self, layer, key):
+        return os.path.join(self.root, layer, f"{key}.json")
+
+    def _blobs_size(self):
+        total = 0
+        for directory, _, files in os.walk(os.path.join(self.root, 'blobs')):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return total
+
+    # ---------- التخزين الداخلي ----------
+
+    def _store_blob(self, source):
+        """إضافة ملف (أو بيانات bytes في الذاكرة) إلى المخزن حسب بصمته وإرجاع البصمة"""
+        in_memory = isinstance(source, (bytes, bytearray, memoryview))
+        digest = hashlib.sha256(source).hexdigest() if in_memory else file_sha256(source)
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if in_memory:
+                with open(temp_path, 'wb') as f:
+                    f.write(source)
+            else:
+                link_or_copy(source, temp_path)
+            os.replace(temp_path, blob_path)
+            self._size += os.path.getsize(blob_path)
+        return digest
+
+    def _read_entry(self, layer, key):
+        try:
+            with open(self._entry_path(layer, key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(self._blob_path(digest)) for digest in entry.get('blobs', [])):
+            return None
+        return entry
+
+    def _write_entry(self, layer, key, entry):
+        entry_path = self._entry_path(layer, key)
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, entry_path)
+
+    def _touch(self, layer, key):
+        """تحديث وقت آخر استخدام (أساس الحذف الأقدم استخداماً)"""
+        try:
+            os.utime(self._entry_path(layer, key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """حذف المدخلات الأقدم استخداماً حتى يعود الحجم تحت الحد"""
+        if self._size <= self.max_bytes:
+            return
+        entries = []
+        references = Counter()
+        for layer in (RAW, PROCESSED):
+            layer_dir = os.path.join(self.root, layer)
+            for name in os.listdir(layer_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(layer_dir, name)
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        blobs = json.load(f).get('blobs', [])
+                    entries.append((os.path.getmtime(path), path, blobs))
+                    references.update(blobs)
+                except (OSError, ValueError):
+                    continue
+
+        entries.sort()
+        for _, path, blobs in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.counters['evictions'] += 1
+            for digest in blobs:
+                references[digest] -= 1
+                if references[digest] <= 0:
+                    blob_path = self._blob_path(digest)
+                    try:
+                        self._size -= os.path.getsize(blob_path)
+                        os.remove(blob_path)
+                    except OSError:
+                        pass
+        logging.info(f"🧹 الذاكرة المؤقتة بعد الحذف: {self._size / (1024 * 1024):.1f} MB")
+
+    def _materialize(self, digest, destination):
+        link_or_copy(self._blob_path(digest), destination)
+        return destination
+
+    # ---------- طبقة التحميلات الخام ----------
+
+    def lookup_raw(self, url):
+        """
+        يرجع المدخل المخزن للرابط أو None
+        المدخل يحتوي 'fresh' إذا لم تنتهِ مدة صلاحيته (لا حاجة لأي طلب شبكة)
+        """
+        with self._lock:
+            entry = self._read_entry(RAW, text_sha256(url))
+        if entry is None:
+            return None
+        entry['fresh'] = time.time() - entry.get('validated_at', 0) < self.fresh_seconds
+        return entry
+
+    def validation_headers(self, entry):
+        """ترويسات الطلب الشرطي لإعادة التحقق من مدخل قديم"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _record_raw_hit(self, url, entry, revalidated):
+        """احتساب الإصابة وتحديث وقت الاستخدام (ووقت التحقق بعد استجابة 304)"""
+        key = text_sha256(url)
+        with self._lock:
+            self.counters['raw_hits'] += 1
+            if revalidated:
+                entry = dict(entry, validated_at=time.time())
+                entry.pop('fresh', None)
+                self._write_entry(RAW, key, entry)
+            else:
+                self._touch(RAW, key)
+
+    def use_raw(self, url, entry, destination, revalidated=False):
+        """نسخ التحميل المخزن إلى المسار المطلوب"""
+        self._record_raw_hit(url, entry, revalidated)
+        return self._materialize(entry['blobs'][0], destination)
+
+    def raw_bytes(self, url, entry, revalidated=False):
+        """قراءة محتوى التحميل المخزن (لصفحات HTML)"""
+        self._record_raw_hit(url, entry, revalidated)
+        with open(self._blob_path(entry['blobs'][0]), 'rb') as f:
+            return f.read()
+
+    def store_raw_bytes(self, url, data, etag=None, last_modified=None, **metadata):
+        """تخزين محتوى تحميل خام موجود في الذاكرة"""
+        with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as f:
+            f.write(data)
+            temp_path = f.name
+        try:
+            self.store_raw(url, temp_path, etag, last_modified, **metadata)
+        finally:
+            os.remove(temp_path)
+
+    def store_raw(self, url, path, etag=None, last_modified=None, **metadata):
+        """تخزين تحميل خام مع ترويسات التحقق وبيانات إضافية (الصيغة، الأبعاد...)"""
+        with self._lock:
+            self.counters['raw_misses'] += 1
+            try:
+                digest = self._store_blob(path)
+                entry = dict(metadata, blobs=[digest], etag=etag, last_modified=last_modified,
+                             validated_at=time.time())
+                self._write_entry(RAW, text_sha256(url), entry)
+                self._evict()
+            except OSError as e:
+                logging.warning(f"⚠️ تعذر تخزين {url} في الذاكرة المؤقتة: {e}")
+
+    # ---------- طبقة الصفحات المعالجة ----------
+
+    def processed_key(self, source_path, **params):
+        """مفتاح الصفحة المعالجة: بصمة المصدر مع إعدادات الجودة (max_width, quality, mode...)"""
+        return text_sha256(file_sha256(source_path) + json.dumps(params, sort_keys=True))
+
+    def fetch_processed(self, key, base_name):
+        """
+        نسخ الصفحات المعالجة المخزنة بجانب المصدر وإرجاع مساراتها، أو None
+        """
+        with self._lock:
+            entry = self._read_entry(PROCESSED, key)
+            if entry is None:
+                self.counters['processed_misses'] += 1
+                return None
+            self.counters['processed_hits'] += 1
+            self._touch(PROCESSED, key)
+        suffixes = entry.get('suffixes') or ['.jpg'] * len(entry['blobs'])
+        return [
+            self._materialize(digest, f"{base_name}_cached_{i + 1:03d}{suffix}")
+            for i, (digest, suffix) in enumerate(zip(entry['blobs'], suffixes))
+        ]
+
+    def store_processed(self, key, pages):
+        """تخزين الصفحات المعالجة لمصدر واحد (مسارات ملفات أو بيانات في الذاكرة)"""
+        with self._lock:
+            try:
+                digests = [self._store_blob(page) for page in pages]
+                suffixes = [page_suffix(page) for page in pages]
+                self._write_entry(PROCESSED, key, {'blobs': digests, 'suffixes': suffixes,
+                                                   'stored_at': time.time()})
+                self._evict()
+            except OSError as e:
+                logging.warning(f"⚠️ تعذر تخزين الصفحة المعالجة في الذاكرة المؤقتة: {e}")
+
+    def stats(self):
+        """عدادات الإصابة والإخفاق والحجم الحالي"""
+        with self._lock:
+            return dict(self.counters, size_bytes=self._size)
+
+def create_default_cache():
+    """إنشاء الذاكرة المؤقتة الافتراضية من متغيرات البيئة (None إذا كانت معطلة)"""
+    if CACHE_MAX_MB <= 0:
+        return None
+    try:
+        return PageCache()
+    except OSError as e:
+        logging.warning(f"⚠️ تعذر إنشاء الذاكرة المؤقتة في {CACHE_DIR}: {e}")
+        return None
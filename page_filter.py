@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+import statistics
+from PIL import Image
+
+# الصور التي يقل أحد بعديها عن هذا الحد ليست صفحات (شعارات، أيقونات، صور المستخدمين، شرائط إعلانية)
+MIN_PAGE_SIDE = int(os.environ.get('MIN_PAGE_SIDE', 200))
+# الصفحات الأضيق من هذه النسبة من العرض الشائع في الفصل لا تنتمي لتسلسل القراءة
+MAIN_WIDTH_RATIO = 0.6
+# كلمات في class/id/alt/الرابط تدل على صور الموقع وليس صفحات الفصل
+JUNK_HINTS = re.compile(r'logo|avatar|banner|icon|sprite|emoji|badge|advert|\bads?\b|gravatar|loading|spinner',
+                        re.IGNORECASE)
+# البصمة الإدراكية (dHash) على صورة مصغرة 17x16 بالتدرج الرمادي: بت "أفتح" وبت "أغمق" لكل زوج = 512 بت
+# (64 بت لا تفرق بين الصفحات البيضاء غالباً ذات الفقاعات القليلة)
+HASH_SIZE = 16
+# فرق السطوع بين الجارين الذي يُعد متساوياً (لا يقلب البت عند تغيير المقاس أو ضغط JPEG)
+HASH_FLAT_DIFF = 4
+# أقصى عدد بتات مختلفة لاعتبار صورتين نفس الصفحة بمقاسين مختلفين
+# (نسخ نفس الصفحة بنصف المقاس أو 1.6 ضعفه ≤ 15، وأقرب صفحتين مختلفتين في الفحص ≥ 26)
+DUPLICATE_MAX_DISTANCE = 20
+# الصفحتان المتجاورتان من وسمين مختلفين لا تُقارنان إلا بنفس نسبة الأبعاد (فرق نسبي)
+DUPLICATE_ASPECT_TOLERANCE = 0.02
+# الصور شبه الموحدة (صفحات فارغة) لا تُقارن: بصماتها متطابقة رغم أنها صفحات مختلفة
+HASH_MIN_SPREAD = 16
+# في التصفية المتدفقة لا يُطبق شرط العرض قبل قبول هذا العدد من الصفحات (لا وسيط موثوق قبلها)
+STREAMING_WIDTH_WARMUP = 3
+
+def has_junk_hint(tag, url):
+    """هل يدل وسم الصورة أو رابطها على شعار أو إعلان أو أيقونة؟"""
+    parts = [os.path.basename(url.split('?')[0]), tag.get('alt') or '', tag.get('id') or '']
+    parts.extend(tag.get('class') or [])
+    return any(JUNK_HINTS.search(part) for part in parts)
+
+def is_too_small(size):
+    """الأبعاد (من رأس الصورة) أصغر من أن تكون صفحة"""
+    return bool(size) and min(size) < MIN_PAGE_SIDE
+
+def perceptual_hash(image_path):
+    """
+    بصمة dHash: مقارنة كل بكسل بجاره الأيمن في نسخة 17x16 رمادية
+    كل زوج بتان (أفتح، أغمق) والفرق الأصغر من HASH_FLAT_DIFF لا يضبط أياً منهما
+    draft يفك JPEG بمقياس مصغر فلا تُفك الصورة كاملة
+    يرجع None للصور شبه الموحدة
+    """
+    with Image.open(image_path) as img:
+        img.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        thumb = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = thumb.tobytes()
+    if max(pixels) - min(pixels) < HASH_MIN_SPREAD:
+        return None
+    brighter = darker = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            diff = pixels[offset + col] - pixels[offset + col + 1]
+            brighter = (brighter << 1) | (diff > HASH_FLAT_DIFF)
+            darker = (darker << 1) | (diff < -HASH_FLAT_DIFF)
+    return (brighter << (HASH_SIZE * HASH_SIZE)) | darker
+
+def page_hash_or_none(page):
+    """بصمة الصفحة، أو None إذا تعذر فكها (الصفحة تبقى دون مقارنة)"""
+    try:
+        return perceptual_hash(page.path)
+    except Exception as e:
+        logging.warning(f"⚠️ تعذر حساب بصمة {os.path.basename(page.path)}: {e}")
+        return None
+
+def same_aspect(page, other):
+    """نسبة العرض إلى الارتفاع متساوية تقريباً"""
+    ratio = page.width / page.height
+    other_ratio = other.width / other.height
+    return abs(ratio - other_ratio) <= DUPLICATE_ASPECT_TOLERANCE * other_ratio
+
+def find_duplicate(page, page_hash, kept, hashes, previous=None):
+    """
+    موضع أول صفحة مقبولة هي نسخة من page، أو None
+    البصمة وحدها لا تكفي (صفحات مختلفة قد تتشابه بصماتها): المرشحون هم روابط نفس الوسم
+    والصفحة السابقة مباشرة (previous) إذا كانت بنفس نسبة الأبعاد
+    """
+    if page_hash is None:
+        return None
+    for index, (other, other_hash) in enumerate(zip(kept, hashes)):
+        if other_hash is None:
+            continue
+        same_source = page.source is not None and page.source == other.source
+        if not same_source and not (index == previous and same_aspect(page, other)):
+            continue
+        if bin(page_hash ^ other_hash).count('1') <= DUPLICATE_MAX_DISTANCE:
+            return index
+    return None
+
+def remove_page(page, reason):
+    logging.info(f"🗑️ استبعاد {os.path.basename(page.path)} ({page.width}x{page.height}): {reason}")
+    try:
+        os.remove(page.path)
+    except OSError:
+        pass
+
+def filter_pages(pages):
+    """
+    تصفية الصفحات المحملة (بترتيب الصفحة) وإرجاع تسلسل القراءة الرئيسي:
+    - حذف الصور الصغيرة وتلك الأضيق بكثير من العرض الشائع في الفصل
+    - دمج النسخ المكررة من نفس الصفحة بمقاسات مختلفة (نحتفظ بالأكبر في موضع الأولى):
+      روابط نفس الوسم، أو صفحتان متجاورتان بنفس نسبة الأبعاد وبصمة متقاربة
+    الملفات المستبعدة تُحذف من القرص
+    """
+    candidates = []
+    for page in pages:
+        if is_too_small((page.width, page.height)):
+            remove_page(page, "صغيرة جداً")
+        else:
+            candidates.append(page)
+    if len(candidates) < 2:
+        return candidates
+
+    # العرض الشائع لصفحات الفصل (الصفحات المزدوجة أعرض ولا تُستبعد)
+    common_width = statistics.median(page.width for page in candidates)
+    main = []
+    for page in candidates:
+        if page.width < common_width * MAIN_WIDTH_RATIO:
+            remove_page(page, f"أضيق من صفحات الفصل ({common_width:.0f}px)")
+        else:
+            main.append(page)
+
+    kept = []
+    hashes = []
+    # موضع الصفحة السابقة في kept (أو الصفحة التي دُمجت فيها)
+    previous = None
+    for page in main:
+        page_hash = page_hash_or_none(page)
+        duplicate_of = find_duplicate(page, page_hash, kept, hashes, previous)
+        if duplicate_of is None:
+            previous = len(kept)
+            kept.append(page)
+            hashes.append(page_hash)
+            continue
+        previous = duplicate_of
+        # نفس الصفحة بمقاسين: الأكبر يأخذ موضع الأولى (واسم ملفها حتى يبقى الترتيب)
+        other = kept[duplicate_of]
+        if page.width * page.height > other.width * other.height:
+            remove_page(other, f"نسخة أصغر من {os.path.basename(page.path)}")
+            os.replace(page.path, other.path)
+            kept[duplicate_of] = page._replace(path=other.path)
+        else:
+            remove_page(page, f"نسخة مكررة من {os.path.basename(other.path)}")
+
+    if len(kept) < len(pages):
+        logging.info(f"🧹 التصفية: {len(kept)} صفحة من {len(pages)} صورة")
+    return kept
+
+class StreamingPageFilter:
+    """
+    نفس قواعد filter_pages لكن بقرار فوري لكل صفحة بترتيبها (لخط المعالجة المتدفق)
+    حيث لا تتوفر صفحات الفصل كاملة عند اتخاذ القرار:
+    - العرض يُقارن بوسيط عرض الصفحات المقبولة حتى الآن (بعد STREAMING_WIDTH_WARMUP صفحات)
+    - النسخة المكررة اللاحقة تُستبعد دائماً لأن الأولى ربما كُتبت في PDF بالفعل
+    """
+
+    def __init__(self):
+        self.widths = []
+        self.pages = []
+        self.hashes = []
+        self.previous = None
+
+    def accept(self, page):
+        """هل تدخل الصفحة في تسلسل القراءة؟ الصفحة المرفوضة تُحذف من القرص"""
+        if is_too_small((page.width, page.height)):
+            remove_page(page, "صغيرة جداً")
+            return False
+        if len(self.widths) >= STREAMING_WIDTH_WARMUP:
+            common_width = statistics.median(self.widths)
+            if page.width < common_width * MAIN_WIDTH_RATIO:
+                remove_page(page, f"أضيق من صفحات الفصل ({common_width:.0f}px)")
+                return False
+        page_hash = page_hash_or_none(page)
+        duplicate_of = find_duplicate(page, page_hash, self.pages, self.hashes, self.previous)
+        if duplicate_of is not None:
+            self.previous = duplicate_of
+            remove_page(page, f"نسخة مكررة من {os.path.basename(self.pages[duplicate_of].path)}")
+            return False
+        self.previous = len(self.pages)
+        self.widths.append(page.width)
+        self.pages.append(page)
+        self.hashes.append(page_hash)
+        return True
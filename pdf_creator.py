@@ -1,97 +1,502 @@
-import img2pdf
-from PIL import Image, ImageFile
+from PIL import Image, ImageChops, ImageFile, ImageStat
+import io
 import os
+import math
 import logging
+import threading
+import time
 import traceback
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
 import natsort  # إضافة مكتبة لترتيب طبيعي للأسماء
+from pdf_writer import open_pdf_writer, page_source_name, page_source_size
+from metrics import Capture, merge, span
 
 # السماح بتحميل الصور التالفة جزئياً
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# إعدادات الضغط الافتراضية
+COMPRESSED_MAX_WIDTH = 1200
+COMPRESSED_QUALITY = 65
+# جودة الصور الطويلة جداً (أطول من 5000 بكسل)
+TALL_PAGE_QUALITY = 60
+
+# أقصى عرض للصور الطويلة في وضع الجودة العالية
+HQ_MAX_WIDTH = 1600
+
+# عدد عمليات معالجة الصور المتوازية (افتراضياً عدد أنوية المعالج)
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 0)) or os.cpu_count() or 1
+
+# المسار السريع لصور JPEG الكبيرة: فك الترميز مباشرة بمقياس مصغر (draft)
+# نطلب حجماً أكبر من الهدف بهذا المعامل حتى يبقى LANCZOS هو المحدد للجودة
+DRAFT_OVERSAMPLE = 1.25
+# أدنى جودة مسموحة للمسار السريع مقارنة بفك الترميز الكامل (PSNR بالديسيبل)
+DRAFT_MIN_PSNR = 38.0
+# عدد الصفحات التي نفحص رؤوسها بحثاً عن صورة مناسبة لمعايرة المسار السريع
+DRAFT_CALIBRATION_SCAN = 10
+
+# تقسيم الصور الطويلة جداً إلى عدة صفحات PDF (0 = بدون تقسيم)
+MAX_PAGE_HEIGHT = int(os.environ.get('MAX_PAGE_HEIGHT', 0)) or None
+# نبحث عن فراغ بين اللوحات في هذا الجزء من نهاية كل شريحة
+STRIP_CUT_SEARCH = 0.15
+# أقصى فرق بين أفتح وأغمق بكسل ليُعتبر الصف فراغاً
+STRIP_CUT_TOLERANCE = 12
+
+# التمرير المباشر: صور JPEG صغيرة بالفعل تُضمَّن في PDF دون إعادة ترميز
+# أقصى كثافة بيانات (بت لكل بكسل) لنعتبر الصورة مضغوطة بما يكفي
+PASSTHROUGH_MAX_BITS_PER_PIXEL = 2.0
+# نهاية ملف JPEG (EOI) تُبحث في آخر هذا العدد من البايتات (بعض الملفات فيها حشو بعد EOI)
+JPEG_END_SCAN_BYTES = 1024
+
+# تصنيف الصفحات: أغلب صفحات المانجا أبيض وأسود حتى لو كانت مخزنة بثلاث قنوات
+# يُقاس التصنيف على نسخة مصغرة بهذا العدد من البكسلات تقريباً
+CLASSIFY_SAMPLE_PIXELS = 256 * 256
+# أقصى فرق بين القنوات (R/G/B) ليُعتبر البكسل رمادياً (يتحمل تشويش JPEG)
+GRAY_CHROMA_TOLERANCE = 24
+# أقصى نسبة من البكسلات الملونة في صفحة رمادية
+GRAY_MAX_COLOR_RATIO = 0.002
+# الصفحة شبه ثنائية (أبيض/أسود فقط) إذا كانت هذه النسبة من بكسلاتها قريبة من الطرفين
+BILEVEL_EXTREME_TOLERANCE = 64
+BILEVEL_MIN_RATIO = 0.97
+
+# الصفحات المرمّزة تُمرر إلى كاتب PDF من الذاكرة دون ملفات مؤقتة،
+# إلا إذا تجاوزت الصفحة هذا الحجم فتُكتب على القرص
+PAGE_SPILL_BYTES = int(os.environ.get('PAGE_SPILL_MB', 8)) * 1024 * 1024
+# عدد الصفحات المعالجة مسبقاً لكل عملية (يحد الذاكرة المحجوزة للصفحات المنتظرة)
+PAGE_PREFETCH_PER_WORKER = 2
+
+# نتيجة معالجة صورة واحدة: الصفحات (مسارات أو بيانات في الذاكرة)، هل مُررت مباشرة، وزمن المعالج المستهلك
+# io_counts: عدادات الإدخال والإخراج للصفحة (تُجمع في PAGE_IO_TOTALS داخل العملية الرئيسية)
+PageResult = namedtuple('PageResult', ['pages', 'passthrough', 'cpu_seconds', 'timings', 'io_counts'])
+
+# إعدادات وضع الجودة (تُمرر إلى العمليات الفرعية، لذا namedtuple وليس كائناً بدوال):
+# max_width: أقصى عرض للصفحات العادية (None = دون تصغير)
+# tall_height: الصفحات الأطول من هذا تُعامل كصور طويلة (يُضبط العرض فقط إلى tall_max_width)
+# quality / tall_quality: جودة JPEG، والجودة للصفحات الأطول من tall_quality_height
+# passthrough_bits: أقصى بت لكل بكسل لتمرير JPEG دون إعادة ترميز (None = دون حد)
+# bilevel: ترميز الصفحات شبه الثنائية بـ CCITT G4
+PdfProfile = namedtuple('PdfProfile', [
+    'name', 'max_width', 'quality', 'tall_height', 'tall_max_width',
+    'tall_quality_height', 'tall_quality', 'passthrough_bits', 'bilevel',
+])
+
+PROFILES = {
+    # أصغر حجم: عرض 1200 وجودة 65، والصفحات الخطية بـ G4
+    'small': PdfProfile('small', COMPRESSED_MAX_WIDTH, COMPRESSED_QUALITY, 3000, COMPRESSED_MAX_WIDTH,
+                        5000, TALL_PAGE_QUALITY, PASSTHROUGH_MAX_BITS_PER_PIXEL, True),
+    # توازن: عرض أكبر وجودة أعلى دون تحويل الصفحات إلى أبيض وأسود فقط
+    'balanced': PdfProfile('balanced', 1400, 78, 3000, 1400, 5000, 72, 3.0, False),
+    # جودة عالية: الصفحات العادية بحجمها الأصلي، والطويلة بعرض HQ_MAX_WIDTH
+    'high': PdfProfile('high', None, 90, 3000, HQ_MAX_WIDTH, 3000, 85, None, False),
+    # مبسط: إعادة ترميز فقط دون تحجيم
+    'simple': PdfProfile('simple', None, 80, 3000, None, 3000, 80, PASSTHROUGH_MAX_BITS_PER_PIXEL, False),
+}
+
+def get_profile(profile):
+    """قبول اسم الوضع أو كائن PdfProfile"""
+    if isinstance(profile, PdfProfile):
+        return profile
+    if profile not in PROFILES:
+        raise Exception(f"وضع جودة غير معروف: {profile}")
+    return PROFILES[profile]
+
+# وسم RowsPerStrip في TIFF: شريط واحد للصفحة كاملة حتى يكون بيانات G4 متصلة
+ROWS_PER_STRIP_TAG = 278
+
+# عدادات فتح الملفات وفك الترميز والترميز: لكل صفحة Counter خاص يُربط بالخيط الذي يعالجها
+# (عدة مهام تعالج صفحات في خيوط متزامنة) ويعود مع PageResult.io_counts
+# الإجمالي لا يُحدث إلا من نتائج الصفحات (merge_page_result) فيبقى صحيحاً مهما كان عدد العمليات
+PAGE_IO_TOTALS = Counter()
+_page_io = threading.local()
+_page_io_lock = threading.Lock()
+
+def count_page_io(name):
+    """زيادة عداد الصفحة التي يعالجها هذا الخيط (لا شيء خارج optimize_image_pages)"""
+    counts = getattr(_page_io, 'counts', None)
+    if counts is not None:
+        counts[name] += 1
+
 def sort_images_naturally(image_paths):
     """ترتيب قائمة المسارات بشكل طبيعي حسب أسماء الملفات"""
     return natsort.natsorted(image_paths)
 
-def optimize_image_size(image_path, max_width=1200, quality=65):
+def open_image(image_path):
+    """فتح ملف صورة مع تسجيله في عدادات الصفحة"""
+    count_page_io('open')
+    return Image.open(image_path)
+
+def decode_image(img):
+    """فك ترميز بكسلات الصورة (يرفع استثناء إذا كانت الصورة غير صالحة)"""
+    count_page_io('decode')
+    with span('decode'):
+        img.load()
+    return img
+
+def encode_jpeg(img, output_path, **options):
+    """ترميز الصورة بصيغة JPEG مرة واحدة (output_path مسار أو BytesIO)"""
+    count_page_io('encode')
+    img.save(output_path, 'JPEG', **options)
+
+def finish_page_buffer(buffer, output_path):
     """
-    ضغط صورة مع الحفاظ على الجودة خاصة للصور الطويلة
+    إرجاع بيانات الصفحة المرمّزة (bytes) لتُمرر إلى كاتب PDF مباشرة،
+    أو كتابتها في output_path إذا تجاوزت PAGE_SPILL_BYTES وإرجاع المسار
     """
-    try:
-        with Image.open(image_path) as img:
-            # التحقق من أن الصورة صالحة
-            img.verify()
+    if buffer.tell() <= PAGE_SPILL_BYTES:
+        return buffer.getvalue()
+    count_page_io('spill')
+    with open(output_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    return output_path
+
+def is_page_file(page):
+    """الصفحات الناتجة إما مسارات ملفات (str) أو بيانات في الذاكرة (bytes)"""
+    return isinstance(page, str)
+
+def classify_page(img):
+    """
+    تصنيف الصفحة إلى 'gray' أو 'color' من نسخة مصغرة:
+    أقصى فرق بين القنوات لكل بكسل يُحسب بعمليات ImageChops على الصورة كاملة
+    ثم يكفي المدرج التكراري لمعرفة نسبة البكسلات الملونة
+    """
+    if img.mode in ('1', 'L', 'LA', 'I', 'I;16', 'F'):
+        return 'gray'
+    factor = int(math.sqrt(img.width * img.height / CLASSIFY_SAMPLE_PIXELS))
+    sample = img.reduce(factor) if factor > 1 else img
+    red, green, blue = sample.convert('RGB').split()
+    chroma = ImageChops.lighter(
+        ImageChops.lighter(ImageChops.difference(red, green), ImageChops.difference(green, blue)),
+        ImageChops.difference(red, blue)
+    )
+    colored = sum(chroma.histogram()[GRAY_CHROMA_TOLERANCE + 1:])
+    return 'gray' if colored <= sample.width * sample.height * GRAY_MAX_COLOR_RATIO else 'color'
+
+def is_bilevel(img):
+    """هل الصفحة الرمادية (L) بحجمها النهائي أبيض وأسود فقط تقريباً (نص وخطوط دون تدرجات)؟"""
+    histogram = img.histogram()
+    extremes = sum(histogram[:BILEVEL_EXTREME_TOLERANCE + 1]) + sum(histogram[255 - BILEVEL_EXTREME_TOLERANCE:])
+    return extremes >= img.width * img.height * BILEVEL_MIN_RATIO
+
+def convert_page_mode(img, gray):
+    """L للصفحات الرمادية، و RGB للصور ذات الشفافية أو اللوحة (باقي الأنماط كما هي)"""
+    if gray:
+        return img if img.mode == 'L' else img.convert('L')
+    if img.mode in ('RGBA', 'P', 'LA'):
+        return img.convert('RGB')
+    return img
+
+def encode_page(img, base_path, bilevel=False, **save_options):
+    """
+    ترميز صفحة واحدة في الذاكرة وإرجاع بياناتها (أو مسار ملف إذا تجاوزت PAGE_SPILL_BYTES):
+    صفحة رمادية شبه ثنائية → TIFF بضغط CCITT G4 (شريط واحد يُنسخ كما هو إلى PDF)
+    وغير ذلك → JPEG بقناة واحدة أو بثلاث قنوات حسب نمط الصورة
+    """
+    buffer = io.BytesIO()
+    with span('encode'):
+        if bilevel and img.mode == 'L' and is_bilevel(img):
+            count_page_io('bilevel')
+            count_page_io('encode')
+            img.point(lambda value: 255 if value >= 128 else 0).convert('1', dither=Image.Dither.NONE).save(
+                buffer, 'TIFF', compression='group4', tiffinfo={ROWS_PER_STRIP_TAG: img.height}
+            )
+            return finish_page_buffer(buffer, f"{base_path}.tif")
+        encode_jpeg(img, buffer, **save_options)
+        return finish_page_buffer(buffer, f"{base_path}.jpg")
+
+def apply_draft(img, target_width, target_height):
+    """
+    طلب فك ترميز JPEG بمقياس مصغر (1/2، 1/4، 1/8) قبل التحجيم النهائي
+    يرجع True إذا تم تفعيل التصغير
+    """
+    if img.format != 'JPEG':
+        return False
+    original_size = img.size
+    requested = (int(target_width * DRAFT_OVERSAMPLE), int(target_height * DRAFT_OVERSAMPLE))
+    img.draft('RGB' if img.mode == 'RGB' else None, requested)
+    return img.size != original_size
+
+def psnr(first, second):
+    """نسبة الإشارة إلى الضوضاء بين صورتين بنفس الحجم (بالديسيبل)"""
+    diff = ImageChops.difference(first.convert('RGB'), second.convert('RGB'))
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(diff).rms) / 3
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
+
+def draft_psnr(image_path, max_width):
+    """مقارنة نتيجة المسار السريع بنتيجة فك الترميز الكامل لنفس الصورة"""
+    with Image.open(image_path) as img:
+        target = (max_width, int(img.height * max_width / img.width))
+        full = img.convert('RGB').resize(target, Image.Resampling.LANCZOS)
+    with Image.open(image_path) as img:
+        apply_draft(img, *target)
+        fast = img.convert('RGB').resize(target, Image.Resampling.LANCZOS)
+    return psnr(full, fast)
+
+def draft_quality_ok(image_paths, max_width):
+    """
+    تقرير استخدام المسار السريع لفصل كامل: نقيس PSNR على أول صورة JPEG
+    كبيرة ونسمح بالمسار السريع فقط إذا تجاوزت DRAFT_MIN_PSNR
+    """
+    for image_path in image_paths[:DRAFT_CALIBRATION_SCAN]:
+        try:
+            with Image.open(image_path) as img:
+                if img.format != 'JPEG' or img.width < max_width * DRAFT_OVERSAMPLE * 2:
+                    continue
+            quality_db = draft_psnr(image_path, max_width)
+        except Exception as e:
+            logging.warning(f"⚠️ تعذرت معايرة المسار السريع على {os.path.basename(image_path)}: {e}")
+            continue
+        allowed = quality_db >= DRAFT_MIN_PSNR
+        logging.info(f"⚡ معايرة draft: PSNR={quality_db:.1f}dB → {'مفعل' if allowed else 'معطل'}")
+        return allowed
+    return False
+
+def can_passthrough(img, image_path, max_width=None, max_height=None,
+                    max_bits_per_pixel=PASSTHROUGH_MAX_BITS_PER_PIXEL):
+    """
+    فحص الرأس ونهاية الملف فقط: هل هي JPEG أساسي (غير progressive) مكتمل بألوان RGB أو رمادية
+    وضمن الأبعاد المطلوبة وبحجم ملف معقول؟ عندها لا فائدة من إعادة ترميزها
+    """
+    if img.format != 'JPEG' or img.mode not in ('RGB', 'L'):
+        return False
+    if img.info.get('progressive') or img.info.get('progression'):
+        return False
+    width, height = img.size
+    if (max_width and width > max_width) or (max_height and height > max_height):
+        return False
+    if max_bits_per_pixel is not None:
+        bits_per_pixel = os.path.getsize(image_path) * 8 / (width * height)
+        if bits_per_pixel > max_bits_per_pixel:
+            return False
+    # الملف الناقص يُضمَّن كما هو ببيانات تالفة، أما إعادة ترميزه فتنتج صفحة صالحة
+    return has_jpeg_end(image_path)
+
+def has_jpeg_end(image_path):
+    """
+    هل ينتهي الملف بعلامة EOI (FF D9)؟ داخل بيانات المسح يتبع كل FF بايت 00 أو علامة RST
+    فوجود FF D9 في آخر الملف يعني أن الصورة مكتملة
+    """
+    with open(image_path, 'rb') as f:
+        f.seek(max(0, os.path.getsize(image_path) - JPEG_END_SCAN_BYTES))
+        return b'\xff\xd9' in f.read()
+
+class PassthroughReport:
+    """تقرير التمرير المباشر لكل تشغيل: عدد الصفحات المُمررة وزمن المعالج الموفّر"""
+
+    def __init__(self):
+        self.passed = 0
+        self.encoded = 0
+        self.encode_cpu_seconds = 0.0
+
+    def add(self, passthrough, cpu_seconds):
+        if passthrough:
+            self.passed += 1
+        else:
+            self.encoded += 1
+            self.encode_cpu_seconds += cpu_seconds
+
+    def estimated_cpu_saved(self):
+        """تقدير الزمن الموفّر بمتوسط زمن الصفحات التي أعيد ترميزها"""
+        if not self.encoded:
+            return 0.0
+        return self.passed * self.encode_cpu_seconds / self.encoded
+
+    def log(self):
+        total = self.passed + self.encoded
+        message = f"⏩ التمرير المباشر: {self.passed}/{total} صفحة دون إعادة ترميز"
+        if self.passed and self.encoded:
+            message += f"، توفير ~{self.estimated_cpu_saved():.2f} ثانية معالج"
+        logging.info(message)
+
+def find_cut_row(img, top, ideal_bottom, search_height, tolerance=STRIP_CUT_TOLERANCE):
+    """
+    البحث عن صف متجانس (فراغ بين اللوحات) فوق نقطة القطع المثالية
+    حتى لا تُقسم لوحة في منتصفها؛ يرجع نقطة القطع المثالية إذا لم نجد فراغاً
+    """
+    search_top = max(top + 1, ideal_bottom - search_height)
+    if search_top >= ideal_bottom:
+        return ideal_bottom
+    
+    # نسخة مصغرة العرض بالتدرج الرمادي تكفي لقياس تجانس كل صف
+    region = img.crop((0, search_top, img.width, ideal_bottom)).convert('L')
+    region = region.resize((min(64, region.width), region.height), Image.Resampling.BOX)
+    row_width = region.width
+    data = region.tobytes()
+    for offset in range(region.height - 1, -1, -1):
+        row = data[offset * row_width:(offset + 1) * row_width]
+        if max(row) - min(row) <= tolerance:
+            return search_top + offset + 1
+    return ideal_bottom
+
+def encode_strip_bands(img, new_width, new_height, base_name, max_page_height, smart_cut=True,
+                       gray=False, bilevel=False, **save_options):
+    """
+    ترميز صورة طويلة جداً على شكل شرائح أفقية، كل شريحة صفحة مستقلة
+    لا نحجّم الصورة كاملة دفعة واحدة: كل شريحة تُقص وتُحجّم وتُرمّز ثم تُحرر
+    gray: الصورة مصنفة رمادية، فتُحوّل كل شريحة إلى L قبل التحجيم
+    """
+    scale = new_height / img.height
+    band_source_height = max(1, int(max_page_height / scale))
+    search_height = int(band_source_height * STRIP_CUT_SEARCH) if smart_cut else 0
+    
+    band_pages = []
+    top = 0
+    while top < img.height:
+        bottom = min(img.height, top + band_source_height)
+        if bottom < img.height and search_height:
+            bottom = find_cut_row(img, top, bottom, search_height)
         
-        # إعادة فتح الصورة بعد التحقق
-        with Image.open(image_path) as img:
+        band = img.crop((0, top, img.width, bottom))
+        if gray and band.mode != 'L':
+            band = band.convert('L')
+        elif band.mode in ('RGBA', 'P', 'LA'):
+            band = band.convert('RGB')
+        band_size = (new_width, max(1, round((bottom - top) * scale)))
+        if band.size != band_size:
+            with span('resize'):
+                band = band.resize(band_size, Image.Resampling.LANCZOS)
+        
+        band_pages.append(encode_page(band, f"{base_name}_compressed_{len(band_pages) + 1:03d}",
+                                      bilevel, **save_options))
+        top = bottom
+    
+    logging.info(f"✂️ تقسيم الصورة الطويلة إلى {len(band_pages)} صفحة (أقصى ارتفاع {max_page_height})")
+    return band_pages
+
+def optimize_image_pages(image_path, profile=PROFILES['small'], use_draft=False,
+                         max_page_height=None, smart_cut=True, passthrough=False, io_counts=None):
+    """
+    ضغط صورة حسب إعدادات الوضع (PdfProfile) مع الحفاظ على جودة الصور الطويلة
+    كل صورة تُفتح وتُفك مرة واحدة؛ نجاح فك الترميز والحفظ هو التحقق من صلاحية الصورة
+    use_draft: فك ترميز صور JPEG العريضة بمقياس مصغر قبل التحجيم
+    max_page_height: تقسيم الصور الأطول من هذا الارتفاع (بعد التحجيم) إلى عدة صفحات
+    smart_cut: اختيار نقاط القطع في الفراغات بين اللوحات
+    passthrough: إرجاع الصورة الأصلية دون إعادة ترميز إذا كانت تحقق الشروط
+    الصفحات الرمادية فعلياً تُرمّز بقناة واحدة (L)، والشبه ثنائية بـ G4 إذا سمح الوضع
+    يرجع قائمة الصفحات الناتجة: بيانات مرمّزة في الذاكرة (bytes) أو مسارات ملفات
+    (الصورة الأصلية عند التمرير المباشر أو الخطأ، أو ملف مؤقت للصفحات الأكبر من PAGE_SPILL_BYTES)
+    io_counts: Counter يُملأ بعدادات هذه الصفحة (فتح، فك ترميز، ترميز، تمرير مباشر...)
+    """
+    profile = get_profile(profile)
+    counts = io_counts if io_counts is not None else Counter()
+    previous_counts = getattr(_page_io, 'counts', None)
+    _page_io.counts = counts
+    try:
+        with open_image(image_path) as img:
             original_width, original_height = img.size
             logging.info(f"📐 أبعاد الصورة الأصلية: {original_width}x{original_height}")
             
-            # تحويل إلى RGB إذا كانت الصورة من نوع RGBA أو P
-            if img.mode in ('RGBA', 'P', 'LA'):
-                img = img.convert('RGB')
+            tall = original_height > profile.tall_height
+            max_width = profile.tall_max_width if tall else profile.max_width
+            max_height = max_page_height if tall else None
+            if passthrough and can_passthrough(img, image_path, max_width, max_height, profile.passthrough_bits):
+                logging.info(f"⏩ تمرير مباشر دون إعادة ترميز: {os.path.basename(image_path)}")
+                counts['passthrough'] += 1
+                return [image_path]
             
-            # للصور الطويلة: نحافظ على الطول ونضبط العرض فقط
-            if original_height > 3000:  # إذا كانت الصورة طويلة
-                # حساب العرض الجديد مع الحفاظ على النسبة
-                if original_width > max_width:
-                    new_width = max_width
-                    new_height = int((original_height * max_width) / original_width)
-                else:
-                    new_width = original_width
-                    new_height = original_height
-                
-                logging.info(f"📏 الصورة الطويلة - الأبعاد الجديدة: {new_width}x{new_height}")
-                
-                # إعادة التحجيم باستخدام خوارزمية عالية الجودة
-                resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            else:
-                # للصور العادية: استخدام thumbnail
-                img.thumbnail((max_width, 3000), Image.Resampling.LANCZOS)
-                resized_img = img
-                logging.info(f"📏 الصورة العادية - الأبعاد الجديدة: {resized_img.size}")
+            if not tall and max_width:
+                # نفس التصغير المسبق الذي يطبقه thumbnail على JPEG قبل فك الترميز
+                img.draft(None, (max_width * 2, profile.tall_height * 2))
+            elif tall and use_draft and max_width and original_width > max_width:
+                target_height = int((original_height * max_width) / original_width)
+                if apply_draft(img, max_width, target_height):
+                    logging.info(f"⚡ فك ترميز مصغر: {img.size}")
+            decode_image(img)
+            
+            # صفحة أبيض وأسود: قناة واحدة تعني ثلث بيانات التحجيم والترميز
+            gray = classify_page(img) == 'gray'
+            if gray:
+                counts['gray'] += 1
             
             # حفظ الصورة المضغوطة
             base_name = os.path.splitext(image_path)[0]
-            compressed_path = f"{base_name}_compressed.jpg"
-            if os.path.exists(compressed_path):
-                os.remove(compressed_path)
+            compressed_base = f"{base_name}_compressed"
             
-            # حفظ بإعدادات جودة أعلى للصور الطويلة
-            save_quality = quality
-            if original_height > 5000:
-                save_quality = 60  # جودة أعلى للصور الطويلة جداً
-            
-            resized_img.save(
-                compressed_path, 
-                'JPEG', 
+            # جودة مختلفة للصور الطويلة جداً حسب الوضع
+            save_quality = profile.quality
+            if original_height > profile.tall_quality_height:
+                save_quality = profile.tall_quality
+            save_options = dict(
                 quality=save_quality, 
                 optimize=True, 
                 progressive=False  # إيقاف progressive للصور الطويلة
             )
             
-            # التحقق من أن الملف المضغوط موجود وصالح
-            if os.path.exists(compressed_path):
-                with Image.open(compressed_path) as test_img:
-                    test_img.verify()
-                    compressed_size = test_img.size
-                    logging.info(f"✅ الأبعاد بعد الضغط: {compressed_size}")
+            # للصور الطويلة: نحافظ على الطول ونضبط العرض فقط
+            if tall:
+                # حساب العرض الجديد مع الحفاظ على النسبة
+                if max_width and original_width > max_width:
+                    new_width = max_width
+                    new_height = int((original_height * max_width) / original_width)
+                else:
+                    new_width = original_width
+                    new_height = original_height
                 
-                original_size = os.path.getsize(image_path) if os.path.exists(image_path) else 0
-                compressed_size_bytes = os.path.getsize(compressed_path)
+                logging.info(f"📏 الصورة الطويلة - الأبعاد الجديدة: {new_width}x{new_height}")
                 
-                if original_size > 0:
-                    compression_ratio = (1 - compressed_size_bytes/original_size) * 100
-                    logging.info(f"📊 ضغط الصورة: {original_size/1024:.1f}KB → {compressed_size_bytes/1024:.1f}KB ({compression_ratio:.1f}%)")
+                if max_page_height and new_height > max_page_height:
+                    output_pages = encode_strip_bands(
+                        img, new_width, new_height, base_name, max_page_height, smart_cut,
+                        gray, profile.bilevel, **save_options
+                    )
                 else:
-                    logging.info(f"📊 حجم الصورة المضغوطة: {compressed_size_bytes/1024:.1f}KB")
-                
-                return compressed_path
+                    img = convert_page_mode(img, gray)
+                    # إعادة التحجيم باستخدام خوارزمية عالية الجودة
+                    resized_img = img
+                    if img.size != (new_width, new_height):
+                        with span('resize'):
+                            resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    output_pages = [encode_page(resized_img, compressed_base, profile.bilevel, **save_options)]
+                    logging.info(f"✅ الأبعاد بعد الضغط: {resized_img.size}")
+            else:
+                img = convert_page_mode(img, gray)
+                # للصور العادية: استخدام thumbnail (أو الحجم الأصلي إذا لم يحدد الوضع عرضاً)
+                if max_width:
+                    with span('resize'):
+                        img.thumbnail((max_width, profile.tall_height), Image.Resampling.LANCZOS)
+                logging.info(f"📏 الصورة العادية - الأبعاد الجديدة: {img.size}")
+                output_pages = [encode_page(img, compressed_base, profile.bilevel, **save_options)]
+        
+        original_size = os.path.getsize(image_path)
+        compressed_size_bytes = sum(page_source_size(page) for page in output_pages)
+        
+        if original_size > 0:
+            compression_ratio = (1 - compressed_size_bytes/original_size) * 100
+            logging.info(f"📊 ضغط الصورة: {original_size/1024:.1f}KB → {compressed_size_bytes/1024:.1f}KB ({compression_ratio:.1f}%)")
+        else:
+            logging.info(f"📊 حجم الصورة المضغوطة: {compressed_size_bytes/1024:.1f}KB")
+        
+        return output_pages
             
     except Exception as e:
         logging.error(f"❌ خطأ في ضغط الصورة {os.path.basename(image_path)}: {e}")
         logging.error(traceback.format_exc())
         # في حالة الخطأ، نعود للصورة الأصلية
-        return image_path
+        return [image_path]
+    
+    finally:
+        _page_io.counts = previous_counts
+        logging.info(
+            f"🔢 {os.path.basename(image_path)}: فتح={counts['open']} "
+            f"فك ترميز={counts['decode']} ترميز={counts['encode']} "
+            f"رمادية={counts['gray']} ثنائية={counts['bilevel']}"
+        )
+
+def optimize_image_size(image_path, max_width=COMPRESSED_MAX_WIDTH, quality=COMPRESSED_QUALITY, use_draft=False):
+    """
+    ضغط صورة إلى ملف JPEG واحد (دون تقسيم الصور الطويلة) وإرجاع مساره
+    """
+    profile = PROFILES['small']._replace(max_width=max_width, tall_max_width=max_width, quality=quality,
+                                         bilevel=False)
+    page = optimize_image_pages(image_path, profile, use_draft)[0]
+    if is_page_file(page):
+        return page
+    output_path = f"{os.path.splitext(image_path)[0]}_compressed.jpg"
+    with open(output_path, 'wb') as f:
+        f.write(page)
+    return output_path
 
 def safe_image_conversion(image_path):
     """
@@ -104,8 +509,10 @@ def safe_image_conversion(image_path):
         with Image.open(image_path) as img:
             original_width, original_height = img.size
             
-            # تحويل جميع الصور إلى RGB
-            if img.mode != 'RGB':
+            # الصور الرمادية فعلياً إلى L وباقي الصور إلى RGB
+            if classify_page(img) == 'gray':
+                img = img.convert('L')
+            elif img.mode != 'RGB':
                 img = img.convert('RGB')
             
             # جودة أعلى للصور الطويلة
@@ -123,10 +530,84 @@ def safe_image_conversion(image_path):
         logging.error(f"❌ خطأ في تحويل الصورة {os.path.basename(image_path)}: {e}")
         return image_path
 
-def create_compressed_pdf(image_paths, output_path):
+def process_page(image_path, **options):
+    """معالجة صورة واحدة وإرجاع PageResult (تعمل داخل العمليات الفرعية)"""
+    started = time.process_time()
+    # القياسات داخل العملية الفرعية تعود مع النتيجة وتُدمج في العملية الرئيسية
+    io_counts = Counter()
+    with Capture() as timings:
+        pages = optimize_image_pages(image_path, io_counts=io_counts, **options)
+    return PageResult(pages, bool(io_counts['passthrough']), time.process_time() - started, timings,
+                      dict(io_counts))
+
+def merge_page_result(result):
+    """دمج قياسات وعدادات صفحة عادت من process_page (ربما من عملية فرعية) في العملية الحالية"""
+    merge(result.timings)
+    with _page_io_lock:
+        PAGE_IO_TOTALS.update(result.io_counts)
+
+def iter_processed_pages(image_paths, workers=None, **options):
+    """
+    ضغط الصور على مجموعة عمليات متوازية وإرجاع النتائج بالترتيب فور جاهزية كل صفحة
+    (الصفحات التالية تستمر في المعالجة أثناء استخدام الصفحة الحالية)
+    فشل صورة واحدة لا يؤثر إلا عليها: نعيد معالجتها في العملية الحالية
+    وإذا فشلت مجدداً نستخدم الصورة الأصلية
+    options: إعدادات إضافية تمرر إلى optimize_image_pages
+    الصفحات تعود كبيانات في الذاكرة، لذا لا يُرسل للمعالجة إلا عدد محدود مسبقاً
+    (PAGE_PREFETCH_PER_WORKER لكل عملية) بدل الفصل كاملاً
+    """
+    workers = min(workers or PDF_WORKERS, len(image_paths))
+    if workers <= 1:
+        for path in image_paths:
+            result = process_page(path, **options)
+            merge_page_result(result)
+            yield result
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        remaining = iter(image_paths)
+        pending = deque()
+        
+        def submit_next():
+            for path in remaining:
+                pending.append((path, executor.submit(process_page, path, **options)))
+                return
+        
+        for _ in range(workers * PAGE_PREFETCH_PER_WORKER):
+            submit_next()
+        while pending:
+            image_path, future = pending.popleft()
+            submit_next()
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.warning(f"⚠️ فشلت معالجة {os.path.basename(image_path)} في عملية فرعية: {e}")
+                result = process_page(image_path, **options)
+            merge_page_result(result)
+            yield result
+
+def process_images_parallel(image_paths, workers=None, **options):
+    """
+    ضغط الصور على مجموعة عمليات متوازية مع الحفاظ على الترتيب
+    يرجع لكل صورة PageResult
+    """
+    return list(iter_processed_pages(image_paths, workers, **options))
+
+def create_pdf(image_paths, output_path, profile='balanced', workers=None, max_page_height=MAX_PAGE_HEIGHT,
+               smart_cut=True, passthrough=True, cache=None, volume_bytes=None, on_volume=None):
     """
-    إنشاء ملف PDF مضغوط مع الحفاظ على جودة الصور الطويلة
+    إنشاء ملف PDF بإعدادات وضع الجودة (اسم من PROFILES أو PdfProfile)
+    جميع الأوضاع تمر بنفس المسار: معالجة متوازية، ذاكرة مؤقتة، كتابة متدفقة
+    workers: عدد عمليات معالجة الصور (افتراضياً PDF_WORKERS)
+    max_page_height: تقسيم الصور الطويلة جداً إلى صفحات بهذا الارتفاع الأقصى
+    smart_cut: القطع في الفراغات بين اللوحات
+    passthrough: تضمين صور JPEG المضغوطة بما يكفي للوضع دون إعادة ترميز
+    cache: ذاكرة مؤقتة اختيارية (PageCache) للصفحات المعالجة
+    volume_bytes: تقسيم الناتج إلى عدة ملفات لا يتجاوز كل منها هذا الحجم
+    on_volume: تُستدعى فور اكتمال كل ملف (path, number, pages, is_last)
+    يرجع قائمة مسارات ملفات PDF الناتجة
     """
+    profile = get_profile(profile)
     processed_paths = []
     temp_files = []
     
@@ -139,93 +620,106 @@ def create_compressed_pdf(image_paths, output_path):
         for i, path in enumerate(image_paths):
             logging.info(f"📷 الصورة {i+1}: {os.path.basename(path)}")
         
-        # معالجة كل الصور بالترتيب
-        for i, image_path in enumerate(image_paths):
-            if not os.path.exists(image_path):
+        # استبعاد الملفات غير الموجودة
+        existing_paths = []
+        for image_path in image_paths:
+            if os.path.exists(image_path):
+                existing_paths.append(image_path)
+            else:
                 logging.warning(f"⚠️ الملف غير موجود: {image_path}")
-                continue
-                
-            logging.info(f"🔧 معالجة الصورة {i+1}/{len(image_paths)}: {os.path.basename(image_path)}")
-            
-            try:
-                # أولاً: ضغط الصورة مع الحفاظ على الجودة
-                compressed_path = optimize_image_size(image_path)
-                if compressed_path != image_path:
-                    temp_files.append(compressed_path)
-                    final_path = compressed_path
-                else:
-                    final_path = image_path
-                
-                # التحقق النهائي من وجود الملف
-                if os.path.exists(final_path):
-                    # اختبار فتح الصورة
-                    with Image.open(final_path) as test_img:
-                        test_img.verify()
-                    processed_paths.append(final_path)
-                    logging.info(f"✅ تمت معالجة الصورة {i+1} بنجاح")
-                else:
-                    logging.error(f"❌ الملف النهائي غير موجود: {final_path}")
-                    
-            except Exception as e:
-                logging.error(f"❌ فشل معالجة الصورة {image_path}: {e}")
-                # حاول استخدام الصورة الأصلية كحل أخير
-                if os.path.exists(image_path):
-                    processed_paths.append(image_path)
-                    logging.info(f"🔄 استخدام الصورة الأصلية للصورة {i+1}")
         
-        if not processed_paths:
-            raise Exception("لم تتم معالجة أي صور بنجاح")
+        options = dict(max_page_height=max_page_height, smart_cut=smart_cut, passthrough=passthrough)
         
-        # التأكد من أن الصور مرتبة قبل إنشاء PDF
-        processed_paths = sort_images_naturally(processed_paths)
+        # الصفحات الموجودة في الذاكرة المؤقتة لا تحتاج إلى معالجة
+        cache_keys = {}
+        cached_results = {}
+        pending_paths = []
+        for image_path in existing_paths:
+            if cache:
+                cache_keys[image_path] = cache.processed_key(
+                    image_path, mode=profile.name, profile=profile._asdict(), **options
+                )
+                cached_paths = cache.fetch_processed(cache_keys[image_path], os.path.splitext(image_path)[0])
+                if cached_paths:
+                    cached_results[image_path] = PageResult(cached_paths, False, 0.0, (), {})
+                    continue
+            pending_paths.append(image_path)
+        if cached_results:
+            logging.info(f"💾 {len(cached_results)} صفحة من الذاكرة المؤقتة")
         
-        logging.info(f"📄 جاري إنشاء PDF من {len(processed_paths)} صورة...")
-        logging.info("📋 ترتيب الصور في PDF:")
-        for i, path in enumerate(processed_paths):
-            logging.info(f"  {i+1}. {os.path.basename(path)}")
+        # ضغط الصور بالتوازي وكتابة كل صفحة في PDF فور جاهزيتها بالترتيب
+        logging.info(f"🔧 معالجة {len(pending_paths)} صورة بوضع {profile.name}...")
+        draft_width = profile.tall_max_width or profile.max_width
+        use_draft = bool(draft_width) and draft_quality_ok(pending_paths, draft_width)
+        computed_results = iter_processed_pages(pending_paths, workers, profile=profile,
+                                                use_draft=use_draft, **options)
         
-        # إعدادات PDF محسنة للصور الطويلة
-        try:
-            # استخدام حجم الصفحة الذي يتناسب مع الصور الطويلة
-            with open(output_path, "wb") as f:
-                pdf_data = img2pdf.convert(
-                    processed_paths,
-                    # إعدادات متقدمة للجودة
-                    rotation=img2pdf.Rotation.ifvalid
-                )
-                f.write(pdf_data)
+        report = PassthroughReport()
+        logging.info(f"📄 جاري إنشاء PDF من {len(existing_paths)} صورة...")
+        with open_pdf_writer(output_path, volume_bytes, on_volume) as writer, closing(computed_results):
+            for i, image_path in enumerate(existing_paths):
+                result = cached_results.get(image_path)
+                if result is None:
+                    result = next(computed_results)
+                    report.add(result.passthrough, result.cpu_seconds)
+                    if cache and not result.passthrough and result.pages != [image_path]:
+                        cache.store_processed(cache_keys[image_path], result.pages)
                 
-        except Exception as pdf_error:
-            logging.error(f"❌ خطأ في إنشاء PDF: {pdf_error}")
-            # الطريقة البسيطة
-            logging.info("🔄 جرب إنشاء PDF بالإعدادات الافتراضية...")
-            with open(output_path, "wb") as f:
-                pdf_data = img2pdf.convert(processed_paths)
-                f.write(pdf_data)
-        
-        # التحقق من أن PDF تم إنشاؤه
-        if not os.path.exists(output_path):
-            raise Exception("فشل إنشاء ملف PDF")
-        
-        file_size = os.path.getsize(output_path) / (1024 * 1024)  # بالميجابايت
-        logging.info(f"✅ تم إنشاء PDF بنجاح! الحجم: {file_size:.2f} MB")
+                for page in result.pages:
+                    # الصفحات في الذاكرة لا تحتاج إلى تنظيف؛ الملفات المؤقتة فقط
+                    temp_file = is_page_file(page) and page != image_path
+                    if temp_file:
+                        temp_files.append(page)
+                    
+                    # التحقق النهائي من وجود الملف (الصلاحية مضمونة من فك الترميز والحفظ)
+                    if is_page_file(page) and not os.path.exists(page):
+                        logging.error(f"❌ الملف النهائي غير موجود: {page}")
+                        continue
+                    try:
+                        writer.add_image(page)
+                        processed_paths.append(page if is_page_file(page) else image_path)
+                    except Exception as e:
+                        logging.error(f"❌ فشل إضافة {page_source_name(page)} إلى PDF: {e}")
+                    
+                    # الملف المؤقت لم يعد مطلوباً بعد كتابته
+                    if temp_file:
+                        remove_temp_file(page)
+                logging.info(f"✅ تمت معالجة الصورة {i+1} بنجاح")
+            
+            if not processed_paths:
+                raise Exception("لم تتم معالجة أي صور بنجاح")
+        report.log()
+        
+        file_size = sum(os.path.getsize(path) for path in writer.output_paths) / (1024 * 1024)  # بالميجابايت
+        logging.info(f"✅ تم إنشاء PDF بنجاح! الحجم: {file_size:.2f} MB ({len(writer.output_paths)} ملف)")
         logging.info(f"📍 تم حفظ الصور بالترتيب التالي في PDF:")
         
         # عرض الترتيب النهائي للصور في PDF
         for i, path in enumerate(processed_paths):
             logging.info(f"  {i+1}. {os.path.basename(path)}")
         
+        return writer.output_paths
+        
     except Exception as e:
         logging.error(f"❌ خطأ في إنشاء PDF: {e}")
         logging.error(traceback.format_exc())
         raise
     
     finally:
-        # تنظيف الملفات المؤقتة
+        # تنظيف الملفات المؤقتة المتبقية (بعد خطأ)
         for temp_file in temp_files:
-            try:
-                if os.path.exists(temp_file) and temp_file != output_path:
-                    os.remove(temp_file)
-                    logging.info(f"🧹 تم حذف الملف المؤقت: {os.path.basename(temp_file)}")
-            except Exception as e:
-                logging.warning(f"⚠️ لا يمكن حذف الملف المؤقت {temp_file}: {e}")
\ No newline at end of file
+            if temp_file != output_path:
+                remove_temp_file(temp_file)
+
+def create_compressed_pdf(image_paths, output_path, profile='small', **options):
+    """إنشاء PDF مضغوط (وضع small افتراضياً)؛ باقي الإعدادات كما في create_pdf"""
+    return create_pdf(image_paths, output_path, profile, **options)
+
+def remove_temp_file(path):
+    """حذف ملف مؤقت إن وُجد"""
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+            logging.info(f"🧹 تم حذف الملف المؤقت: {os.path.basename(path)}")
+    except Exception as e:
+        logging.warning(f"⚠️ لا يمكن حذف الملف المؤقت {path}: {e}")
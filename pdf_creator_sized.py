@@ -0,0 +1,260 @@
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageFile
+from pdf_creator import (MAX_PAGE_HEIGHT, PDF_WORKERS, PROFILES, sort_images_naturally, process_page,
+                         merge_page_result, is_page_file, remove_temp_file)
+from pdf_writer import StreamingPdfWriter, page_source_name, page_source_size
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+# حد حجم الملفات التي يستطيع البوت رفعها على Telegram
+TELEGRAM_UPLOAD_LIMIT_MB = int(os.environ.get('TELEGRAM_UPLOAD_LIMIT_MB', 50))
+
+# مستويات (أقصى عرض، جودة JPEG) من الأعلى جودة إلى الأصغر حجماً
+SIZE_LADDER = [
+    (1400, 85),
+    (1200, 80),
+    (1200, 72),
+    (1200, 65),
+    (1000, 65),
+    (1000, 55),
+    (900, 50),
+    (800, 45),
+    (720, 40),
+    (640, 35),
+    (560, 30),
+]
+# عدد الصفحات التي تُرمّز بكل المستويات لتقدير الحجم
+SIZE_SAMPLE_PAGES = 5
+# نسبة الميزانية المخصصة للصفحات (الباقي هامش لأخطاء التقدير)
+SIZE_BUDGET_MARGIN = 0.97
+# الحجم الإضافي لهيكل PDF: ثابت للملف ولكل صفحة
+PDF_FIXED_OVERHEAD = 2048
+PDF_PAGE_OVERHEAD = 512
+
+def output_pixels(size, max_width):
+    """عدد البكسلات بعد تصغير العرض إلى max_width مع الحفاظ على النسبة"""
+    width, height = size
+    if width > max_width:
+        height = int(height * max_width / width)
+        width = max_width
+    return width * height
+
+def read_sample_window(img):
+    """
+    نافذة بارتفاع 3 أضعاف العرض من صورة طويلة، بعد تخطي نافذة واحدة من أعلاها (العنوان غالباً)
+    crop يفك الصورة كاملة (شريط 1200x60000 = 216 MB)، لكن JPEG العادي و PNG غير المتشابك
+    يُفكان صفاً بصف: نقصر الفك على الصفوف حتى نهاية النافذة (LOAD_TRUNCATED_IMAGES يقبل التوقف المبكر)
+    """
+    width, height = img.size
+    window = min(height, width * 3)
+    if window == height:
+        return img.copy()
+    top = min((height - window) // 2, window)
+    sequential = not (img.info.get('progressive') or img.info.get('interlace'))
+    if sequential and img.format in ('JPEG', 'PNG') and len(img.tile) == 1:
+        name, extents, offset, args = img.tile[0]
+        img.tile = [(name, (0, 0, width, top + window), offset, args)]
+    return img.crop((0, top, width, top + window))
+
+def sample_bytes_per_pixel(image_paths, sizes, ladder=SIZE_LADDER, samples=SIZE_SAMPLE_PAGES):
+    """
+    ترميز عينة موزعة من الصفحات بكل مستوى في الذاكرة وإرجاع البايتات لكل بكسل لكل مستوى
+    الصور الطويلة تُقص إلى نافذة (read_sample_window) حتى لا يكلف التقدير أكثر من صفحة عادية
+    """
+    count = len(image_paths)
+    if count <= samples:
+        indices = range(count)
+    else:
+        indices = sorted({round(k * (count - 1) / (samples - 1)) for k in range(samples)})
+
+    total_bytes = [0] * len(ladder)
+    total_pixels = [0] * len(ladder)
+    for index in indices:
+        try:
+            with Image.open(image_paths[index]) as img:
+                sample = read_sample_window(img)
+        except Exception as e:
+            logging.warning(f"⚠️ تعذر أخذ عينة من {os.path.basename(image_paths[index])}: {e}")
+            continue
+        if sample.mode not in ('RGB', 'L'):
+            sample = sample.convert('RGB')
+
+        resized = {}
+        for level, (max_width, quality) in enumerate(ladder):
+            if max_width not in resized:
+                if sample.width > max_width:
+                    new_size = (max_width, max(1, int(sample.height * max_width / sample.width)))
+                    resized[max_width] = sample.resize(new_size, Image.Resampling.LANCZOS)
+                else:
+                    resized[max_width] = sample
+            scaled = resized[max_width]
+            buffer = io.BytesIO()
+            scaled.save(buffer, 'JPEG', quality=quality, optimize=True)
+            total_bytes[level] += buffer.tell()
+            total_pixels[level] += scaled.width * scaled.height
+
+    if not any(total_pixels):
+        raise Exception("تعذر تقدير حجم الصفحات")
+    return [size / pixels for size, pixels in zip(total_bytes, total_pixels)]
+
+class SizeModel:
+    """
+    تقدير حجم كل صفحة عند كل مستوى من العينة، مع معامل تصحيح
+    يُحدّث من الأحجام الفعلية للصفحات المكتوبة
+    """
+
+    def __init__(self, sizes, bytes_per_pixel, ladder=SIZE_LADDER):
+        self.sizes = sizes
+        self.bytes_per_pixel = bytes_per_pixel
+        self.ladder = ladder
+        self.correction = 1.0
+        self._predicted = 0.0
+        self._actual = 0
+
+    @property
+    def lowest_level(self):
+        return len(self.ladder) - 1
+
+    def predict(self, index, level):
+        pixels = output_pixels(self.sizes[index], self.ladder[level][0])
+        return pixels * self.bytes_per_pixel[level] * self.correction + PDF_PAGE_OVERHEAD
+
+    def predict_range(self, indices, level):
+        return sum(self.predict(index, level) for index in indices)
+
+    def observe(self, index, level, actual):
+        """تحديث معامل التصحيح بالحجم الفعلي لصفحة"""
+        pixels = output_pixels(self.sizes[index], self.ladder[level][0])
+        self._predicted += pixels * self.bytes_per_pixel[level]
+        self._actual += max(0, actual - PDF_PAGE_OVERHEAD)
+        if self._predicted > 0:
+            self.correction = self._actual / self._predicted
+
+    def choose_level(self, indices, budget):
+        """أعلى مستوى جودة يتسع فيه باقي الصفحات للميزانية المتبقية"""
+        for level in range(len(self.ladder)):
+            if self.predict_range(indices, level) <= budget:
+                return level
+        return self.lowest_level
+
+def encode_at_level(image_path, level, max_page_height=MAX_PAGE_HEIGHT, smart_cut=True):
+    """ترميز صفحة بإعدادات مستوى من SIZE_LADDER (تعمل داخل العمليات الفرعية)"""
+    max_width, quality = SIZE_LADDER[level]
+    profile = PROFILES['balanced']._replace(name=f"fit{level}", max_width=max_width, tall_max_width=max_width,
+                                            quality=quality, tall_quality=quality)
+    return process_page(image_path, profile=profile, max_page_height=max_page_height, smart_cut=smart_cut)
+
+def pages_size(pages):
+    return sum(page_source_size(page) for page in pages if not is_page_file(page) or os.path.exists(page))
+
+def remove_page_files(pages, source_path):
+    """حذف الملفات المؤقتة بين الصفحات الناتجة (الصفحات في الذاكرة لا تحتاج إلى حذف)"""
+    for page in pages:
+        if is_page_file(page) and page != source_path:
+            remove_temp_file(page)
+
+def create_sized_pdf(image_paths, output_path, target_bytes, workers=None,
+                     max_page_height=MAX_PAGE_HEIGHT, smart_cut=True, executor=None):
+    """
+    إنشاء PDF لا يتجاوز حجمه target_bytes في تمريرة واحدة:
+    - تقدير البايتات لكل صفحة عند كل مستوى (عرض، جودة) من عينة صغيرة
+    - قبل كل دفعة صفحات: اختيار أعلى مستوى يتسع فيه الباقي للميزانية المتبقية
+    - الصفحة التي تتجاوز حصتها تُعاد وحدها بمستوى أقل، دون إعادة الفصل كاملاً
+    executor: مجموعة عمليات مشتركة بين المهام (لا تُغلق هنا)؛ بدونها تُنشأ مجموعة لهذا الفصل فقط
+    """
+    image_paths = sort_images_naturally([path for path in image_paths if os.path.exists(path)])
+    paths, sizes = [], []
+    for image_path in image_paths:
+        try:
+            with Image.open(image_path) as img:
+                sizes.append(img.size)
+            paths.append(image_path)
+        except Exception as e:
+            logging.error(f"❌ صورة غير صالحة {os.path.basename(image_path)}: {e}")
+    if not paths:
+        raise Exception("لا توجد صور صالحة للتحويل")
+
+    started = time.perf_counter()
+    model = SizeModel(sizes, sample_bytes_per_pixel(paths, sizes))
+    page_budget = target_bytes * SIZE_BUDGET_MARGIN - PDF_FIXED_OVERHEAD
+    logging.info(f"🎯 الميزانية: {target_bytes / (1024 * 1024):.1f} MB لـ {len(paths)} صورة "
+                 f"(تقدير العينة {time.perf_counter() - started:.2f} ثانية)")
+    if model.predict_range(range(len(paths)), model.lowest_level) > page_budget:
+        logging.warning("⚠️ الفصل أكبر من الميزانية حتى بأقل جودة")
+
+    workers = max(1, min(workers or PDF_WORKERS, len(paths)))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    levels_used = []
+    try:
+        with StreamingPdfWriter(output_path) as writer:
+            index = 0
+            while index < len(paths):
+                remaining_budget = page_budget - writer.bytes_written
+                level = model.choose_level(range(index, len(paths)), remaining_budget)
+                window = range(index, min(len(paths), index + workers))
+                if executor:
+                    futures = [executor.submit(encode_at_level, paths[i], level, max_page_height, smart_cut)
+                               for i in window]
+                    try:
+                        results = [future.result() for future in futures]
+                    except BaseException:
+                        # المجموعة قد تكون مشتركة: لا نترك صفحات هذا الفصل في طابورها
+                        for future in futures:
+                            future.cancel()
+                        raise
+                else:
+                    results = [encode_at_level(paths[i], level, max_page_height, smart_cut) for i in window]
+
+                for i, result in zip(window, results):
+                    merge_page_result(result)
+                    page_level = level
+                    pages = result.pages
+                    actual = pages_size(pages) + PDF_PAGE_OVERHEAD * len(pages)
+                    # يجب أن يبقى مكان لباقي الصفحات بأقل مستوى على الأقل
+                    allowance = (page_budget - writer.bytes_written
+                                 - model.predict_range(range(i + 1, len(paths)), model.lowest_level))
+                    # فشل الترميز يعيد الصورة الأصلية (لا تمرير مباشر في هذا الوضع): نعيد مرة بأقل مستوى
+                    while (pages == [paths[i]] or actual > allowance) and page_level < model.lowest_level:
+                        if pages == [paths[i]]:
+                            page_level = model.lowest_level
+                        else:
+                            page_level = min(model.lowest_level, page_level + 2)
+                        remove_page_files(pages, paths[i])
+                        retry = encode_at_level(paths[i], page_level, max_page_height, smart_cut)
+                        merge_page_result(retry)
+                        pages = retry.pages
+                        actual = pages_size(pages) + PDF_PAGE_OVERHEAD * len(pages)
+                    if pages == [paths[i]]:
+                        # الصورة الأصلية لا تخضع للميزانية: استبعادها أفضل من تجاوز حد الرفع
+                        logging.error(f"❌ تعذر ترميز {os.path.basename(paths[i])}، تم استبعادها من PDF")
+                        continue
+                    model.observe(i, page_level, actual)
+                    levels_used.append(page_level)
+
+                    for page in pages:
+                        try:
+                            writer.add_image(page)
+                        except Exception as e:
+                            logging.error(f"❌ فشل إضافة {page_source_name(page)} إلى PDF: {e}")
+                    remove_page_files(pages, paths[i])
+                index = window.stop
+
+            if not writer.page_count:
+                raise Exception("لم تتم معالجة أي صور بنجاح")
+    finally:
+        if own_executor and executor:
+            executor.shutdown()
+
+    file_size = os.path.getsize(output_path)
+    widths = sorted({SIZE_LADDER[level] for level in levels_used})
+    logging.info(f"✅ تم إنشاء PDF بحجم {file_size / (1024 * 1024):.2f} MB "
+                 f"({file_size / target_bytes:.0%} من الميزانية)، الإعدادات المستخدمة: {widths}")
+    if file_size > target_bytes:
+        logging.warning("⚠️ تجاوز الملف الميزانية المحددة")
+    return file_size
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from image_downloader import MAX_CONCURRENT_DOWNLOADS, FirstImageTimer
+from image_downloader_async import (
+    AsyncDownloadPool, acquire_page_image_urls_async,
+    download_found_image_async, download_sequential_images_async,
+)
+from page_filter import StreamingPageFilter
+from pdf_creator import (
+    PDF_WORKERS, PAGE_PREFETCH_PER_WORKER, MAX_PAGE_HEIGHT, PageResult, PassthroughReport,
+    get_profile, draft_quality_ok, process_page, merge_page_result, is_page_file, remove_temp_file,
+)
+from pdf_writer import open_pdf_writer, page_source_name
+from metrics import span
+
+# الحد الأقصى للصفحات المحملة (أو الجاري تحميلها) التي تنتظر المعالجة في خط المعالجة المتدفق
+# عند امتلاء الطابور يتوقف بدء تحميلات جديدة حتى تلحق المعالجة
+PIPELINE_DOWNLOAD_AHEAD = int(os.environ.get('PIPELINE_DOWNLOAD_AHEAD', MAX_CONCURRENT_DOWNLOADS * 2))
+
+# عنصر في طابور المعالجة: الصورة المحملة ومفتاحها في الذاكرة المؤقتة ونتيجة معالجتها (future)
+# cached: النتيجة من الذاكرة المؤقتة (لا تدخل في تقرير التمرير المباشر ولا تُخزن مجدداً)
+# use_draft: نفس إعداد المعالجة عند إعادتها في خيط بعد فشل العملية الفرعية
+ProcessedItem = namedtuple('ProcessedItem', ['page', 'cache_key', 'result', 'cached', 'use_draft'])
+
+# نهاية الطابور
+END_OF_QUEUE = None
+
+class NoPagesFound(Exception):
+    """لم يتم تحميل أي صفحة صالحة من الرابط"""
+
+async def queue_downloads(base_url, download_dir, pool, downloads, cache=None):
+    """
+    المرحلة الأولى: بدء تحميل الصور بترتيبها ووضع مهمة كل صورة في الطابور
+    الترتيب هو موضع الرابط في الصفحة؛ الطابور يحفظه فلا حاجة لإعادة ترتيب الأسماء
+    إذا لم تنجح أي صورة من الصفحة نجرب التسلسل الرقمي (دفعات كما في download_pages_async)
+    """
+    timer = FirstImageTimer()
+    async with span('discover'):
+        found_urls = await acquire_page_image_urls_async(base_url, pool, cache=cache)
+    tasks = []
+    if found_urls:
+        logging.info(f"🔍 تم العثور على {len(found_urls)} رابط صورة محتمل في الصفحة")
+        for index, found in enumerate(found_urls):
+            task = asyncio.create_task(
+                download_found_image_async(index, found, download_dir, pool, timer, cache)
+            )
+            tasks.append(task)
+            await downloads.put(task)
+
+    if found_urls is not None and not any(await asyncio.gather(*tasks)):
+        logging.info("🔄 جرب البحث عن الصور بالتسلسل الرقمي...")
+        for page in await download_sequential_images_async(base_url, download_dir, pool, timer=timer,
+                                                           cache=cache):
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(page)
+            await downloads.put(done)
+    await downloads.put(END_OF_QUEUE)
+
+async def queue_processing(downloads, processed, executor, profile, options, progress, cache=None):
+    """
+    المرحلة الثانية: انتظار كل صورة بترتيبها، تصفيتها، ثم إرسالها للمعالجة دون انتظار النتيجة
+    الطابور التالي محدود بعدد العمليات × PAGE_PREFETCH_PER_WORKER
+    """
+    loop = asyncio.get_running_loop()
+    page_filter = StreamingPageFilter()
+    use_draft = None
+    draft_width = profile.tall_max_width or profile.max_width
+    while True:
+        task = await downloads.get()
+        if task is END_OF_QUEUE:
+            break
+        page = await task
+        if page is None:
+            continue
+        progress['downloaded'] += 1
+        if not await asyncio.to_thread(page_filter.accept, page):
+            continue
+
+        cache_key = None
+        if cache:
+            cache_key = await asyncio.to_thread(
+                cache.processed_key, page.path, mode=profile.name, profile=profile._asdict(), **options
+            )
+            cached_pages = await asyncio.to_thread(cache.fetch_processed, cache_key,
+                                                   os.path.splitext(page.path)[0])
+            if cached_pages:
+                result = loop.create_future()
+                result.set_result(PageResult(cached_pages, False, 0.0, (), {}))
+                await processed.put(ProcessedItem(page, cache_key, result, True, False))
+                continue
+
+        # معايرة المسار السريع على أول صفحة فقط (باقي الفصل لم يُحمل بعد)
+        if use_draft is None:
+            use_draft = bool(draft_width) and await asyncio.to_thread(draft_quality_ok, [page.path], draft_width)
+        result = loop.run_in_executor(executor, partial(process_page, page.path, profile=profile,
+                                                        use_draft=use_draft, **options))
+        try:
+            await processed.put(ProcessedItem(page, cache_key, result, False, use_draft))
+        except asyncio.CancelledError:
+            # المجموعة مشتركة بين المهام: لا نترك صفحة مهمة ملغاة في طابورها
+            result.cancel()
+            raise
+    await processed.put(END_OF_QUEUE)
+
+async def write_pages(processed, output_path, volume_bytes, on_volume, profile, options, progress, cache=None):
+    """
+    المرحلة الثالثة: إضافة صفحات كل صورة إلى PDF بترتيب الطابور فور جاهزيتها
+    فشل المعالجة في عملية فرعية يُعاد مرة في خيط منفصل كما في iter_processed_pages
+    الصورة المحملة تُحذف بعد كتابتها حتى لا تتراكم ملفات الفصل على القرص
+    """
+    loop = asyncio.get_running_loop()
+    # كل عمليات الكاتب في خيط واحد بالترتيب: الإلغاء أثناء كتابة صفحة لا يغلق الملف تحت الخيط
+    writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-writer')
+    writer = None
+    report = PassthroughReport()
+    try:
+        while True:
+            item = await processed.get()
+            if item is END_OF_QUEUE:
+                break
+            image_path = item.page.path
+            try:
+                result = await item.result
+            except Exception as e:
+                logging.warning(f"⚠️ فشلت معالجة {os.path.basename(image_path)} في عملية فرعية: {e}")
+                result = await asyncio.to_thread(process_page, image_path, profile=profile,
+                                                 use_draft=item.use_draft, **options)
+            merge_page_result(result)
+            if not item.cached:
+                report.add(result.passthrough, result.cpu_seconds)
+                if cache and not result.passthrough and result.pages != [image_path]:
+                    await asyncio.to_thread(cache.store_processed, item.cache_key, result.pages)
+
+            if writer is None:
+                logging.info(f"📄 بدء كتابة PDF فور جاهزية أول صفحة...")
+                writer = open_pdf_writer(output_path, volume_bytes, on_volume)
+            for page in result.pages:
+                try:
+                    await loop.run_in_executor(writer_thread, writer.add_image, page)
+                    progress['written'] += 1
+                except Exception as e:
+                    logging.error(f"❌ فشل إضافة {page_source_name(page)} إلى PDF: {e}")
+                if is_page_file(page) and page != image_path:
+                    remove_temp_file(page)
+            remove_temp_file(image_path)
+
+        if writer is None:
+            raise NoPagesFound("لم يتم العثور على أي صور في هذا الرابط")
+        if not progress['written']:
+            raise Exception("لم تتم معالجة أي صور بنجاح")
+        await loop.run_in_executor(writer_thread, writer.close)
+    except BaseException:
+        if writer is not None:
+            writer_thread.submit(writer.abort)
+        raise
+    finally:
+        writer_thread.shutdown(wait=False)
+    report.log()
+    return writer.output_paths
+
+async def stream_pdf_async(base_url, download_dir, output_path, profile='balanced', pool=None, workers=None,
+                           max_page_height=MAX_PAGE_HEIGHT, smart_cut=True, passthrough=True, cache=None,
+                           volume_bytes=None, on_volume=None, progress=None, executor=None):
+    """
+    تحميل الفصل ومعالجته وكتابته كخط معالجة واحد: كل صفحة تُكتب في PDF فور جاهزيتها
+    بدلاً من انتظار تحميل الفصل كاملاً ثم معالجته كاملاً
+    المراحل متصلة بطوابير محدودة (تحميل → معالجة → كتابة) فالمرحلة البطيئة توقف ما قبلها
+    نفس إعدادات create_pdf؛ pool: مجمع اتصالات مشترك (AsyncDownloadPool)
+    progress: قاموس اختياري (Counter) يُحدث بعدد الصور المحملة 'downloaded' والصفحات المكتوبة 'written'
+    التصفية فورية لكل صفحة (StreamingPageFilter) لأن الفصل لا يكون كاملاً عند القرار
+    executor: مجموعة عمليات مشتركة بين المهام (لا تُغلق هنا)؛ بدونها تُنشأ مجموعة لهذا الفصل فقط
+    يرجع قائمة مسارات ملفات PDF الناتجة؛ NoPagesFound إذا لم تُحمل أي صورة
+    """
+    profile = get_profile(profile)
+    options = dict(max_page_height=max_page_height, smart_cut=smart_cut, passthrough=passthrough)
+    progress = progress if progress is not None else Counter()
+    workers = workers or PDF_WORKERS
+    own_pool = pool is None
+    if own_pool:
+        pool = AsyncDownloadPool()
+    own_executor = executor is None
+    if own_executor:
+        # عملية واحدة لا تستحق مجموعة عمليات، لكن المعالجة يجب أن تبقى خارج حلقة الأحداث
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else ThreadPoolExecutor(max_workers=1)
+    downloads = asyncio.Queue(maxsize=max(1, PIPELINE_DOWNLOAD_AHEAD))
+    processed = asyncio.Queue(maxsize=workers * PAGE_PREFETCH_PER_WORKER)
+    logging.info(f"🔧 خط معالجة متدفق بوضع {profile.name} ({workers} عملية)")
+
+    stages = [
+        asyncio.create_task(queue_downloads(base_url, download_dir, pool, downloads, cache)),
+        asyncio.create_task(queue_processing(downloads, processed, executor, profile, options, progress, cache)),
+        asyncio.create_task(write_pages(processed, output_path, volume_bytes, on_volume, profile, options,
+                                        progress, cache)),
+    ]
+    try:
+        await asyncio.gather(*stages)
+        output_paths = stages[-1].result()
+        file_size = sum(os.path.getsize(path) for path in output_paths) / (1024 * 1024)
+        logging.info(f"✅ تم إنشاء PDF بنجاح! الحجم: {file_size:.2f} MB ({len(output_paths)} ملف، "
+                     f"{progress['written']} صفحة من {progress['downloaded']} صورة)")
+        return output_paths
+    finally:
+        # خطأ في مرحلة أو إلغاء الطلب: إيقاف باقي المراحل والتحميلات التي لم تُستهلك بعد
+        for stage in stages:
+            stage.cancel()
+        while not downloads.empty():
+            task = downloads.get_nowait()
+            if task is not END_OF_QUEUE:
+                task.cancel()
+        # الصفحات التي لم تبدأ معالجتها بعد تُلغى من طابور المجموعة (قد تكون مشتركة)
+        while not processed.empty():
+            item = processed.get_nowait()
+            if item is not END_OF_QUEUE:
+                item.result.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if own_pool:
+            await pool.aclose()
@@ -0,0 +1,380 @@
+import io
+import logging
+import math
+import os
+import zlib
+from PIL import Image
+from metrics import add, span
+
+# الدقة المفترضة عند غياب معلومات DPI في الصورة (نفس افتراض img2pdf)
+DEFAULT_DPI = 96
+# أقصى بُعد للصفحة بالنقاط في أغلب القارئات؛ الصفحات الأطول تستخدم UserUnit
+MAX_PAGE_UNITS = 14400
+# حجم الأجزاء عند نسخ بيانات JPEG إلى ملف PDF
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# تقدير حجم جدول xref والخاتمة عند إغلاق ملف: ثابت + لكل صفحة
+TRAILER_FIXED_BYTES = 1024
+TRAILER_PAGE_BYTES = 96
+
+# تدوير الصفحة حسب وسم EXIF Orientation (القيم الصالحة فقط مثل rotation=ifvalid في img2pdf)
+EXIF_ROTATION = {3: 180, 6: 90, 8: 270}
+
+# وسوم TIFF اللازمة لنسخ بيانات CCITT G4 دون فك ترميز
+TIFF_PHOTOMETRIC = 262
+TIFF_FILL_ORDER = 266
+TIFF_STRIP_OFFSETS = 273
+TIFF_STRIP_BYTE_COUNTS = 279
+
+JPEG_COLORSPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+def image_dpi(img):
+    """دقة الصورة (أفقياً وعمودياً) مع تجاهل القيم غير المعقولة"""
+    dpi = img.info.get('dpi')
+    try:
+        x_dpi, y_dpi = (float(value) for value in dpi)
+        if x_dpi >= 1 and y_dpi >= 1:
+            return x_dpi, y_dpi
+    except (TypeError, ValueError):
+        pass
+    return DEFAULT_DPI, DEFAULT_DPI
+
+def flatten_for_pdf(img):
+    """تحويل الصورة إلى L أو RGB (مع دمج الشفافية على خلفية بيضاء)"""
+    if img.mode in ('L', 'RGB'):
+        return img
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if img.mode in ('1', 'I;16', 'I', 'F'):
+        return img.convert('L')
+    return img.convert('RGB')
+
+def in_memory(source):
+    """هل الصفحة بيانات مرمّزة في الذاكرة (bytes) وليست مسار ملف؟"""
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+def page_source_size(source):
+    """حجم بيانات الصفحة المرمّزة، في الذاكرة أو على القرص"""
+    return len(source) if in_memory(source) else os.path.getsize(source)
+
+def page_source_name(source):
+    return f"<{len(source)} bytes>" if in_memory(source) else os.path.basename(source)
+
+def ccitt_strip(img):
+    """(الإزاحة، الطول) لبيانات G4 إذا كانت الصورة TIFF ثنائية بشريط واحد، وإلا None"""
+    if img.format != 'TIFF' or img.mode != '1' or img.info.get('compression') != 'group4':
+        return None
+    offsets = img.tag_v2.get(TIFF_STRIP_OFFSETS, ())
+    counts = img.tag_v2.get(TIFF_STRIP_BYTE_COUNTS, ())
+    if len(offsets) != 1 or len(counts) != 1 or img.tag_v2.get(TIFF_FILL_ORDER, 1) != 1:
+        return None
+    return offsets[0], counts[0]
+
+class StreamingPdfWriter:
+    """
+    كتابة PDF صفحة بصفحة مباشرة على القرص:
+    كل صورة تُضاف فور جاهزيتها (بيانات JPEG تُنسخ كما هي دون فك ترميز)
+    وجدول xref والخاتمة يُكتبان عند الإغلاق، فلا يُحمل المستند كاملاً في الذاكرة أبداً
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self._file = open(output_path, 'wb')
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3  # 1 = Catalog و 2 = Pages يُكتبان عند الإغلاق
+        self._needs_user_unit = False
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    @property
+    def output_paths(self):
+        return [self.output_path]
+
+    @property
+    def bytes_written(self):
+        return self._file.tell()
+
+    def _reserve(self):
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _begin_object(self, object_id):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f'{object_id} 0 obj\n'.encode())
+
+    def _write_object(self, object_id, body):
+        self._begin_object(object_id)
+        self._file.write(body.encode() + b'\nendobj\n')
+
+    def _write_stream(self, object_id, dictionary, data=None, source_path=None, length=None, source_offset=0):
+        """كتابة كائن stream من بيانات في الذاكرة أو بنسخ length بايت من ملف على أجزاء"""
+        if length is None:
+            length = len(data)
+        self._begin_object(object_id)
+        self._file.write(f'<< {dictionary} /Length {length} >>\nstream\n'.encode())
+        if source_path:
+            with open(source_path, 'rb') as source:
+                source.seek(source_offset)
+                remaining = length
+                while remaining > 0:
+                    chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise Exception(f"الملف {os.path.basename(source_path)} أقصر من المتوقع")
+                    self._file.write(chunk)
+                    remaining -= len(chunk)
+        else:
+            self._file.write(data)
+        self._file.write(b'\nendstream\nendobj\n')
+
+    def _write_source(self, object_id, dictionary, source, length, offset=0):
+        """نسخ بيانات الصفحة المرمّزة كما هي: من الذاكرة مباشرة أو من الملف على أجزاء"""
+        if in_memory(source):
+            self._write_stream(object_id, dictionary, memoryview(source)[offset:offset + length])
+        else:
+            self._write_stream(object_id, dictionary, source_path=source, length=length, source_offset=offset)
+
+    def add_image(self, image_path):
+        """
+        إضافة صورة كصفحة كاملة بحجمها الطبيعي (البكسل × 72 / DPI)
+        image_path: مسار ملف أو بيانات الصورة المرمّزة في الذاكرة (bytes)
+        JPEG يُضمن كما هو (DCTDecode)، و TIFF بضغط G4 في شريط واحد يُنسخ شريطه كما هو (CCITTFaxDecode)
+        وباقي الصيغ تُفك وتُضغط بـ Flate
+        إذا فشلت الصفحة (صورة تالفة مثلاً) يُحذف ما كُتب منها فيبقى الملف صالحاً للصفحات التالية
+        """
+        position, next_id = self._file.tell(), self._next_id
+        try:
+            return self._add_image(image_path)
+        except BaseException:
+            self._rollback(position, next_id)
+            raise
+
+    def _rollback(self, position, next_id):
+        """التراجع عن صفحة لم تكتمل: قص الملف وإلغاء أرقام الكائنات المحجوزة لها"""
+        self._file.seek(position)
+        self._file.truncate()
+        for object_id in range(next_id, self._next_id):
+            self._offsets.pop(object_id, None)
+        self._next_id = next_id
+
+    def _add_image(self, image_path):
+        with span('pdf_write'), Image.open(io.BytesIO(image_path) if in_memory(image_path) else image_path) as img:
+            width, height = img.size
+            x_dpi, y_dpi = image_dpi(img)
+            rotation = 0
+            strip = ccitt_strip(img)
+            if img.format == 'JPEG' and img.mode in JPEG_COLORSPACES:
+                rotation = EXIF_ROTATION.get(img.getexif().get(0x0112), 0)
+                dictionary = (f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                              f'/ColorSpace {JPEG_COLORSPACES[img.mode]} /BitsPerComponent 8 /Filter /DCTDecode')
+                if img.mode == 'CMYK' and 'adobe' in img.info:
+                    # JPEG من Adobe يخزن CMYK معكوساً
+                    dictionary += ' /Decode [1 0 1 0 1 0 1 0]'
+                image_id = self._reserve()
+                self._write_source(image_id, dictionary, image_path, page_source_size(image_path))
+            elif strip:
+                offset, length = strip
+                # بيانات G4 تعتبر البت 0 "أبيض"؛ مع MinIsBlack يكون العكس
+                black_is_1 = 'true' if img.tag_v2.get(TIFF_PHOTOMETRIC) == 1 else 'false'
+                dictionary = (f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                              f'/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /CCITTFaxDecode '
+                              f'/DecodeParms << /K -1 /Columns {width} /Rows {height} /BlackIs1 {black_is_1} >>')
+                image_id = self._reserve()
+                self._write_source(image_id, dictionary, image_path, length, offset)
+            else:
+                flat = flatten_for_pdf(img)
+                colorspace = '/DeviceGray' if flat.mode == 'L' else '/DeviceRGB'
+                dictionary = (f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                              f'/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /FlateDecode')
+                # البيانات تُجهز قبل حجز رقم الكائن
+                data = zlib.compress(flat.tobytes(), 6)
+                image_id = self._reserve()
+                self._write_stream(image_id, dictionary, data)
+
+        self._add_page(image_id, width * 72.0 / x_dpi, height * 72.0 / y_dpi, rotation)
+        return image_id
+
+    def _add_page(self, image_id, page_width, page_height, rotation=0):
+        # الصفحات الأطول من حد القارئات تُصغر بمعامل UserUnit (الحجم المعروض لا يتغير)
+        user_unit = 1.0
+        if max(page_width, page_height) > MAX_PAGE_UNITS:
+            user_unit = math.ceil(max(page_width, page_height) / MAX_PAGE_UNITS * 100) / 100
+            page_width /= user_unit
+            page_height /= user_unit
+            self._needs_user_unit = True
+
+        content = f'q\n{page_width:.4f} 0 0 {page_height:.4f} 0 0 cm\n/Im0 Do\nQ'.encode()
+        content_id = self._reserve()
+        self._write_stream(content_id, '', content)
+
+        page_id = self._reserve()
+        extras = ''
+        if rotation:
+            extras += f' /Rotate {rotation}'
+        if user_unit != 1.0:
+            extras += f' /UserUnit {user_unit}'
+        self._write_object(page_id, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.4f} {page_height:.4f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R{extras} >>'
+        ))
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """كتابة شجرة الصفحات والكتالوج وجدول xref والخاتمة"""
+        if self._file.closed:
+            return
+        try:
+            kids = ' '.join(f'{page_id} 0 R' for page_id in self._page_ids)
+            self._write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>')
+            # UserUnit من إضافات PDF 1.6؛ الإصدار في الكتالوج يتجاوز رأس الملف
+            version = ' /Version /1.6' if self._needs_user_unit else ''
+            self._write_object(1, f'<< /Type /Catalog /Pages 2 0 R{version} >>')
+
+            xref_offset = self._file.tell()
+            lines = [f'xref\n0 {self._next_id}\n', '0000000000 65535 f \n']
+            for object_id in range(1, self._next_id):
+                lines.append(f'{self._offsets[object_id]:010d} 00000 n \n')
+            lines.append(f'trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n')
+            self._file.write(''.join(lines).encode())
+            add('bytes_out_total', 'pdf', self._file.tell())
+        finally:
+            self._file.close()
+        logging.info(f"📄 تمت كتابة {len(self._page_ids)} صفحة في {os.path.basename(self.output_path)}")
+
+    def abort(self):
+        """إغلاق الملف غير المكتمل وحذفه (بعد خطأ)"""
+        if not self._file.closed:
+            self._file.close()
+            try:
+                os.remove(self.output_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class VolumeWriter:
+    """
+    كتابة الصفحات على عدة ملفات PDF (مجلدات) لا يتجاوز كل منها max_bytes
+    القرار يُتخذ من الحجم الفعلي المكتوب قبل إضافة كل صفحة، والمجلد يُغلق فوراً
+    on_volume(path, number, pages, is_last): تُستدعى لكل مجلد مكتمل (مثلاً لرفعه) مرة واحدة
+    المجلد الممتلئ يُغلق فوراً لكن لا يُبلغ عنه حتى تُكتب أول صفحة في المجلد التالي:
+    إذا فشلت الصفحة التي فتحته ولم تتبعها صفحات فالمجلد السابق هو الأخير (is_last=True)
+    إذا لم يحتج الفصل إلى تقسيم يُكتب ملف واحد باسم output_path
+    """
+
+    def __init__(self, output_path, max_bytes, on_volume=None):
+        self.output_path = output_path
+        self.max_bytes = max_bytes
+        self.on_volume = on_volume
+        self.output_paths = []
+        self._base = os.path.splitext(output_path)[0]
+        self._closed_pages = 0
+        self._closed_bytes = 0
+        self._writer = None
+        # المجلد المغلق الذي ينتظر الإبلاغ عنه: (المسار، الرقم، عدد الصفحات)
+        self._pending = None
+        self._open_next()
+
+    @property
+    def page_count(self):
+        return self._closed_pages + self._writer.page_count
+
+    @property
+    def bytes_written(self):
+        return self._closed_bytes + self._writer.bytes_written
+
+    def _open_next(self):
+        path = f"{self._base}_part{len(self.output_paths) + 1:02d}.pdf"
+        self.output_paths.append(path)
+        self._writer = StreamingPdfWriter(path)
+
+    def _finish_volume(self, is_last):
+        """إغلاق المجلد الحالي وإرجاع (المسار، الرقم، عدد الصفحات) دون الإبلاغ عنه"""
+        writer = self._writer
+        writer.close()
+        path = writer.output_path
+        if is_last and len(self.output_paths) == 1:
+            path = self._rename_single(path)
+        self._closed_pages += writer.page_count
+        self._closed_bytes += os.path.getsize(path)
+        logging.info(f"📚 اكتمل المجلد {len(self.output_paths)}: {writer.page_count} صفحة، "
+                     f"{os.path.getsize(path) / (1024 * 1024):.2f} MB")
+        return path, len(self.output_paths), writer.page_count
+
+    def _rename_single(self, path):
+        """مجلد واحد فقط: يأخذ اسم output_path"""
+        os.replace(path, self.output_path)
+        self.output_paths[0] = self.output_path
+        return self.output_path
+
+    def _report(self, volume, is_last):
+        if self.on_volume:
+            self.on_volume(*volume, is_last)
+
+    def _report_pending(self, is_last):
+        """الإبلاغ عن المجلد المغلق المنتظر؛ إذا كان الوحيد والأخير يأخذ اسم output_path"""
+        if self._pending is None:
+            return
+        path, number, pages = self._pending
+        self._pending = None
+        if is_last and len(self.output_paths) == 1:
+            path = self._rename_single(path)
+        self._report((path, number, pages), is_last)
+
+    def add_image(self, image_path):
+        # الحجم المتوقع للمجلد بعد إضافة الصفحة وكتابة الخاتمة
+        expected = (self._writer.bytes_written + page_source_size(image_path) + TRAILER_FIXED_BYTES
+                    + TRAILER_PAGE_BYTES * (self._writer.page_count + 1))
+        if self._writer.page_count and expected > self.max_bytes:
+            self._pending = self._finish_volume(is_last=False)
+            self._open_next()
+        elif expected > self.max_bytes:
+            logging.warning(f"⚠️ الصفحة {page_source_name(image_path)} وحدها أكبر من حد المجلد")
+        result = self._writer.add_image(image_path)
+        # المجلد الجديد لم يعد فارغاً: السابق ليس الأخير
+        self._report_pending(is_last=False)
+        return result
+
+    def close(self):
+        if self._writer.page_count or len(self.output_paths) == 1:
+            self._report(self._finish_volume(is_last=True), is_last=True)
+        else:
+            # المجلد الأخير فارغ (فشلت الصفحة التي فتحته): المجلد السابق هو الأخير
+            self._writer.abort()
+            self.output_paths.pop()
+            self._report_pending(is_last=True)
+
+    def abort(self):
+        """إيقاف الكتابة بعد خطأ: المجلدات المكتملة تبقى كما هي (والمنتظر منها يُبلغ عنه كأخير)"""
+        self._writer.abort()
+        self.output_paths.pop()
+        self._report_pending(is_last=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def open_pdf_writer(output_path, volume_bytes=None, on_volume=None):
+    """كاتب PDF واحد، أو كاتب مجلدات عند تحديد حد لحجم الملف"""
+    if volume_bytes:
+        return VolumeWriter(output_path, volume_bytes, on_volume)
+    return StreamingPdfWriter(output_path)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import signal
+from telegram import Update
+from metrics import add, metrics_response
+
+# الرابط العام للخدمة (Render يضبط RENDER_EXTERNAL_URL تلقائياً لخدمات web)
+WEBHOOK_URL = (os.environ.get('WEBHOOK_URL') or os.environ.get('RENDER_EXTERNAL_URL') or '').rstrip('/')
+# المنفذ الذي تخصصه المنصة؛ بدونه (أو بدون رابط عام) يعمل البوت بـ polling للتشغيل المحلي
+WEBHOOK_PORT = int(os.environ.get('PORT', 0))
+# المسار السري للتحديثات ورمز التحقق في ترويسة X-Telegram-Bot-Api-Secret-Token
+# (إذا لم يُحدد يُشتق من التوكن فيبقى ثابتاً بين عمليات إعادة التشغيل)
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+# أقصى عدد اتصالات متزامنة يفتحها تيليجرام لتسليم التحديثات
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+# أقصى حجم لجسم الطلب، ومهلة الاتصال الخامل قبل إغلاقه (بالثواني)
+WEBHOOK_MAX_BODY = 1024 * 1024
+WEBHOOK_IDLE_TIMEOUT = 75
+# بعد وصول سطر الطلب: مهلة قراءة الترويسات والجسم كاملة، وحدود الترويسات
+# (عميل يرسل الطلب ببطء أو بترويسات لا تنتهي لا يحجز اتصالاً على المنفذ العام)
+WEBHOOK_REQUEST_TIMEOUT = 10
+WEBHOOK_MAX_HEADERS = 100
+WEBHOOK_MAX_HEADER_BYTES = 16 * 1024
+
+SECRET_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+               405: 'Method Not Allowed', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large'}
+
+def webhook_secret(token, secret=WEBHOOK_SECRET):
+    """السر المستخدم في المسار والترويسة (تيليجرام يقبل الحروف والأرقام و _ - فقط)"""
+    if not secret:
+        return hashlib.sha256(f"webhook:{token}".encode()).hexdigest()
+    if not SECRET_TOKEN_PATTERN.match(secret):
+        raise Exception("WEBHOOK_SECRET يجب أن يتكون من حروف وأرقام و _ - فقط (حتى 256 حرفاً)")
+    return secret
+
+class WebhookServer:
+    """
+    خادم HTTP غير متزامن داخل حلقة أحداث البوت يستقبل التحديثات من تيليجرام على /<secret>
+    كل تحديث يوضع في update_queue ويُرد فوراً بـ 200، والتطبيق (concurrent_updates)
+    يعالج التحديثات بالتوازي فلا ينتظر تيليجرام انتهاء المعالجات
+    باقي المسارات: /metrics وفحص صحة الخدمة على نفس المنفذ بدل خادم القياسات المنفصل
+    """
+
+    def __init__(self, application, secret, port=WEBHOOK_PORT, host='0.0.0.0'):
+        self.application = application
+        self.secret = secret
+        self.path = f"/{secret}"
+        self.port = port
+        self.host = host
+        self._server = None
+        # الاتصالات المفتوحة (keep-alive) لإغلاقها عند الإيقاف: {المهمة: الكاتب}
+        self._connections = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # المنفذ الفعلي عند طلب منفذ عشوائي (0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"🌐 خادم webhook يستمع على المنفذ {self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        """
+        قراءة طلب واحد: (الطريقة، المسار، الترويسات، الجسم، حالة الخطأ) أو None عند إغلاق الاتصال
+        انتظار بداية الطلب حتى WEBHOOK_IDLE_TIMEOUT، ثم باقي الطلب كله خلال WEBHOOK_REQUEST_TIMEOUT
+        """
+        request_line = await asyncio.wait_for(reader.readline(), WEBHOOK_IDLE_TIMEOUT)
+        if not request_line.strip():
+            return None
+        return await asyncio.wait_for(self._read_request_rest(reader, request_line), WEBHOOK_REQUEST_TIMEOUT)
+
+    async def _read_request_rest(self, reader, request_line):
+        """الترويسات والجسم بعد سطر الطلب؛ تجاوز الحدود يرجع حالة الخطأ (413/431) دون الجسم"""
+        method, target = request_line.decode('latin-1').split()[:2]
+        headers = {}
+        header_count = header_bytes = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_count += 1
+            header_bytes += len(line)
+            if header_count > WEBHOOK_MAX_HEADERS or header_bytes > WEBHOOK_MAX_HEADER_BYTES:
+                return method, target, headers, None, 431
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > WEBHOOK_MAX_BODY:
+            return method, target, headers, None, 413
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body, None
+
+    async def _handle_connection(self, reader, writer):
+        """اتصال واحد قد يحمل عدة طلبات متتالية (keep-alive كما يفعل تيليجرام)"""
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, error = request
+                if error:
+                    status, content_type, payload = error, 'text/plain', b''
+                else:
+                    status, content_type, payload = await self._route(method, target.split('?')[0], headers, body)
+                keep_alive = not error and headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                    + (payload if method != 'HEAD' else b'')
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _route(self, method, path, headers, body):
+        """(الحالة، نوع المحتوى، البيانات) للطلب"""
+        if path == self.path:
+            if method != 'POST':
+                return 405, 'text/plain', b''
+            token = headers.get('x-telegram-bot-api-secret-token', '')
+            if not hmac.compare_digest(token.encode(), self.secret.encode()):
+                logging.warning("⚠️ طلب webhook برمز سري غير صحيح")
+                return 403, 'text/plain', b''
+            try:
+                update = Update.de_json(json.loads(body), self.application.bot)
+            except (ValueError, TypeError, KeyError):
+                return 400, 'text/plain', b''
+            await self.application.update_queue.put(update)
+            add('updates_total', 'webhook', 1)
+            return 200, 'text/plain', b''
+        if method in ('GET', 'HEAD'):
+            payload, content_type = await asyncio.to_thread(metrics_response, path)
+            return 200, content_type, payload
+        return 404, 'text/plain', b''
+
+async def register_webhook(application, public_url, secret, max_connections=WEBHOOK_MAX_CONNECTIONS):
+    """تسجيل رابط webhook لدى تيليجرام (التحديثات المعلقة تبقى وتُسلم بعد التسجيل)"""
+    await application.bot.set_webhook(
+        url=f"{public_url}/{secret}", secret_token=secret,
+        allowed_updates=Update.ALL_TYPES, max_connections=max_connections,
+    )
+    logging.info(f"🔗 تم تسجيل webhook: {public_url}/***")
+
+async def serve_webhook(application, public_url, port, secret):
+    """دورة حياة التطبيق كاملة كما في run_polling، حتى إشارة الإيقاف (SIGTERM/SIGINT)"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = WebhookServer(application, secret, port)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        await register_webhook(application, public_url, secret)
+        await stop.wait()
+    finally:
+        # الرابط يبقى مسجلاً بعد الإيقاف: تيليجرام يحتفظ بالتحديثات ويوقظ الخدمة النائمة بها
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run_webhook(application, public_url=WEBHOOK_URL, port=WEBHOOK_PORT, secret=None):
+    """تشغيل البوت في وضع webhook (بديل application.run_polling)"""
+    asyncio.run(serve_webhook(application, public_url, port, secret or webhook_secret(application.bot.token)))